@@ -4,8 +4,26 @@ from .routes.health import health_bp
 from .routes.ventas import ventas_bp
 from .routes.compras import compras_bp
 from .routes.manufactura import manufactura_bp
+from .routes.tablero import tablero_bp
+from .routes.tablero.views import TABLERO_METRICS, build_tablero_summary
+from .routes.metrics import metrics_bp
+from .routes.stream import stream_bp
+from .routes.webhooks import webhooks_bp
 
 from .config import Config
+from .odoo_connector import init_pool
+from .rpc_batch import init_executor
+from .resilience import init_guard
+from .tenants import init_tenants
+from .shared_cache import init_shared_cache
+from .cache import init_cache
+from .currency import init_rates
+from .singleflight import init_single_flight
+from .rollup import init_rollup
+from .precompute import init_precompute
+from .changes import init_changes
+from .stream import init_stream
+from .metrics import init_metrics
 from dotenv import load_dotenv
 import os
 
@@ -15,6 +33,39 @@ def create_app():
     app = Flask(__name__)
     app.config.from_object(Config)
 
+    # ✅ Pool de conexiones a Odoo compartido por todas las peticiones
+    init_pool(app)
+    init_executor(app)
+    init_guard(app)
+
+    # ✅ Otras bases de Odoo (tenants), cada una con su pool, hilos y cuota
+    init_tenants(app)
+
+    # ✅ Caché compartida entre workers (opcional)
+    init_shared_cache(app)
+
+    # ✅ Caché de respuestas de los tableros y agrupación de peticiones idénticas
+    init_cache(app)
+    init_single_flight(app)
+
+    # ✅ Tipos de cambio en caché para los desgloses por compañía
+    init_rates(app)
+
+    # ✅ Agregados diarios locales (opcional)
+    init_rollup(app, TABLERO_METRICS)
+
+    # ✅ Precálculo en segundo plano de los rangos más pedidos (opcional)
+    init_precompute(app)
+
+    # ✅ Invalidación precisa de la caché con los avisos de cambios de Odoo (opcional)
+    init_changes(app)
+
+    # ✅ Stream SSE: un cálculo por rango y tick, repartido a todos los clientes
+    init_stream(app, build_tablero_summary)
+
+    # ✅ Tiempos por petición (Server-Timing) y métricas de Prometheus
+    init_metrics(app)
+
     # ✅ Habilitar CORS para todas las rutas y orígenes
     CORS(app)
 
@@ -23,6 +74,10 @@ def create_app():
     app.register_blueprint(ventas_bp, url_prefix="/ventas")
     app.register_blueprint(compras_bp, url_prefix="/compras")
     app.register_blueprint(manufactura_bp, url_prefix="/manufactura")
+    app.register_blueprint(tablero_bp, url_prefix="/tablero")
+    app.register_blueprint(stream_bp, url_prefix="/stream")
+    app.register_blueprint(webhooks_bp, url_prefix="/webhooks")
+    app.register_blueprint(metrics_bp)
 
 
     return app
@@ -0,0 +1,208 @@
+"""Modo de servicio asíncrono (ASGI).
+
+Los resúmenes de ventas, compras, manufactura y tablero se sirven con vistas
+async y un cliente de Odoo nativo de asyncio, de modo que un solo proceso
+mantiene cientos de peticiones en vuelo mientras espera a Odoo. El resto de
+rutas se delegan a la app Flask.
+
+    uvicorn app.asgi:app --host 0.0.0.0 --port 5000
+"""
+import asyncio
+from contextvars import copy_context
+from functools import partial
+from urllib.parse import parse_qs
+
+from asgiref.wsgi import WsgiToAsgi
+
+from . import create_app
+from .async_connector import AsyncOdooClient
+from .cache import is_historical, normalize_range, stale_result
+from .formatting import RESPONSE_FORMATS
+from .http_cache import RenderedJSON, negotiate_media
+from .kpi import evaluate_async, previous_period
+from .metrics import start_timings, stop_timings
+from .resilience import OdooUnavailable
+from .tenants import TenantQuotaExceeded, UnknownTenant, split_tenant_path, using_tenant
+from .routes.ventas.views import VENTAS_METRICS, ventas_payload
+from .routes.compras.views import COMPRAS_METRICS, compras_payload
+from .routes.manufactura.views import MANUFACTURA_METRICS, manufactura_payload
+from .routes.tablero.views import TABLERO_METRICS, tablero_payload
+
+
+# ruta -> (clave de caché, métricas, constructor del payload)
+ASYNC_ROUTES = {
+    "/ventas/": ("ventas", VENTAS_METRICS, ventas_payload),
+    "/compras/": ("compras", COMPRAS_METRICS, compras_payload),
+    "/manufactura/": ("manufactura", MANUFACTURA_METRICS, manufactura_payload),
+    "/tablero/": ("tablero", TABLERO_METRICS, tablero_payload),
+}
+
+
+class AsyncDashboardApp:
+    def __init__(self, flask_app):
+        self.flask_app = flask_app
+        self.config = flask_app.config
+        self.fallback = WsgiToAsgi(flask_app)
+        # Un cliente async por tenant, creado dentro del loop
+        self.clients = {}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            return await self.lifespan(receive, send)
+        # /t/<tenant>/... se resuelve aquí para las rutas async; el resto lo traduce la app Flask
+        tenant_name, path = split_tenant_path(scope.get("path", ""))
+        route = ASYNC_ROUTES.get(path)
+        # Los desgloses (?group_by=) los sirve la app Flask
+        if route and b"group_by=" in scope.get("query_string", b""):
+            route = None
+        if scope["type"] == "http" and scope["method"] == "GET" and route:
+            timings, token = start_timings()
+            try:
+                status = await self.dispatch(scope, send, timings, tenant_name, route)
+            finally:
+                stop_timings(token)
+            self.flask_app.extensions["metrics"].observe_request(path, "GET", status, timings.elapsed())
+            return
+        return await self.fallback(scope, receive, send)
+
+    async def dispatch(self, scope, send, timings, tenant_name, route):
+        registry = self.flask_app.extensions["tenants"]
+        header = self.config.get('TENANT_HEADER', 'X-Tenant')
+        if tenant_name is None:
+            key = header.lower().encode()
+            tenant_name = next((value.decode("latin-1") for name, value in scope.get("headers", []) if name == key),
+                               registry.default)
+        if not tenant_name:
+            return await self.respond(send, timings, {"error": f"Falta el tenant: cabecera {header} o prefijo /t/<tenant>/"}, 400)
+        try:
+            tenant = registry.get(tenant_name)
+            tenant.enter()
+        except UnknownTenant as e:
+            return await self.respond(send, timings, {"error": str(e)}, 404)
+        except TenantQuotaExceeded as e:
+            return await self.respond(send, timings, {"error": str(e)}, 429, [(b"retry-after", b"1")])
+        try:
+            with using_tenant(tenant):
+                return await self.summary(scope, send, timings, *route)
+        finally:
+            tenant.leave()
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                for client in self.clients.values():
+                    client.close()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    def _client(self, tenant):
+        # Las primitivas de asyncio deben crearse dentro del loop: al primer uso
+        client = self.clients.get(tenant.name)
+        if client is None:
+            client = self.clients[tenant.name] = AsyncOdooClient(tenant.config)
+            client.on_rpc = self.flask_app.extensions["metrics"].observe_rpc
+            client.guard = tenant.guard
+        return client
+
+    async def summary(self, scope, send, timings, endpoint, metrics, build_payload):
+        args = parse_qs(scope.get("query_string", b"").decode())
+        start_date = args.get("start", [None])[0]
+        end_date = args.get("end", [None])[0]
+        response_format = args.get("format", ["display"])[0]
+
+        if not start_date or not end_date:
+            return await self.respond(send, timings, {"error": "Parámetros 'start' y 'end' requeridos en formato YYYY-MM-DD"}, 400)
+        if response_format not in RESPONSE_FORMATS:
+            return await self.respond(send, timings, {"error": "Parámetro 'format' debe ser display o raw"}, 400)
+        raw = response_format == "raw"
+        request_headers = {name.decode("latin-1"): value.decode("latin-1") for name, value in scope.get("headers", [])}
+        media = negotiate_media(request_headers.get("accept"))
+        render = partial(self._render, raw=raw, media=media)
+
+        try:
+            start_date, end_date = normalize_range(start_date, end_date)
+            tenant = self.flask_app.extensions["tenants"].current()
+
+            async def compute():
+                prev_start, prev_end = previous_period(start_date, end_date)
+                values = await self.evaluate(tenant, metrics, [(start_date, end_date), (prev_start, prev_end)])
+                return build_payload(values, raw)
+
+            key = (f"{endpoint}.raw" if raw else endpoint, start_date, end_date)
+            flights = self.flask_app.extensions.get("single_flight")
+            if flights is not None:
+                build = compute
+
+                def compute():
+                    return flights.do_async(key, build)
+
+            if self.config.get('CACHE_ENABLED', True):
+                cache = self.flask_app.extensions["response_cache"]
+                try:
+                    result = await cache.get_or_compute_async(key, compute, historical=is_historical(end_date))
+                except OdooUnavailable as e:
+                    result = stale_result(cache, key, e)
+                    if result is None:
+                        raise
+                rendered = cache.rendered(key, result, render, variant=media)
+            else:
+                rendered = render(await compute())
+            return await self.respond_rendered(request_headers, send, timings, rendered)
+
+        except OdooUnavailable as e:
+            return await self.respond(send, timings, {"error": str(e)}, 503,
+                                      [(b"retry-after", str(e.retry_after).encode())])
+
+        except Exception as e:
+            return await self.respond(send, timings, {"error": str(e)}, 500)
+
+    async def evaluate(self, tenant, metrics, periods):
+        store = self.flask_app.extensions.get("rollup_store")
+        if store is not None and store.covers(metrics) and store.pool is tenant.pool:
+            # El almacén local responde en microsegundos; sólo el día en curso va a Odoo
+            return await asyncio.get_running_loop().run_in_executor(
+                None, copy_context().run, self._evaluate_store, store, metrics, periods)
+        return await evaluate_async(self._client(tenant), metrics, periods, self.config.get('ODOO_REQUEST_DEADLINE'))
+
+    def _evaluate_store(self, store, metrics, periods):
+        with self.flask_app.app_context():
+            return store.evaluate(metrics, periods)
+
+    def _render(self, payload, raw=False, media="json"):
+        return RenderedJSON.from_payload(self.flask_app.json, payload, raw, media)
+
+    async def respond_rendered(self, request_headers, send, timings, rendered):
+        # ETag/304, compresión y formato igual que summary_response en la app Flask
+        encoding = rendered.choose_encoding(request_headers.get("accept-encoding"))
+        headers = [(name.lower().encode(), value.encode()) for name, value in rendered.headers(encoding).items()]
+        if rendered.not_modified(request_headers.get("if-none-match")):
+            return await self._send(send, timings, 304, b"", headers)
+        body = rendered.encoded(encoding) if encoding else rendered.body
+        if encoding:
+            headers.append((b"content-encoding", encoding.encode()))
+        return await self._send(send, timings, 200, body, [(b"content-type", rendered.mimetype.encode())] + headers)
+
+    async def respond(self, send, timings, payload, status=200, headers=()):
+        # Mismo serializador que jsonify (anota su tiempo en Server-Timing)
+        body = self.flask_app.json.response(payload).get_data()
+        return await self._send(send, timings, status, body, [(b"content-type", b"application/json"), *headers])
+
+    async def _send(self, send, timings, status, body, headers):
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [
+                *headers,
+                (b"content-length", str(len(body)).encode()),
+                (b"access-control-allow-origin", b"*"),
+                (b"server-timing", timings.header().encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
+        return status
+
+
+app = AsyncDashboardApp(create_app())
@@ -0,0 +1,218 @@
+import asyncio
+import ssl
+import time
+import xmlrpc.client
+from urllib.parse import urlsplit
+
+from .odoo_connector import OdooAuthError, _is_auth_fault
+from .rpc_batch import RpcDeadlineExceeded
+from .transports import make_codec
+
+
+class AsyncHTTPConnection:
+    """Conexión HTTP/1.1 keep-alive sobre streams de asyncio."""
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.last_used = time.monotonic()
+        self.reusable = True
+
+    async def post(self, host, path, body, content_type):
+        request = (
+            f"POST {path} HTTP/1.1\r\n"
+            f"Host: {host}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            "Connection: keep-alive\r\n"
+            "\r\n"
+        ).encode("latin-1") + body
+        self.writer.write(request)
+        await self.writer.drain()
+
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionError("Odoo cerró la conexión")
+        status = int(status_line.split()[1])
+        headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            payload = await self._read_chunked()
+        elif "content-length" in headers:
+            payload = await self.reader.readexactly(int(headers["content-length"]))
+        else:
+            payload = await self.reader.read()
+            self.reusable = False
+        if headers.get("connection", "").lower() == "close":
+            self.reusable = False
+        self.last_used = time.monotonic()
+        return status, headers, payload
+
+    async def _read_chunked(self):
+        chunks = []
+        while True:
+            size = int((await self.reader.readline()).split(b";")[0], 16)
+            if size == 0:
+                await self.reader.readline()
+                return b"".join(chunks)
+            chunks.append(await self.reader.readexactly(size))
+            await self.reader.readline()
+
+    def close(self):
+        self.writer.close()
+
+
+class AsyncConnectionPool:
+    def __init__(self, url, size=8, idle_timeout=60, timeout=30):
+        parts = urlsplit(url)
+        self.host = parts.hostname
+        self.port = parts.port or (443 if parts.scheme == "https" else 80)
+        self.host_header = parts.netloc
+        self.ssl = ssl.create_default_context() if parts.scheme == "https" else None
+        self.size = size
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self._idle = []
+        self._slots = asyncio.Semaphore(size)
+        self.in_use = 0
+
+    async def _connect(self):
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port, ssl=self.ssl), self.timeout
+        )
+        return AsyncHTTPConnection(reader, writer)
+
+    def _pop_idle(self):
+        now = time.monotonic()
+        while self._idle:
+            conn = self._idle.pop()
+            if self.idle_timeout and now - conn.last_used > self.idle_timeout:
+                conn.close()
+                continue
+            return conn
+        return None
+
+    async def post(self, path, body, content_type):
+        async with self._slots:
+            conn = self._pop_idle() or await self._connect()
+            self.in_use += 1
+            try:
+                result = await asyncio.wait_for(conn.post(self.host_header, path, body, content_type), self.timeout)
+            except BaseException:
+                conn.close()
+                raise
+            finally:
+                self.in_use -= 1
+            if conn.reusable:
+                self._idle.append(conn)
+            else:
+                conn.close()
+            return result
+
+    def close(self):
+        while self._idle:
+            self._idle.pop().close()
+
+    def stats(self):
+        return {"size": self.size, "in_use": self.in_use, "idle": len(self._idle)}
+
+
+class AsyncOdooClient:
+    """Cliente de Odoo nativo de asyncio con la misma API execute_kw."""
+
+    def __init__(self, config):
+        self.url = config['ODOO_URL']
+        self.db = config['ODOO_DB']
+        self.user = config['ODOO_USER']
+        self.password = config['ODOO_PASSWORD']
+        self.codec = make_codec(config.get('ODOO_TRANSPORT') or 'xmlrpc')
+        self.pool = AsyncConnectionPool(
+            self.url,
+            size=config.get('ODOO_POOL_SIZE', 8),
+            idle_timeout=config.get('ODOO_POOL_IDLE_TIMEOUT', 60),
+            timeout=config.get('ODOO_TIMEOUT', 30),
+        )
+        self._uid = None
+        self._auth_lock = asyncio.Lock()
+        self.on_rpc = None
+        self.guard = None
+
+    async def _timed(self, model, method, *args):
+        if self.on_rpc is None:
+            return await self.call(*args)
+        started = time.perf_counter()
+        try:
+            result = await self.call(*args)
+        except Exception:
+            self.on_rpc(model, method, time.perf_counter() - started, error=True)
+            raise
+        self.on_rpc(model, method, time.perf_counter() - started)
+        return result
+
+    async def call(self, service, method, *args):
+        body = self.codec.encode(service, method, args)
+        path = self.codec.path(service)
+        status, _, payload = await self.pool.post(path, body, self.codec.content_type)
+        if status != 200:
+            raise xmlrpc.client.ProtocolError(f"{self.url}{path}", status, "Respuesta HTTP inesperada", {})
+        return self.codec.decode(payload)
+
+    async def uid(self):
+        if self._uid is not None:
+            return self._uid
+        async with self._auth_lock:
+            if self._uid is None:
+                uid = await self._timed("common", "authenticate",
+                                        "common", "authenticate", self.db, self.user, self.password, {})
+                if not uid:
+                    raise OdooAuthError("Autenticación con Odoo rechazada")
+                self._uid = uid
+            return self._uid
+
+    async def execute_kw(self, model, method, args, kwargs=None):
+        if self.guard is None:
+            return await self._execute_kw(model, method, args, kwargs)
+        async with self.guard.slot_async():
+            return await self._execute_kw(model, method, args, kwargs)
+
+    async def _execute_kw(self, model, method, args, kwargs=None):
+        uid = await self.uid()
+        try:
+            return await self._timed(model, method, "object", "execute_kw",
+                                     self.db, uid, self.password, model, method, args, kwargs or {})
+        except xmlrpc.client.Fault as e:
+            if not _is_auth_fault(e):
+                raise
+            if self._uid == uid:
+                self._uid = None
+            return await self._timed(model, method, "object", "execute_kw",
+                                     self.db, await self.uid(), self.password, model, method, args, kwargs or {})
+
+    async def version(self):
+        return await self.call("common", "version")
+
+    def close(self):
+        self.pool.close()
+
+
+async def run_concurrently(coros, deadline=None):
+    """Equivalente asíncrono de RpcBatch.run: todas a la vez, plazo común y
+    cancelación del resto en cuanto una falla."""
+    tasks = [asyncio.ensure_future(coro) for coro in coros]
+    if not tasks:
+        return []
+    done, pending = await asyncio.wait(tasks, timeout=deadline, return_when=asyncio.FIRST_EXCEPTION)
+    failed = next((t for t in done if t.exception() is not None), None)
+    for task in pending:
+        task.cancel()
+    if failed is not None:
+        raise failed.exception()
+    if pending:
+        raise RpcDeadlineExceeded(f"Odoo no respondió en {deadline:g} s")
+    return [task.result() for task in tasks]
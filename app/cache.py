@@ -0,0 +1,345 @@
+import asyncio
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+from datetime import date, datetime, timezone
+
+from flask import current_app
+
+from .kpi import previous_period, series_buckets
+from .resilience import OdooUnavailable
+from .tenants import tenant_name
+
+logger = logging.getLogger(__name__)
+
+
+class CacheEntry:
+    __slots__ = ("value", "created", "expires", "refreshing", "rendered")
+
+    def __init__(self, value, ttl):
+        self.value = value
+        self.created = time.monotonic()
+        self.expires = self.created + ttl
+        self.refreshing = False
+        self.rendered = None
+
+
+def _evict_fair(partitions, max_entries):
+    """Recorta a `max_entries` quitando la entrada más antigua de la partición
+    más grande, así un tenant muy activo no vacía la caché de los demás."""
+    evicted = 0
+    while sum(len(entries) for entries in partitions.values()) > max_entries:
+        max(partitions.values(), key=len).popitem(last=False)
+        evicted += 1
+    return evicted
+
+
+class ResponseCache:
+    """LRU acotado con TTL y stale-while-revalidate.
+
+    Una entrada caducada se sigue sirviendo durante `stale_ttl` segundos
+    mientras se recalcula en segundo plano; pasado ese margen se recalcula
+    en la propia petición. Las claves se separan por `partition()` (el
+    tenant en curso), de modo que bases distintas nunca comparten entradas.
+
+    Con `shared` (SharedCache) hay un segundo nivel común a los workers: lo
+    que no está en memoria se busca allí antes de recalcularlo y cada valor
+    calculado se escribe en ambos.
+    """
+
+    def __init__(self, max_entries=256, ttl=30, historical_ttl=3600, stale_ttl=300, executor=None, partition=None,
+                 shared=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.historical_ttl = historical_ttl
+        self.stale_ttl = stale_ttl
+        self.executor = executor or ThreadPoolExecutor(max_workers=2, thread_name_prefix="cache-refresh")
+        self.partition = partition or (lambda: None)
+        self.shared = shared
+        self._partitions = {}
+        # Último valor calculado por clave, aunque haya caducado: respaldo si Odoo no responde
+        self._last_good = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.refresh_errors = 0
+
+    def _entries(self, store=None):
+        # Entradas del tenant en curso; llamar con self._lock tomado
+        store = self._partitions if store is None else store
+        partition = self.partition()
+        entries = store.get(partition)
+        if entries is None:
+            entries = store[partition] = OrderedDict()
+        return entries
+
+    def _lookup(self, key):
+        """Devuelve (valor, estado) con estado 'fresh', 'stale', 'refresh' o 'miss'.
+
+        'refresh' es un valor caducado que el llamador debe recalcular en
+        segundo plano; sólo se entrega a un llamador por entrada.
+        """
+        value, state = self._lookup_local(key)
+        if state in ("miss", "refresh") and self.shared is not None:
+            # Puede que otro worker ya lo haya calculado (o recalculado)
+            if self._load_shared(key, fresh_only=state == "refresh"):
+                value, state = self._lookup_local(key)
+        with self._lock:
+            if state == "fresh":
+                self.hits += 1
+            elif state == "miss":
+                self.misses += 1
+            else:
+                self.stale_hits += 1
+        return value, state
+
+    def _lookup_local(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entries = self._entries()
+            entry = entries.get(key)
+            if entry is None or now >= entry.expires + self.stale_ttl:
+                return None, "miss"
+            entries.move_to_end(key)
+            if now < entry.expires:
+                return entry.value, "fresh"
+            if entry.refreshing:
+                return entry.value, "stale"
+            entry.refreshing = True
+            return entry.value, "refresh"
+
+    def _shared_key(self, key):
+        return ("response", self.partition(), key)
+
+    def _load_shared(self, key, fresh_only=False):
+        found = self.shared.get(self._shared_key(key))
+        if found is None:
+            return False
+        value, created, expires = found
+        now_wall, now = time.time(), time.monotonic()
+        if now_wall >= expires + (0 if fresh_only else self.stale_ttl):
+            return False
+        # Instantes de reloj de pared (comunes a los procesos) a monotónico local
+        entry = CacheEntry(value, expires - now_wall)
+        entry.created = now - (now_wall - created)
+        self._store(key, entry, created)
+        return True
+
+    def get_or_compute(self, key, compute, historical=False):
+        ttl = self.historical_ttl if historical else self.ttl
+        value, state = self._lookup(key)
+        if state == "refresh":
+            # Con el contexto de la petición: el recálculo usa el mismo tenant
+            self.executor.submit(copy_context().run, self._refresh, key, compute, ttl)
+        if state != "miss":
+            return value
+
+        value = compute()
+        self.set(key, value, ttl)
+        return value
+
+    async def get_or_compute_async(self, key, compute, historical=False):
+        # compute es una función que devuelve una corrutina nueva en cada llamada
+        ttl = self.historical_ttl if historical else self.ttl
+        value, state = self._lookup(key)
+        if state == "refresh":
+            asyncio.ensure_future(self._refresh_async(key, compute, ttl))
+        if state != "miss":
+            return value
+
+        value = await compute()
+        self.set(key, value, ttl)
+        return value
+
+    def _refresh(self, key, compute, ttl):
+        try:
+            self.set(key, compute(), ttl)
+        except Exception:
+            self._refresh_failed(key)
+
+    async def _refresh_async(self, key, compute, ttl):
+        try:
+            self.set(key, await compute(), ttl)
+        except Exception:
+            self._refresh_failed(key)
+
+    def _refresh_failed(self, key):
+        logger.exception("Error recalculando la entrada de caché %s", key)
+        with self._lock:
+            self.refresh_errors += 1
+            entry = self._entries().get(key)
+            if entry is not None:
+                entry.refreshing = False
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries().get(key)
+            return entry.value if entry is not None else None
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        self._store(key, CacheEntry(value, ttl), time.time())
+        if self.shared is not None:
+            self.shared.set(self._shared_key(key), value, ttl, keep=self.stale_ttl)
+
+    def _store(self, key, entry, created):
+        with self._lock:
+            entries = self._entries()
+            entries[key] = entry
+            entries.move_to_end(key)
+            self.evictions += _evict_fair(self._partitions, self.max_entries)
+            last_good = self._entries(self._last_good)
+            last_good[key] = (entry.value, created)
+            last_good.move_to_end(key)
+            _evict_fair(self._last_good, self.max_entries)
+
+    def rendered(self, key, value, render, variant="json"):
+        """render(value) memorizado en la entrada de `key` (uno por `variant`)
+        mientras siga guardando `value`."""
+        with self._lock:
+            entry = self._entries().get(key)
+            if entry is None or entry.value is not value:
+                entry = None
+            elif entry.rendered is not None and variant in entry.rendered:
+                return entry.rendered[variant]
+        # Se renderiza fuera del lock; si otra petición se adelantó, gana la suya
+        result = render(value)
+        if entry is None:
+            return result
+        with self._lock:
+            if entry.rendered is None:
+                entry.rendered = {}
+            return entry.rendered.setdefault(variant, result)
+
+    def last_good(self, key):
+        """(valor, instante de cálculo) del último resultado bueno de `key`, o None."""
+        with self._lock:
+            return self._entries(self._last_good).get(key)
+
+    def invalidate(self, predicate=None):
+        """Elimina las entradas del tenant en curso cuya clave cumple `predicate` (todas si es None)."""
+        with self._lock:
+            entries = self._entries()
+            keys = [key for key in entries if predicate is None or predicate(key)]
+            for key in keys:
+                del entries[key]
+        removed = len(keys)
+        if self.shared is not None:
+            partition = self.partition()
+            # En el almacén las claves vuelven de JSON como listas
+            removed = max(removed, self.shared.invalidate(
+                lambda raw: raw[:2] == ["response", partition] and (predicate is None or predicate(tuple(raw[2])))))
+        return removed
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": sum(len(entries) for entries in self._partitions.values()),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "stale_hits": self.stale_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "refresh_errors": self.refresh_errors,
+                "partitions": {str(name): len(entries) for name, entries in self._partitions.items() if entries},
+            }
+
+
+def init_cache(app):
+    config = app.config
+    app.extensions["response_cache"] = ResponseCache(
+        max_entries=config.get('CACHE_MAX_ENTRIES', 256),
+        ttl=config.get('CACHE_TTL', 30),
+        historical_ttl=config.get('CACHE_HISTORICAL_TTL', 3600),
+        stale_ttl=config.get('CACHE_STALE_TTL', 300),
+        partition=tenant_name,
+        shared=app.extensions.get("shared_cache"),
+    )
+
+
+def get_cache():
+    return current_app.extensions["response_cache"]
+
+
+def normalize_range(start_date, end_date):
+    start = datetime.strptime(start_date, "%Y-%m-%d").date()
+    end = datetime.strptime(end_date, "%Y-%m-%d").date()
+    return start.isoformat(), end.isoformat()
+
+
+def cached_summary(endpoint, build, start_date, end_date):
+    """Resultado de `build(start, end)` servido desde la caché de respuestas."""
+    start_date, end_date = normalize_range(start_date, end_date)
+    key = (endpoint, start_date, end_date)
+    flights = current_app.extensions.get("single_flight")
+    if not current_app.config.get('CACHE_ENABLED', True):
+        if flights is None:
+            return build(start_date, end_date)
+        return flights.do(key, lambda: build(start_date, end_date))
+
+    app = current_app._get_current_object()
+
+    def compute():
+        # Puede ejecutarse en el hilo de recálculo, fuera de la petición
+        with app.app_context():
+            return build(start_date, end_date)
+
+    if flights is not None:
+        # Peticiones idénticas simultáneas esperan a un único cálculo
+        build_once = compute
+
+        def compute():
+            return flights.do(key, build_once)
+
+    try:
+        return get_cache().get_or_compute(key, compute, historical=is_historical(end_date))
+    except OdooUnavailable as e:
+        # Odoo saturado o con el circuito abierto: último resultado bueno, marcado
+        stale = stale_result(get_cache(), key, e)
+        if stale is None:
+            raise
+        return stale
+
+
+def stale_result(cache, key, error):
+    """Último resultado bueno de `key` con la marca 'desactualizado', o None."""
+    found = cache.last_good(key)
+    if found is None:
+        return None
+    value, created = found
+    return dict(value, desactualizado={
+        "generado": datetime.fromtimestamp(created, timezone.utc).isoformat(timespec="seconds"),
+        "antiguedad_s": round(time.time() - created),
+        "motivo": str(error),
+    })
+
+
+def is_historical(end_date):
+    return end_date < date.today().isoformat()
+
+
+def key_span(key):
+    """(primer día, último día) de los datos de los que depende la entrada `key`.
+
+    Los resúmenes y /top se comparan con el periodo anterior; /serie incluye
+    el cubo anterior al rango para la primera tendencia.
+    """
+    endpoint, start_date, end_date = key[:3]
+    parts = endpoint.split(".")
+    if len(parts) > 2 and parts[1] == "serie":
+        return series_buckets(start_date, end_date, parts[2])[0], end_date
+    return previous_period(start_date, end_date)[0], end_date
+
+
+def invalidate_summaries(endpoint=None, start_date=None, end_date=None):
+    def matches(key):
+        first, last = key_span(key)
+        return ((endpoint is None or key[0] == endpoint)
+                and (start_date is None or last >= start_date)
+                and (end_date is None or first <= end_date))
+    return get_cache().invalidate(matches)
@@ -0,0 +1,264 @@
+import logging
+import threading
+from datetime import date
+
+from flask import current_app
+
+from .cache import key_span
+from .tenants import using_tenant
+from .routes.ventas.views import VENTAS_METRICS, VENTAS_TOP
+from .routes.compras.views import COMPRAS_METRICS, COMPRAS_TOP
+from .routes.manufactura.views import MANUFACTURA_METRICS
+
+logger = logging.getLogger(__name__)
+
+# Área (prefijo de la clave de caché) -> métricas de las que dependen sus entradas
+AREA_METRICS = {
+    "ventas": VENTAS_METRICS + list(VENTAS_TOP.values()),
+    "compras": COMPRAS_METRICS + list(COMPRAS_TOP.values()),
+    "manufactura": MANUFACTURA_METRICS,
+    "tablero": VENTAS_METRICS + COMPRAS_METRICS + MANUFACTURA_METRICS,
+}
+
+# Las líneas toman la fecha y el estado de su pedido: cambian con él
+PARENT_MODELS = {
+    "sale.order.line": "sale.order",
+    "purchase.order.line": "purchase.order",
+}
+
+
+def _depends_on(metric, model):
+    return metric.model == model or PARENT_MODELS.get(metric.model) == model
+
+
+def areas_for(model):
+    return {area for area, metrics in AREA_METRICS.items() if any(_depends_on(m, model) for m in metrics)}
+
+
+def date_fields(model):
+    """Campos de fecha propios de `model` que usan las métricas."""
+    return sorted({m.date_field for metrics in AREA_METRICS.values() for m in metrics
+                   if m.model == model and "." not in m.date_field})
+
+
+def _day(value):
+    if not isinstance(value, str):
+        raise ValueError(f"Fecha no válida: {value!r}")
+    try:
+        return date.fromisoformat(value[:10]).isoformat()
+    except ValueError:
+        raise ValueError(f"Fecha no válida: {value!r}")
+
+
+def _record_id(value):
+    # bool es subclase de int: True no es un id
+    if not isinstance(value, int) or isinstance(value, bool) or value <= 0:
+        raise ValueError(f"Id no válido: {value!r}")
+    return value
+
+
+def parse_notification(payload):
+    """(modelo, días, ids, días anteriores) de un aviso de cambio.
+
+    Admite {"model", "dates": [...], "old_dates": [...], "ids": [...],
+    "records": [{...}]} y el cuerpo que envía la acción "Enviar notificación
+    webhook" de Odoo ({"_model", "_id", <campos>}). Los días salen de "dates"
+    y de los campos de fecha de cada registro; "old_dates" son los que el
+    registro deja (cambio de fecha, de estado o borrado) y es None si el
+    aviso no los indica.
+    """
+    if not isinstance(payload, dict):
+        raise ValueError("Cuerpo JSON requerido")
+    model = payload.get("model") or payload.get("_model")
+    if not model or not areas_for(model):
+        raise ValueError(f"Parámetro 'model' no soportado: {model}")
+    records = payload.get("records") or ([payload] if "_model" in payload else [])
+    if not all(isinstance(payload.get(name) or [], list) for name in ("records", "dates", "old_dates", "ids")):
+        raise ValueError("'records', 'dates', 'old_dates' e 'ids' deben ser listas")
+
+    days = {_day(value) for value in payload.get("dates") or []}
+    old_days = sorted({_day(value) for value in payload["old_dates"] or []}) if "old_dates" in payload else None
+    ids = {_record_id(value) for value in payload.get("ids") or []}
+    fields = date_fields(model)
+    for record in records:
+        if not isinstance(record, dict):
+            raise ValueError("Cada elemento de 'records' debe ser un objeto")
+        days |= {_day(record[field]) for field in fields if record.get(field)}
+        record_id = record.get("id") or record.get("_id")
+        if record_id:
+            ids.add(_record_id(record_id))
+    if not days and not ids and not old_days:
+        raise ValueError("Se requiere al menos una fecha ('dates' o los campos de fecha del registro) o un id")
+    return model, sorted(days), sorted(ids), old_days
+
+
+# Día comodín: el cambio afecta a todas las entradas del área
+ALL_DAYS = "*"
+
+
+def _affected(key, days_by_area):
+    days = days_by_area.get(key[0].split(".")[0])
+    if not days:
+        return False
+    if ALL_DAYS in days:
+        return True
+    first, last = key_span(key)
+    return any(first <= day <= last for day in days)
+
+
+class ChangeFeed:
+    """Aplica los avisos de cambios de Odoo a la caché de respuestas.
+
+    Cada aviso (modelo y días) elimina sólo las entradas de las áreas que
+    usan ese modelo cuyo rango, periodo anterior incluido, contiene alguno
+    de los días. Un aviso sólo con ids toma los días de los registros en
+    Odoo. Con agregados diarios el aviso además adelanta su sincronización,
+    que se hace en su hilo: al terminar se invalidan los días recalculados,
+    entre ellos los que un registro acaba de dejar. Sin agregados esos días
+    sólo se conocen si el aviso trae "old_dates"; si no, se invalidan las
+    áreas enteras. Con caché compartida
+    cada aviso se publica y cada worker lo aplica a su memoria en menos de
+    `poll_interval` segundos.
+    """
+
+    def __init__(self, app, shared=None, poll_interval=1.0):
+        self.app = app
+        self.shared = shared
+        self.poll_interval = poll_interval
+        self.notifications = 0
+        self.remote = 0
+        self.invalidated = 0
+        self._last_event = shared.last_event_id() if shared is not None else 0
+        self._thread = None
+        self._stop = threading.Event()
+
+    def notify(self, tenant, model, days, ids=(), old_days=None):
+        """Aplica un aviso recibido por este proceso y lo publica a los demás."""
+        self.notifications += 1
+        store = self._rollup_for(tenant)
+        whole = False
+        if store is None and old_days is None:
+            # Sin los días que deja el registro no se puede acotar
+            whole = True
+        elif store is None:
+            if not days and ids:
+                days = self._record_days(tenant, model, ids)
+            days = sorted(set(days) | set(old_days))
+            # Registros ya borrados y sin días anteriores: no hay nada que acotar
+            whole = not days
+        changes = {(model, ALL_DAYS)} if whole else {(model, day) for day in days}
+        if store is not None:
+            store.request_sync()
+        removed = self._invalidate(tenant, changes)
+        self._publish(tenant, changes, synced=False)
+        return {
+            "modelo": model,
+            "ids": list(ids),
+            "dias": sorted(days),
+            "areas_completas": sorted(areas_for(model)) if whole else [],
+            "invalidadas": removed,
+            "sincronizacion_pendiente": store is not None,
+        }
+
+    def _rollup_for(self, tenant):
+        store = self.app.extensions.get("rollup_store")
+        return store if store is not None and store.pool is tenant.pool else None
+
+    def _record_days(self, tenant, model, ids):
+        # Sin agregados no hay otra forma de saber a qué días afecta el cambio.
+        # search_read y no read: un id recién borrado no es un error. Las
+        # líneas toman la fecha de su pedido
+        parent = PARENT_MODELS.get(model)
+        with using_tenant(tenant), tenant.pool.connection() as connector:
+            if parent:
+                lines = connector.execute_kw(model, 'search_read', [[['id', 'in', list(ids)]]], {'fields': ['order_id']})
+                model, ids = parent, sorted({line['order_id'][0] for line in lines if line.get('order_id')})
+            fields = date_fields(model)
+            records = connector.execute_kw(model, 'search_read', [[['id', 'in', list(ids)]]], {'fields': fields}) if ids else []
+        return sorted({_day(record[field]) for record in records for field in fields if record.get(field)})
+
+    def rollup_synced(self, touched):
+        """Tras sincronizar los agregados: invalida los días recalculados en todos los workers."""
+        store = self.app.extensions["rollup_store"]
+        tenant = next(t for t in self.app.extensions["tenants"] if t.pool is store.pool)
+        changes = {(store.metrics[key].model, day) for key, day in touched}
+        with self.app.app_context():
+            self._invalidate(tenant, changes)
+        self._publish(tenant, changes, synced=True)
+
+    def _publish(self, tenant, changes, synced):
+        if self.shared is not None:
+            self.shared.publish({"tenant": tenant.name, "changes": sorted(changes), "synced": synced})
+
+    def _invalidate(self, tenant, changes):
+        cache = self.app.extensions.get("response_cache")
+        if cache is None:
+            return 0
+        days_by_area = {}
+        for model, day in changes:
+            for area in areas_for(model):
+                days_by_area.setdefault(area, set()).add(day)
+        with using_tenant(tenant):
+            removed = cache.invalidate(lambda key: _affected(key, days_by_area))
+        self.invalidated += removed
+        return removed
+
+    # === Avisos recibidos por otros workers ===
+
+    def poll(self):
+        self._last_event, messages = self.shared.events(self._last_event)
+        tenants = self.app.extensions["tenants"]
+        for message in messages:
+            tenant = tenants.tenants.get(message["tenant"])
+            if tenant is None:
+                continue
+            store = self._rollup_for(tenant)
+            if store is not None and message.get("synced"):
+                # Otro worker ya sincronizó: basta con releer las sumas
+                store.reload()
+            elif store is not None:
+                store.request_sync()
+            changes = {tuple(change) for change in message["changes"]}
+            with self.app.app_context():
+                self._invalidate(tenant, changes)
+            self.remote += 1
+
+    def _loop(self):
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self.poll()
+            except Exception:
+                logger.exception("Error aplicando los avisos de cambios de otros workers")
+
+    def start(self):
+        if self.shared is None:
+            return
+        self._thread = threading.Thread(target=self._loop, name="change-feed", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def stats(self):
+        return {"notifications": self.notifications, "remote": self.remote, "invalidated": self.invalidated}
+
+
+def init_changes(app):
+    if not app.config.get('WEBHOOK_TOKEN'):
+        return
+    feed = ChangeFeed(
+        app,
+        shared=app.extensions.get("shared_cache"),
+        poll_interval=app.config.get('WEBHOOK_POLL_INTERVAL', 1),
+    )
+    app.extensions["change_feed"] = feed
+    store = app.extensions.get("rollup_store")
+    if store is not None:
+        store.on_sync(feed.rollup_synced)
+    # Con BACKGROUND_DEFERRED lo arranca cada worker tras el fork (app/serving.py)
+    if not app.config.get('BACKGROUND_DEFERRED'):
+        feed.start()
+
+
+def get_change_feed():
+    return current_app.extensions.get("change_feed")
@@ -5,3 +5,112 @@ class Config:
     ODOO_DB = os.getenv("ODOO_DB", "nombre_de_base")
     ODOO_USER = os.getenv("ODOO_USER", "admin")
     ODOO_PASSWORD = os.getenv("ODOO_PASSWORD", "admin")
+    # xmlrpc o jsonrpc (usa orjson si está instalado)
+    ODOO_TRANSPORT = os.getenv("ODOO_TRANSPORT", "xmlrpc")
+
+    # Varias bases de Odoo (multi-tenant): JSON {"nombre": {"url", "db", "user", "password",
+    # "transport", "timeout", "pool_size", "rpc_workers", "max_requests"}} en ODOO_TENANTS
+    # o en el fichero ODOO_TENANTS_FILE; lo que no se indique se toma de ODOO_*.
+    # La base de ODOO_* es siempre el tenant "default". Se elige con la cabecera
+    # TENANT_HEADER o el prefijo /t/<tenant>/; sin ninguno se usa TENANT_DEFAULT
+    # (vacío = obligatorio indicarlo). TENANT_MAX_REQUESTS: peticiones en curso por
+    # tenant antes de responder 429 (0 = sin límite)
+    ODOO_TENANTS = os.getenv("ODOO_TENANTS", "")
+    ODOO_TENANTS_FILE = os.getenv("ODOO_TENANTS_FILE", "")
+    TENANT_DEFAULT = os.getenv("TENANT_DEFAULT", "default")
+    TENANT_HEADER = os.getenv("TENANT_HEADER", "X-Tenant")
+    TENANT_MAX_REQUESTS = int(os.getenv("TENANT_MAX_REQUESTS", "0"))
+
+    # Pool de conexiones a Odoo
+    ODOO_TIMEOUT = float(os.getenv("ODOO_TIMEOUT", "30"))
+    ODOO_POOL_SIZE = int(os.getenv("ODOO_POOL_SIZE", "8"))
+    ODOO_POOL_IDLE_TIMEOUT = float(os.getenv("ODOO_POOL_IDLE_TIMEOUT", "60"))
+    ODOO_POOL_TIMEOUT = float(os.getenv("ODOO_POOL_TIMEOUT", "10"))
+
+    # Ejecución en paralelo de las consultas de cada petición
+    ODOO_RPC_WORKERS = int(os.getenv("ODOO_RPC_WORKERS", "8"))
+    ODOO_REQUEST_DEADLINE = float(os.getenv("ODOO_REQUEST_DEADLINE", "30"))
+    ODOO_PAGE_SIZE = int(os.getenv("ODOO_PAGE_SIZE", "1000"))
+    BATCH_MAX_RANGES = int(os.getenv("BATCH_MAX_RANGES", "50"))
+    # Máximo de grupos por página en los drill-down /top
+    TOP_MAX_LIMIT = int(os.getenv("TOP_MAX_LIMIT", "100"))
+    # Segundos que se reutiliza la tabla de tipos de cambio (?group_by=company)
+    CURRENCY_RATES_TTL = float(os.getenv("CURRENCY_RATES_TTL", "3600"))
+
+    # Protección de Odoo: límite adaptativo (AIMD) de llamadas en vuelo por proceso
+    # y circuit breaker; con el circuito abierto se sirve el último resultado bueno
+    ODOO_GUARD_ENABLED = os.getenv("ODOO_GUARD_ENABLED", "true").lower() == "true"
+    ODOO_LIMIT_INITIAL = int(os.getenv("ODOO_LIMIT_INITIAL", "8"))
+    ODOO_LIMIT_MIN = int(os.getenv("ODOO_LIMIT_MIN", "1"))
+    ODOO_LIMIT_MAX = int(os.getenv("ODOO_LIMIT_MAX", "16"))
+    ODOO_LIMIT_TARGET_LATENCY = float(os.getenv("ODOO_LIMIT_TARGET_LATENCY", "2"))
+    ODOO_LIMIT_QUEUE_TIMEOUT = float(os.getenv("ODOO_LIMIT_QUEUE_TIMEOUT", "5"))
+    ODOO_BREAKER_THRESHOLD = float(os.getenv("ODOO_BREAKER_THRESHOLD", "0.5"))
+    ODOO_BREAKER_MIN_CALLS = int(os.getenv("ODOO_BREAKER_MIN_CALLS", "10"))
+    ODOO_BREAKER_WINDOW = float(os.getenv("ODOO_BREAKER_WINDOW", "30"))
+    ODOO_BREAKER_OPEN_SECONDS = float(os.getenv("ODOO_BREAKER_OPEN_SECONDS", "30"))
+
+    # Caché de respuestas (segundos)
+    CACHE_ENABLED = os.getenv("CACHE_ENABLED", "true").lower() == "true"
+    CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "256"))
+    CACHE_TTL = float(os.getenv("CACHE_TTL", "30"))
+    CACHE_HISTORICAL_TTL = float(os.getenv("CACHE_HISTORICAL_TTL", "3600"))
+    CACHE_STALE_TTL = float(os.getenv("CACHE_STALE_TTL", "300"))
+
+    # Avisos de cambios desde Odoo (POST /webhooks/odoo, token en la cabecera
+    # X-Webhook-Token, nunca en la URL; vacío = desactivado): cada cambio elimina sólo
+    # las entradas cuyos rangos incluyen los días afectados. Sin ROLLUP_ENABLED
+    # el aviso debe traer también los días que deja el registro ("old_dates");
+    # si no, se invalida el área entera. Con avisos de todas las altas, cambios y
+    # borrados CACHE_HISTORICAL_TTL puede subirse mucho; si falta alguno, los
+    # totales afectados no se corrigen hasta que caduque. WEBHOOK_POLL_INTERVAL:
+    # segundos en que cada worker recoge los avisos recibidos por otro
+    WEBHOOK_TOKEN = os.getenv("WEBHOOK_TOKEN", "")
+    WEBHOOK_POLL_INTERVAL = float(os.getenv("WEBHOOK_POLL_INTERVAL", "1"))
+    # Token para DELETE /health/cache en la cabecera X-Admin-Token; sin él se usa
+    # WEBHOOK_TOKEN y si ninguno está definido la operación queda desactivada
+    ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "") or WEBHOOK_TOKEN
+
+    # Segundo nivel de caché en SQLite común a los workers de la máquina (vacío =
+    # desactivado): resúmenes calculados y uid de Odoo, para que añadir workers
+    # no multiplique los cálculos ni los logins
+    SHARED_CACHE_PATH = os.getenv("SHARED_CACHE_PATH", "")
+    SHARED_CACHE_MAX_ENTRIES = int(os.getenv("SHARED_CACHE_MAX_ENTRIES", "5000"))
+
+    # Hilos en segundo plano (sincronización de agregados y precálculo) arrancados
+    # por cada worker tras el fork en lugar de al crear la app (gunicorn.conf.py)
+    BACKGROUND_DEFERRED = os.getenv("BACKGROUND_DEFERRED", "false").lower() == "true"
+
+    # Peticiones idénticas simultáneas comparten un solo cálculo (single-flight).
+    # COALESCE_DIR: directorio común a los workers para agrupar entre procesos
+    COALESCE_ENABLED = os.getenv("COALESCE_ENABLED", "true").lower() == "true"
+    COALESCE_DIR = os.getenv("COALESCE_DIR", "")
+    COALESCE_TIMEOUT = float(os.getenv("COALESCE_TIMEOUT", "35"))
+
+    # Agregados diarios locales sincronizados con Odoo
+    ROLLUP_ENABLED = os.getenv("ROLLUP_ENABLED", "false").lower() == "true"
+    ROLLUP_PATH = os.getenv("ROLLUP_PATH", "rollup.sqlite3")
+    ROLLUP_SYNC_INTERVAL = float(os.getenv("ROLLUP_SYNC_INTERVAL", "60"))
+    ROLLUP_RECONCILE_INTERVAL = float(os.getenv("ROLLUP_RECONCILE_INTERVAL", "3600"))
+    ROLLUP_PAGE_SIZE = int(os.getenv("ROLLUP_PAGE_SIZE", "2000"))
+    # Segundos que se esperan tras un aviso de cambio para sincronizar una sola vez por ráfaga
+    ROLLUP_SYNC_DEBOUNCE = float(os.getenv("ROLLUP_SYNC_DEBOUNCE", "1"))
+
+    # Precálculo periódico de los rangos más pedidos (deja los resultados en la caché)
+    PRECOMPUTE_ENABLED = os.getenv("PRECOMPUTE_ENABLED", "false").lower() == "true"
+    PRECOMPUTE_RANGES = os.getenv("PRECOMPUTE_RANGES", "today,week,month_to_date,previous_month,last_30_days")
+    PRECOMPUTE_INTERVAL = float(os.getenv("PRECOMPUTE_INTERVAL", "60"))
+    PRECOMPUTE_JITTER = float(os.getenv("PRECOMPUTE_JITTER", "10"))
+
+    # Stream SSE (/stream): segundos entre recálculos, cola por cliente y keepalive.
+    # STREAM_MAX_SUBSCRIBERS es por proceso; con gunicorn se limita a sus hilos
+    # menos dos (gunicorn.conf.py), porque cada cliente retiene un hilo
+    STREAM_INTERVAL = float(os.getenv("STREAM_INTERVAL", "15"))
+    STREAM_QUEUE_SIZE = int(os.getenv("STREAM_QUEUE_SIZE", "16"))
+    STREAM_KEEPALIVE = float(os.getenv("STREAM_KEEPALIVE", "15"))
+    STREAM_MAX_SUBSCRIBERS = int(os.getenv("STREAM_MAX_SUBSCRIBERS", "500"))
+
+    # Perfilado: peticiones más lentas que PROFILE_SLOW_MS se registran en el log
+    # con su desglose; una fracción PROFILE_SAMPLE_RATE se perfila con cProfile
+    PROFILE_SLOW_MS = float(os.getenv("PROFILE_SLOW_MS", "0"))
+    PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
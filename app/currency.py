@@ -0,0 +1,99 @@
+import threading
+import time
+from bisect import bisect_right
+
+from flask import current_app
+
+from .tenants import tenant_name
+
+
+def many2one(value):
+    # many2one llega como [id, nombre]; False si está vacío
+    if isinstance(value, (list, tuple)) and value:
+        return value[0], value[1]
+    return None, None
+
+
+class RateTable:
+    """Tipos de cambio de Odoo (res.currency.rate) para convertir en local.
+
+    En Odoo `rate` es cuántas unidades de la moneda equivalen a una de la
+    moneda de la compañía. Cada compañía puede tener sus propias tasas o usar
+    las comunes (sin compañía); se toma la última tasa hasta el día pedido y,
+    si no hay ninguna, 1.
+    """
+
+    def __init__(self, rates, companies):
+        self.companies = {company["id"]: many2one(company.get("currency_id")) for company in companies}
+        self._series = {}
+        for rate in sorted(rates, key=lambda r: str(r["name"])):
+            currency_id = many2one(rate.get("currency_id"))[0]
+            company_id = many2one(rate.get("company_id"))[0]
+            days, values = self._series.setdefault((currency_id, company_id), ([], []))
+            days.append(str(rate["name"])[:10])
+            values.append(rate["rate"])
+
+    def rate(self, currency_id, company_id, day):
+        for key in ((currency_id, company_id), (currency_id, None)):
+            days, values = self._series.get(key, ((), ()))
+            i = bisect_right(days, day)
+            if i:
+                return values[i - 1]
+        return 1.0
+
+    def company_currency(self, company_id):
+        """(id, nombre) de la moneda de la compañía."""
+        return self.companies.get(company_id, (None, None))
+
+    def convert(self, amount, currency_id, company_id, day):
+        """Importe en `currency_id` expresado en la moneda de la compañía el día `day`."""
+        target = self.company_currency(company_id)[0]
+        if target is None or currency_id is None or currency_id == target:
+            return amount
+        return amount * self.rate(target, company_id, day) / self.rate(currency_id, company_id, day)
+
+
+class RateCache:
+    """RateTable por tenant, que se vuelve a leer de Odoo cada `ttl` segundos."""
+
+    RATE_FIELDS = ['name', 'rate', 'currency_id', 'company_id']
+
+    def __init__(self, ttl=3600):
+        self.ttl = ttl
+        self.loads = 0
+        self._tables = {}
+        self._lock = threading.Lock()
+
+    def get(self):
+        with self._lock:
+            found = self._tables.get(tenant_name())
+        if found is not None and time.monotonic() - found[0] < self.ttl:
+            return found[1]
+        return None
+
+    def submit(self, batch):
+        """Encola en `batch` la lectura de tasas y compañías.
+
+        Devuelve una función que, después de batch.run(), construye la tabla,
+        la guarda y la devuelve: las tasas viajan junto a los read_group.
+        """
+        rates = batch.submit('res.currency.rate', 'search_read', [[]], {'fields': self.RATE_FIELDS})
+        companies = batch.submit('res.company', 'search_read', [[]], {'fields': ['name', 'currency_id']})
+        name = tenant_name()
+
+        def build():
+            table = RateTable(rates.result(), companies.result())
+            with self._lock:
+                self._tables[name] = (time.monotonic(), table)
+                self.loads += 1
+            return table
+
+        return build
+
+
+def init_rates(app):
+    app.extensions["currency_rates"] = RateCache(ttl=app.config.get('CURRENCY_RATES_TTL', 3600))
+
+
+def get_rates():
+    return current_app.extensions["currency_rates"]
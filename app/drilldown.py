@@ -0,0 +1,111 @@
+import base64
+import hashlib
+import json
+from functools import partial
+
+from flask import current_app
+
+from .cache import normalize_range
+from .http_cache import summary_response
+from .kpi import evaluate_breakdown, evaluate_top, previous_period
+from .series import trends
+
+TOP_DEFAULT_LIMIT = 10
+
+
+def _fingerprint(area, by, limit, start_date, end_date):
+    # Un cursor sólo vale para la consulta que lo generó
+    return hashlib.blake2b(f"{area}|{by}|{limit}|{start_date}|{end_date}".encode(), digest_size=6).hexdigest()
+
+
+def encode_cursor(offset, fingerprint):
+    raw = json.dumps({"o": offset, "f": fingerprint}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor, fingerprint):
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        offset = int(data["o"])
+    except (ValueError, TypeError, KeyError):
+        raise ValueError("Parámetro 'cursor' no válido")
+    if data.get("f") != fingerprint or offset < 0:
+        raise ValueError("El cursor no corresponde a esta consulta")
+    return offset
+
+
+def _group(value):
+    # many2one llega como [id, nombre]; False es el grupo sin valor
+    if isinstance(value, (list, tuple)) and len(value) == 2:
+        return value[0], value[1]
+    if value is False:
+        return None, None
+    return value, value
+
+
+def build_top(metric, by, limit, offset, fingerprint, start_date, end_date):
+    """Payload de /top: una página de grupos con su total actual y anterior."""
+    rows, has_more = evaluate_top(metric, by, start_date, end_date, limit, offset)
+    resultados = []
+    for value, current, previous in rows:
+        group_id, name = _group(value)
+        base = (previous.total, current.total) if metric.measure else (previous.count, current.count)
+        resultados.append({
+            "id": group_id,
+            "nombre": name,
+            "total": round(current.total, 2),
+            "cantidad": current.count,
+            "total_anterior": round(previous.total, 2),
+            "cantidad_anterior": previous.count,
+            "tendencia": trends(list(base))[0],
+        })
+    return {
+        "por": by,
+        "resultados": resultados,
+        "siguiente": encode_cursor(offset + limit, fingerprint) if has_more else None
+    }
+
+
+def top_response(area, dimensions, by, start_date, end_date, limit=None, cursor=None):
+    """Drill-down `by` de `area`, paginado con cursor y servido como los resúmenes.
+
+    `dimensions` asocia cada campo admitido en ?by= con la métrica que se
+    reparte entre sus valores.
+    """
+    if by not in dimensions:
+        raise ValueError(f"Parámetro 'by' debe ser {' o '.join(dimensions)}")
+    max_limit = current_app.config.get('TOP_MAX_LIMIT', 100)
+    try:
+        limit = int(limit) if limit else TOP_DEFAULT_LIMIT
+    except ValueError:
+        raise ValueError("Parámetro 'limit' debe ser un entero")
+    if not 1 <= limit <= max_limit:
+        raise ValueError(f"Parámetro 'limit' debe estar entre 1 y {max_limit}")
+
+    start_date, end_date = normalize_range(start_date, end_date)
+    fingerprint = _fingerprint(area, by, limit, start_date, end_date)
+    offset = decode_cursor(cursor, fingerprint) if cursor else 0
+
+    build = partial(build_top, dimensions[by], by, limit, offset, fingerprint)
+    return summary_response(f"{area}.top.{by}.{limit}.{offset}", build, start_date, end_date)
+
+
+def build_breakdown(metrics, build_payload, by, start_date, end_date, raw=False):
+    """Payload de ?group_by=: el resumen de siempre por compañía o por moneda.
+
+    `build_payload` es el constructor del resumen del área; cada grupo lleva
+    sus importes en su moneda (la de la compañía al agrupar por compañía).
+    """
+    periods = [(start_date, end_date), previous_period(start_date, end_date)]
+    return {
+        "por": by,
+        "grupos": [
+            {
+                "id": group.id,
+                "nombre": group.name,
+                "moneda": group.currency,
+                "resumen": build_payload(group.values, raw, group.currency),
+            }
+            for group in evaluate_breakdown(metrics, periods, by)
+        ]
+    }
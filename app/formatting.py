@@ -0,0 +1,38 @@
+# === Formato de importes y porcentajes de los resúmenes ===
+# Por defecto texto listo para mostrar ("$1,234.50", "+12.3%"). Con ?format=raw
+# los mismos campos van como números y la moneda se indica aparte, para que el
+# frontend grafique sin volver a parsear cadenas.
+
+RESPONSE_FORMATS = ("display", "raw")
+
+# Los importes de los tableros están en pesos mexicanos salvo en los desgloses
+# por compañía o moneda (?group_by=), donde cada grupo indica la suya
+CURRENCY = {"codigo": "MXN", "simbolo": "$", "decimales": 2}
+SYMBOLS = {"MXN": "$", "USD": "$", "CAD": "$", "EUR": "€", "GBP": "£"}
+
+
+def format_mxn(value):
+    return f"${value:,.2f}"
+
+
+def money(value, raw=False, currency_code=None):
+    if raw:
+        return round(value, CURRENCY["decimales"])
+    if currency_code in (None, CURRENCY["codigo"]):
+        return format_mxn(value)
+    return f"{value:,.2f} {currency_code}"
+
+
+def percent(value, raw=False, signed=True):
+    if raw:
+        return round(value, 1)
+    return f"{value:+.1f}%" if signed else f"{value:.1f}%"
+
+
+def currency(raw=False, currency_code=None):
+    """Metadatos de moneda que acompañan a los importes en modo raw."""
+    if not raw:
+        return {}
+    if currency_code in (None, CURRENCY["codigo"]):
+        return {"moneda": dict(CURRENCY)}
+    return {"moneda": {"codigo": currency_code, "simbolo": SYMBOLS.get(currency_code), "decimales": CURRENCY["decimales"]}}
@@ -0,0 +1,137 @@
+import gzip
+import hashlib
+import threading
+from functools import partial
+
+from flask import current_app, request
+from werkzeug.datastructures import MIMEAccept
+from werkzeug.http import parse_accept_header, parse_etags
+
+from .cache import cached_summary, get_cache, normalize_range
+from .transports import json_dumps
+
+try:
+    import brotli
+except ImportError:  # brotli es opcional: sin él se negocia sólo gzip
+    brotli = None
+
+try:
+    import msgpack
+except ImportError:  # msgpack es opcional: sin él se sirve siempre JSON
+    msgpack = None
+
+# Por debajo de este tamaño comprimir cuesta más de lo que ahorra
+MIN_COMPRESS_SIZE = 512
+
+JSON_MIMETYPE = "application/json"
+MSGPACK_MIMETYPE = "application/msgpack"
+# Nombres con los que los clientes piden MessagePack en Accept
+MSGPACK_MIMETYPES = (MSGPACK_MIMETYPE, "application/x-msgpack", "application/vnd.msgpack")
+
+
+class RenderedJSON:
+    """Cuerpo ya serializado con su ETag y sus versiones comprimidas.
+
+    Se guarda junto a la entrada de caché: un sondeo que acierta en caché no
+    vuelve a serializar, a calcular el hash ni a comprimir. Normalmente es
+    JSON; con `mimetype` MSGPACK_MIMETYPE es el mismo payload en MessagePack.
+    Cada codificación tiene su propio ETag fuerte ("<hash>-gzip"), porque sus
+    bytes son distintos; cualquiera de ellos vale para un 304.
+    """
+
+    def __init__(self, body, mimetype=JSON_MIMETYPE):
+        self.body = body
+        self.mimetype = mimetype
+        self.etag = hashlib.blake2b(body, digest_size=16).hexdigest()
+        self._encoded = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_payload(cls, json_provider, payload, raw=False, media="json"):
+        if media == "msgpack":
+            return cls(msgpack.packb(payload), MSGPACK_MIMETYPE)
+        if raw:
+            # Modo numérico: serializador rápido (orjson si está instalado)
+            return cls(json_dumps(payload))
+        # Mismo serializador que jsonify para que el cuerpo sea idéntico
+        return cls(json_provider.response(payload).get_data())
+
+    def encoded(self, encoding):
+        with self._lock:
+            body = self._encoded.get(encoding)
+            if body is None:
+                if encoding == "br":
+                    body = brotli.compress(self.body, quality=5)
+                else:
+                    body = gzip.compress(self.body, compresslevel=6, mtime=0)
+                self._encoded[encoding] = body
+            return body
+
+    def choose_encoding(self, accept_encoding):
+        """Content-Encoding que corresponde a la cabecera Accept-Encoding, o None."""
+        if len(self.body) < MIN_COMPRESS_SIZE or not accept_encoding:
+            return None
+        accepted = parse_accept_header(accept_encoding)
+        for encoding in ("br", "gzip"):
+            if encoding == "br" and brotli is None:
+                continue
+            if accepted[encoding]:
+                return encoding
+        return None
+
+    def tag(self, encoding=None):
+        return f"{self.etag}-{encoding}" if encoding else self.etag
+
+    def not_modified(self, if_none_match):
+        if not if_none_match:
+            return False
+        etags = parse_etags(if_none_match)
+        return any(etags.contains(self.tag(encoding)) for encoding in (None, "gzip", "br"))
+
+    def headers(self, encoding=None):
+        """ETag de la versión en `encoding` y Vary; el Content-Encoding lo pone quien envía el cuerpo."""
+        return {"ETag": f'"{self.tag(encoding)}"', "Vary": "Accept, Accept-Encoding" if msgpack is not None else "Accept-Encoding"}
+
+
+def negotiate_media(accept):
+    """'msgpack' si el cliente lo prefiere en Accept y está disponible; si no, 'json'."""
+    if msgpack is None or not accept:
+        return "json"
+    best = parse_accept_header(accept, MIMEAccept).best_match((JSON_MIMETYPE,) + MSGPACK_MIMETYPES)
+    return "msgpack" if best in MSGPACK_MIMETYPES else "json"
+
+
+def render(key, payload, raw=False, media="json"):
+    """RenderedJSON de `payload`, reutilizando el de la entrada de caché `key`."""
+    def build(value):
+        return RenderedJSON.from_payload(current_app.json, value, raw, media)
+
+    if not current_app.config.get('CACHE_ENABLED', True):
+        return build(payload)
+    return get_cache().rendered(key, payload, build, variant=media)
+
+
+def conditional_response(rendered, status=200):
+    """Respuesta con ETag fuerte: 304 si el cliente ya tiene esta versión."""
+    encoding = rendered.choose_encoding(request.headers.get("Accept-Encoding"))
+    headers = rendered.headers(encoding)
+    if status == 200 and rendered.not_modified(request.headers.get("If-None-Match")):
+        return current_app.response_class(status=304, headers=headers)
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    body = rendered.encoded(encoding) if encoding else rendered.body
+    return current_app.response_class(body, status=status, mimetype=rendered.mimetype, headers=headers)
+
+
+def summary_response(endpoint, build, start_date, end_date, raw=False):
+    """cached_summary servido con ETag/304 y compresión negociada.
+
+    Con `raw` se llama a build(..., raw=True) y el resultado se guarda en su
+    propia entrada de caché ("<endpoint>.raw").
+    """
+    if raw:
+        endpoint, build = f"{endpoint}.raw", partial(build, raw=True)
+    result = cached_summary(endpoint, build, start_date, end_date)
+    start_date, end_date = normalize_range(start_date, end_date)
+    media = negotiate_media(request.headers.get("Accept"))
+    return conditional_response(render((endpoint, start_date, end_date), result, raw, media))
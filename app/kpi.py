@@ -0,0 +1,442 @@
+from collections import namedtuple
+from datetime import date, datetime, timedelta
+
+from flask import current_app
+
+from .async_connector import run_concurrently
+from .currency import get_rates, many2one
+from .odoo_connector import get_pool
+from .rpc_batch import new_batch
+
+MetricValue = namedtuple("MetricValue", ["total", "count"])
+# Un grupo del desglose por compañía o moneda; `values` como los de evaluate
+BreakdownGroup = namedtuple("BreakdownGroup", ["id", "name", "currency", "values"])
+
+# ?group_by= -> campos que se añaden al groupby
+BREAKDOWNS = {
+    "company": ("company_id", "currency_id"),
+    "currency": ("currency_id",),
+}
+
+
+class Metric:
+    """KPI declarativo: suma de `measure` y número de registros de `model`.
+
+    `domain` sólo contiene las condiciones propias del KPI; el rango de
+    fechas sobre `date_field` lo añade el planificador.
+    """
+
+    def __init__(self, key, model, date_field, domain, measure=None, datetime_field=False):
+        self.key = key
+        self.model = model
+        self.date_field = date_field
+        self.domain = [list(leaf) for leaf in domain]
+        self.measure = measure
+        self.datetime_field = datetime_field
+
+    def period_domain(self, start_date, end_date):
+        """Dominio de los registros que suma el KPI en el periodo, con los
+        mismos límites de fecha que el read_group del planificador."""
+        return [
+            [self.date_field, '>=', start_date],
+            [self.date_field, '<=', end_date],
+        ] + [list(leaf) for leaf in self.domain]
+
+    def __repr__(self):
+        return f"Metric({self.key!r}, {self.model!r})"
+
+
+def previous_period(start_date, end_date):
+    start = datetime.strptime(start_date, "%Y-%m-%d")
+    end = datetime.strptime(end_date, "%Y-%m-%d")
+    delta = end - start
+    return (start - delta).strftime("%Y-%m-%d"), (end - delta).strftime("%Y-%m-%d")
+
+
+GRANULARITIES = ("day", "week", "month")
+
+
+def bucket_start(day, granularity):
+    if granularity == "week":
+        return day - timedelta(days=day.weekday())
+    if granularity == "month":
+        return day.replace(day=1)
+    return day
+
+
+def next_bucket(day, granularity):
+    if granularity == "week":
+        return day + timedelta(days=7)
+    if granularity == "month":
+        return (day.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return day + timedelta(days=1)
+
+
+def _leaf_key(leaf):
+    field, op, value = leaf
+    return field, op, tuple(value) if isinstance(value, list) else value
+
+
+def _group_value(value):
+    # many2one llega como [id, nombre]
+    return value[0] if isinstance(value, (list, tuple)) and value else value
+
+
+class GroupedQuery:
+    """Un read_group que resuelve varias métricas y varios periodos a la vez.
+
+    Se agrupa por día (o semana/mes) sobre la unión de los periodos y por los
+    campos en los que difieren los dominios de las métricas; después se
+    reparte cada fila entre las métricas y periodos que le corresponden.
+    `breakdown` añade campos al groupby (compañía, moneda) para desglosar en
+    la misma llamada.
+    """
+
+    def __init__(self, model, date_field, metrics, granularity="day", breakdown=()):
+        self.model = model
+        self.date_field = date_field
+        self.metrics = metrics
+        self.granularity = granularity
+        self.breakdown = list(breakdown)
+        self.datetime_field = any(m.datetime_field for m in metrics)
+
+        domains = [{_leaf_key(leaf) for leaf in m.domain} for m in metrics]
+        self.common = [list(leaf) for leaf in metrics[0].domain if _leaf_key(leaf) in set.intersection(*domains)]
+        common_keys = {_leaf_key(leaf) for leaf in self.common}
+
+        # Campos en los que difieren las métricas: pasan a ser parte del groupby
+        self.split_fields = sorted({leaf[0] for m in metrics for leaf in m.domain if _leaf_key(leaf) not in common_keys})
+        self.split_domain = []
+        for field in self.split_fields:
+            wanted = [self._wanted(m, field) for m in metrics]
+            # Si alguna métrica no filtra por el campo, no se puede acotar el dominio
+            if all(values is not None for values in wanted):
+                self.split_domain.append([field, 'in', sorted({v for values in wanted for v in values}, key=str)])
+
+        self.measures = sorted({m.measure for m in metrics if m.measure})
+
+    @staticmethod
+    def _wanted(metric, field):
+        for _, op, value in (leaf for leaf in metric.domain if leaf[0] == field):
+            return list(value) if op == 'in' else [value]
+        return None
+
+    @property
+    def groupby(self):
+        return [f"{self.date_field}:{self.granularity}"] + self.split_fields + [
+            field for field in self.breakdown if field not in self.split_fields]
+
+    def rpc(self, periods):
+        first = min(p[0] for p in periods)
+        last = max(p[1] for p in periods)
+        domain = [
+            [self.date_field, '>=', first],
+            [self.date_field, '<=', last],
+        ] + self.common + self.split_domain
+        fields = [f"{measure}:sum" for measure in self.measures]
+        # tz UTC para que los cortes por día coincidan con el dominio
+        kwargs = {'lazy': False, 'context': {'tz': 'UTC'}}
+        return 'read_group', [domain, fields, self.groupby], kwargs
+
+    def _row_day(self, row):
+        groupby_key = f"{self.date_field}:{self.granularity}"
+        bounds = (row.get('__range') or {}).get(groupby_key)
+        if bounds:
+            return bounds['from'][:10]
+        for leaf in row.get('__domain') or []:
+            if isinstance(leaf, (list, tuple)) and leaf[0] == self.date_field and leaf[1] == '>=':
+                return str(leaf[2])[:10]
+        raise ValueError(f"No se pudo determinar el día del grupo de {self.model}")
+
+    def _in_period(self, day, period, last):
+        start, end = period
+        if day < start or day > end:
+            return False
+        # En campos datetime '<= end' sólo alcanza la medianoche de `end`:
+        # ese día pertenece al periodo sólo si es el final de la consulta.
+        if self.datetime_field and day == end and end != last:
+            return False
+        return True
+
+    def _contributions(self, rows):
+        # (fila, métrica, día del grupo, importe, registros) por cada fila que le aplica
+        for row in rows:
+            day = self._row_day(row)
+            count = row.get('__count', 0)
+            for metric in self.metrics:
+                if not all(leaf_matches(row.get(leaf[0]), leaf)
+                           for leaf in metric.domain if leaf[0] in self.split_fields):
+                    continue
+                amount = (row.get(metric.measure) or 0.0) if metric.measure else 0.0
+                yield row, metric, day, amount, count
+
+    def split(self, rows, periods):
+        last = max(p[1] for p in periods)
+        totals = {m.key: [[0.0, 0] for _ in periods] for m in self.metrics}
+        for _, metric, day, amount, count in self._contributions(rows):
+            for i, period in enumerate(periods):
+                if self._in_period(day, period, last):
+                    totals[metric.key][i][0] += amount
+                    totals[metric.key][i][1] += count
+        return {key: [MetricValue(total, count) for total, count in values] for key, values in totals.items()}
+
+    def split_groups(self, rows, periods, group_of):
+        """Como split, pero por grupo del desglose: {grupo: {metric.key: [MetricValue]}}.
+
+        group_of(fila, día, importe) devuelve (grupo, importe a sumar), lo que
+        permite convertir de moneda fila a fila.
+        """
+        last = max(p[1] for p in periods)
+        groups = {}
+        for row, metric, day, amount, count in self._contributions(rows):
+            group, amount = group_of(row, day, amount)
+            totals = groups.setdefault(group, {m.key: [[0.0, 0] for _ in periods] for m in self.metrics})
+            for i, period in enumerate(periods):
+                if self._in_period(day, period, last):
+                    totals[metric.key][i][0] += amount
+                    totals[metric.key][i][1] += count
+        return {group: {key: [MetricValue(total, count) for total, count in values] for key, values in totals.items()}
+                for group, totals in groups.items()}
+
+    def split_buckets(self, rows, buckets):
+        index = {bucket: i for i, bucket in enumerate(buckets)}
+        totals = {m.key: [[0.0, 0] for _ in buckets] for m in self.metrics}
+        for _, metric, day, amount, count in self._contributions(rows):
+            i = index.get(bucket_start(date.fromisoformat(day), self.granularity).isoformat())
+            if i is not None:
+                totals[metric.key][i][0] += amount
+                totals[metric.key][i][1] += count
+        return {key: [MetricValue(total, count) for total, count in values] for key, values in totals.items()}
+
+
+def leaf_matches(value, leaf):
+    _, op, wanted = leaf
+    value = _group_value(value)
+    return value in wanted if op == 'in' else value == wanted
+
+
+def mergeable(metric):
+    return all(op in ('=', 'in') for _, op, _ in metric.domain)
+
+
+def plan(metrics, granularity="day", breakdown=()):
+    """Agrupa las métricas en el mínimo número de read_group."""
+    groups = {}
+    queries = []
+    for metric in metrics:
+        if mergeable(metric):
+            groups.setdefault((metric.model, metric.date_field), []).append(metric)
+        else:
+            queries.append(GroupedQuery(metric.model, metric.date_field, [metric], granularity, breakdown))
+    for (model, date_field), members in groups.items():
+        queries.append(GroupedQuery(model, date_field, members, granularity, breakdown))
+    return queries
+
+
+def evaluate(metrics, periods, batch=None):
+    """Devuelve {metric.key: [MetricValue por periodo]}.
+
+    Si hay almacén local de agregados y cubre las métricas, se responde desde
+    él; si no, directamente desde Odoo.
+    """
+    store = current_app.extensions.get("rollup_store")
+    # Los agregados locales son de la base de su pool; los demás tenants van a Odoo
+    if store is not None and store.covers(metrics) and store.pool is get_pool():
+        return store.evaluate(metrics, periods, batch)
+    return evaluate_odoo(metrics, periods, batch)
+
+
+def evaluate_odoo(metrics, periods, batch=None):
+    batch = batch or new_batch()
+    queries = plan(metrics)
+    calls = []
+    for query in queries:
+        method, args, kwargs = query.rpc(periods)
+        calls.append(batch.submit(query.model, method, args, kwargs))
+    batch.run()
+
+    values = {}
+    for query, call in zip(queries, calls):
+        values.update(query.split(call.result(), periods))
+    return values
+
+
+async def evaluate_async(client, metrics, periods, deadline=None):
+    """Como evaluate_odoo, pero con un AsyncOdooClient y sin bloquear hilos."""
+    queries = plan(metrics)
+    calls = []
+    for query in queries:
+        method, args, kwargs = query.rpc(periods)
+        calls.append(client.execute_kw(query.model, method, args, kwargs))
+    results = await run_concurrently(calls, deadline)
+
+    values = {}
+    for query, rows in zip(queries, results):
+        values.update(query.split(rows, periods))
+    return values
+
+def evaluate_breakdown(metrics, periods, by, batch=None):
+    """Como evaluate_odoo, desglosado por compañía o moneda: [BreakdownGroup].
+
+    Es el mismo plan con `company_id`/`currency_id` añadidos al groupby, así
+    que no hay llamadas extra. Por compañía cada fila se convierte a la
+    moneda de la compañía con la tabla de tasas en caché (que, si caducó, se
+    lee en el mismo lote); por moneda los importes quedan en su moneda.
+    """
+    batch = batch or new_batch()
+    queries = plan(metrics, breakdown=BREAKDOWNS[by])
+    calls = []
+    for query in queries:
+        method, args, kwargs = query.rpc(periods)
+        calls.append(batch.submit(query.model, method, args, kwargs))
+    table = load = None
+    if by == "company":
+        rates = get_rates()
+        table = rates.get()
+        if table is None:
+            load = rates.submit(batch)
+    batch.run()
+    if load is not None:
+        table = load()
+
+    if by == "company":
+        def group_of(row, day, amount):
+            company_id, name = many2one(row.get('company_id'))
+            currency_id = many2one(row.get('currency_id'))[0]
+            return (company_id, name), table.convert(amount, currency_id, company_id, day)
+    else:
+        def group_of(row, day, amount):
+            return many2one(row.get('currency_id')), amount
+
+    groups = {}
+    for query, call in zip(queries, calls):
+        for group, values in query.split_groups(call.result(), periods, group_of).items():
+            groups.setdefault(group, {}).update(values)
+
+    # Las métricas sin registros en un grupo valen cero
+    empty = [MetricValue(0.0, 0) for _ in periods]
+    result = []
+    for (group_id, name), values in sorted(groups.items(), key=lambda item: str(item[0][1])):
+        currency = table.company_currency(group_id)[1] if by == "company" else name
+        result.append(BreakdownGroup(group_id, name, currency, {m.key: values.get(m.key, empty) for m in metrics}))
+    return result
+
+
+def parse_ranges(items, max_ranges):
+    """Valida [{"start": ..., "end": ...}] y devuelve [(start, end)] normalizados."""
+    if not isinstance(items, list) or not items:
+        raise ValueError("Se requiere 'ranges': lista de objetos con 'start' y 'end' en formato YYYY-MM-DD")
+    if len(items) > max_ranges:
+        raise ValueError(f"Máximo {max_ranges} rangos por petición")
+    ranges = []
+    for item in items:
+        try:
+            start = datetime.strptime(item["start"], "%Y-%m-%d").date()
+            end = datetime.strptime(item["end"], "%Y-%m-%d").date()
+        except (KeyError, TypeError, ValueError):
+            raise ValueError(f"Rango inválido: {item!r}")
+        ranges.append((start.isoformat(), end.isoformat()))
+    return ranges
+
+
+def evaluate_ranges(metrics, ranges, batch=None):
+    """Varios rangos, cada uno con su periodo anterior, en una sola evaluación.
+
+    El planificador cubre la unión de todos los periodos con un read_group
+    por modelo; devuelve un {metric.key: [actual, anterior]} por rango.
+    """
+    periods = []
+    for start_date, end_date in ranges:
+        periods += [(start_date, end_date), previous_period(start_date, end_date)]
+    values = evaluate(metrics, periods, batch)
+    return [{key: per_period[2 * i:2 * i + 2] for key, per_period in values.items()}
+            for i in range(len(ranges))]
+
+def series_buckets(start_date, end_date, granularity):
+    """Cubos alineados al calendario que cubren [start, end], más el anterior."""
+    start = date.fromisoformat(start_date)
+    end = date.fromisoformat(end_date)
+    first = bucket_start(start, granularity)
+    buckets = [bucket_start(first - timedelta(days=1), granularity)]
+    bucket = first
+    while bucket <= end:
+        buckets.append(bucket)
+        bucket = next_bucket(bucket, granularity)
+    return [b.isoformat() for b in buckets]
+
+
+def evaluate_series(metrics, start_date, end_date, granularity, batch=None):
+    """Serie por cubos con un read_group por modelo.
+
+    Devuelve (cubos, {metric.key: [MetricValue por cubo]}); el primer cubo es
+    el anterior al rango y sólo sirve para calcular la primera tendencia. Los
+    valores se acotan a [start, end]: si `start` cae a mitad de un cubo, ese
+    cubo queda parcial y el anterior no se consulta.
+    """
+    buckets = series_buckets(start_date, end_date, granularity)
+    first = buckets[0] if buckets[1] == start_date else start_date
+    batch = batch or new_batch()
+    queries = plan(metrics, granularity)
+    calls = []
+    for query in queries:
+        method, args, kwargs = query.rpc([(first, end_date)])
+        calls.append(batch.submit(query.model, method, args, kwargs))
+    batch.run()
+
+    values = {}
+    for query, call in zip(queries, calls):
+        values.update(query.split_buckets(call.result(), buckets))
+    return buckets, values
+
+
+def _top_value(row, metric):
+    return MetricValue((row.get(metric.measure) or 0.0) if metric.measure else 0.0, row.get('__count', 0))
+
+
+def evaluate_top(metric, by, start_date, end_date, limit, offset=0):
+    """Página de los grupos de `by` con mayor total de `metric` en el periodo.
+
+    El orden, el offset y el límite los aplica Odoo en el read_group; el
+    periodo anterior se pide después sólo para los grupos de la página.
+    Devuelve ([(valor de by, actual, anterior)], hay_más).
+    """
+    fields = [f"{metric.measure}:sum"] if metric.measure else []
+    # Desempate por el propio campo para que las páginas sean estables
+    orderby = f"{metric.measure or '__count'} desc, {by}"
+    batch = new_batch()
+    call = batch.submit(metric.model, 'read_group', [metric.period_domain(start_date, end_date), fields, [by]], {
+        'offset': offset, 'limit': limit + 1, 'orderby': orderby, 'lazy': False, 'context': {'tz': 'UTC'},
+    })
+    batch.run()
+    rows = call.result()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    previous = {}
+    ids = [_group_value(row[by]) for row in rows if row[by] is not False]
+    if ids:
+        prev_start, prev_end = previous_period(start_date, end_date)
+        batch = new_batch()
+        call = batch.submit(metric.model, 'read_group', [
+            metric.period_domain(prev_start, prev_end) + [[by, 'in', ids]], fields, [by],
+        ], {'lazy': False, 'context': {'tz': 'UTC'}})
+        batch.run()
+        previous = {_group_value(row[by]): _top_value(row, metric) for row in call.result()}
+
+    empty = MetricValue(0.0, 0)
+    return [(row[by], _top_value(row, metric), previous.get(_group_value(row[by]), empty)) for row in rows], has_more
+
+
+def aggregate_records(records, metrics):
+    """Agrega filas de search_read en una sola pasada y memoria constante.
+
+    Pensado para KPIs que necesitan datos por registro; combinado con
+    iter_records nunca se mantiene más de una página en memoria.
+    """
+    totals = {m.key: [0.0, 0] for m in metrics}
+    for record in records:
+        for metric in metrics:
+            if all(leaf_matches(record.get(leaf[0]), leaf) for leaf in metric.domain):
+                totals[metric.key][0] += (record.get(metric.measure) or 0.0) if metric.measure else 0.0
+                totals[metric.key][1] += 1
+    return {key: MetricValue(total, count) for key, (total, count) in totals.items()}
@@ -0,0 +1,293 @@
+import cProfile
+import io
+import logging
+import pstats
+import random
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from flask import current_app, g, request
+from flask.json.provider import DefaultJSONProvider
+
+logger = logging.getLogger(__name__)
+
+# Segundos; los mismos cortes que usa por defecto el cliente de Prometheus
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Tiempos de la petición en curso; las tareas de RpcBatch heredan el contexto
+_timings = ContextVar("request_timings", default=None)
+
+
+class RequestTimings:
+    """Desglose de tiempos de una petición para la cabecera Server-Timing."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.rpcs = {}
+        self.phases = {}
+        self._lock = threading.Lock()
+
+    def add_rpc(self, model, method, seconds):
+        with self._lock:
+            total, count = self.rpcs.get((model, method), (0.0, 0))
+            self.rpcs[(model, method)] = (total + seconds, count + 1)
+
+    def add_phase(self, name, seconds):
+        with self._lock:
+            self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def header(self):
+        with self._lock:
+            parts = [f'{model}.{method};desc="{count}x";dur={total * 1000:.1f}'
+                     for (model, method), (total, count) in sorted(self.rpcs.items())]
+            parts += [f"{name};dur={seconds * 1000:.1f}" for name, seconds in sorted(self.phases.items())]
+        parts.append(f"total;dur={self.elapsed() * 1000:.1f}")
+        return ", ".join(parts)
+
+
+def start_timings():
+    timings = RequestTimings()
+    return timings, _timings.set(timings)
+
+
+def stop_timings(token):
+    _timings.reset(token)
+
+
+def current_timings():
+    return _timings.get()
+
+
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    def samples(self, name, labels):
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            cumulative += count
+            le = "+Inf" if bound == float("inf") else f"{bound:g}"
+            yield f'{name}_bucket{{{labels},le="{le}"}} {cumulative}'
+        yield f"{name}_sum{{{labels}}} {self.sum:.6f}"
+        yield f"{name}_count{{{labels}}} {cumulative}"
+
+
+def _labels(**labels):
+    return ",".join(f'{key}="{value}"' for key, value in labels.items())
+
+
+class MetricsRegistry:
+    """Histogramas de peticiones y de llamadas a Odoo en formato Prometheus."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.requests = {}
+        self.rpcs = {}
+        self.rpc_errors = {}
+        self._lock = threading.Lock()
+
+    def _observe(self, histograms, key, seconds):
+        with self._lock:
+            histogram = histograms.get(key)
+            if histogram is None:
+                histogram = histograms[key] = Histogram(self.buckets)
+            histogram.observe(seconds)
+
+    def observe_request(self, endpoint, method, status, seconds):
+        self._observe(self.requests, (endpoint, method, str(status)), seconds)
+
+    def observe_rpc(self, model, method, seconds, error=False):
+        self._observe(self.rpcs, (model, method), seconds)
+        if error:
+            with self._lock:
+                self.rpc_errors[(model, method)] = self.rpc_errors.get((model, method), 0) + 1
+        timings = _timings.get()
+        if timings is not None:
+            timings.add_rpc(model, method, seconds)
+
+    def render(self, gauges=()):
+        lines = []
+        with self._lock:
+            lines += ["# HELP http_request_duration_seconds Duración de las peticiones HTTP",
+                      "# TYPE http_request_duration_seconds histogram"]
+            for (endpoint, method, status), histogram in sorted(self.requests.items()):
+                lines += histogram.samples("http_request_duration_seconds",
+                                           _labels(endpoint=endpoint, method=method, status=status))
+            lines += ["# HELP odoo_rpc_duration_seconds Duración de las llamadas a Odoo",
+                      "# TYPE odoo_rpc_duration_seconds histogram"]
+            for (model, method), histogram in sorted(self.rpcs.items()):
+                lines += histogram.samples("odoo_rpc_duration_seconds", _labels(model=model, method=method))
+            lines += ["# HELP odoo_rpc_errors_total Llamadas a Odoo que terminaron en error",
+                      "# TYPE odoo_rpc_errors_total counter"]
+            lines += [f"odoo_rpc_errors_total{{{_labels(model=model, method=method)}}} {count}"
+                      for (model, method), count in sorted(self.rpc_errors.items())]
+        for name, help_text, values in gauges:
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} gauge"]
+            lines += [f"{name}{{{_labels(**labels)}}} {value}" if labels else f"{name} {value}"
+                      for labels, value in values]
+        return "\n".join(lines) + "\n"
+
+
+class TimedJSONProvider(DefaultJSONProvider):
+    """Serializador de jsonify que anota su tiempo en Server-Timing."""
+
+    def dumps(self, obj, **kwargs):
+        started = time.perf_counter()
+        try:
+            return super().dumps(obj, **kwargs)
+        finally:
+            timings = _timings.get()
+            if timings is not None:
+                timings.add_phase("json", time.perf_counter() - started)
+
+
+def collect_gauges(app):
+    gauges = []
+    pool = app.extensions.get("odoo_pool")
+    if pool is not None:
+        gauges.append(("odoo_pool_connections", "Conexiones a Odoo del pool",
+                       [({"state": key}, value) for key, value in pool.stats().items()]))
+    cache = app.extensions.get("response_cache")
+    if cache is not None:
+        stats = cache.stats()
+        gauges.append(("response_cache", "Estado de la caché de respuestas",
+                       [({"stat": key}, value) for key, value in stats.items() if isinstance(value, (int, float))]))
+        gauges.append(("response_cache_partition_entries", "Entradas de la caché de respuestas por tenant",
+                       [({"tenant": name}, count) for name, count in sorted(stats["partitions"].items())]))
+    shared = app.extensions.get("shared_cache")
+    if shared is not None:
+        gauges.append(("shared_cache", "Estado de la caché compartida entre workers",
+                       [({"stat": key}, value) for key, value in shared.stats().items() if value is not None]))
+    tenants = app.extensions.get("tenants")
+    # Cada tenant tiene su propio limitador y circuit breaker
+    if tenants is not None:
+        guards = [(tenant.name, tenant.guard) for tenant in tenants if tenant.guard is not None]
+    else:
+        guards = [("default", app.extensions["odoo_guard"])] if app.extensions.get("odoo_guard") else []
+    if guards:
+        gauges.append(("odoo_limiter", "Límite adaptativo de llamadas en vuelo a Odoo",
+                       [({"tenant": name, "stat": key}, value)
+                        for name, guard in guards for key, value in guard.limiter.stats().items()]))
+        breakers = [(name, guard.breaker.stats()) for name, guard in guards]
+        gauges.append(("odoo_breaker_open", "Circuit breaker hacia Odoo (0 cerrado, 1 abierto, 0.5 semiabierto)",
+                       [({"tenant": name}, {"closed": 0, "open": 1, "half_open": 0.5}[breaker["state"]])
+                        for name, breaker in breakers]))
+        gauges.append(("odoo_breaker_trips", "Veces que se ha abierto el circuito",
+                       [({"tenant": name}, breaker["trips"]) for name, breaker in breakers]))
+    if tenants is not None and len(tenants.tenants) > 1:
+        stats = tenants.stats()
+        gauges.append(("tenant_requests_in_flight", "Peticiones en curso por tenant",
+                       [({"tenant": name}, s["in_flight"]) for name, s in stats.items()]))
+        gauges.append(("tenant_requests_rejected", "Peticiones rechazadas por la cuota del tenant",
+                       [({"tenant": name}, s["rejected"]) for name, s in stats.items()]))
+        gauges.append(("tenant_pool_in_use", "Conexiones a Odoo en uso por tenant",
+                       [({"tenant": name}, s["pool"]["in_use"]) for name, s in stats.items()]))
+    flights = app.extensions.get("single_flight")
+    if flights is not None:
+        stats = flights.stats()
+        gauges.append(("single_flight", "Cálculos propios (leaders) y peticiones agrupadas (followers)",
+                       [({"stat": key}, int(stats[key])) for key in ("leaders", "followers", "in_flight")]))
+    scheduler = app.extensions.get("precompute")
+    if scheduler is not None:
+        stats = scheduler.stats()
+        gauges.append(("precompute_runs", "Pasadas del precálculo (ok y con error)",
+                       [({"result": "ok"}, stats["runs"]), ({"result": "error"}, stats["errors"])]))
+        if stats["last_duration"] is not None:
+            gauges.append(("precompute_duration_seconds", "Duración de la última pasada de precálculo",
+                           [({}, round(stats["last_duration"], 3))]))
+            gauges.append(("precompute_lag_seconds", "Retraso de la última pasada respecto a lo programado",
+                           [({}, round(stats["last_lag"], 3))]))
+    hub = app.extensions.get("stream_hub")
+    if hub is not None:
+        stats = hub.stats()
+        gauges.append(("stream_subscribers", "Clientes conectados a /stream",
+                       [({}, sum(t["subscribers"] for t in stats["topics"].values()))]))
+        gauges.append(("stream_resyncs", "Clientes lentos a los que se envió una instantánea en lugar de diffs",
+                       [({}, stats["resyncs"])]))
+    feed = app.extensions.get("change_feed")
+    if feed is not None:
+        gauges.append(("change_notifications", "Avisos de cambios de Odoo aplicados y entradas invalidadas",
+                       [({"stat": key}, value) for key, value in feed.stats().items()]))
+    store = app.extensions.get("rollup_store")
+    if store is not None:
+        stats = store.stats()
+        gauges.append(("rollup_ready", "Agregados diarios sincronizados", [({}, int(stats["ready"]))]))
+        if stats["last_sync"]:
+            gauges.append(("rollup_last_sync_seconds", "Antigüedad de la última sincronización",
+                           [({}, round(time.time() - stats["last_sync"], 3))]))
+    return gauges
+
+
+# === Integración con Flask ===
+
+def _before_request():
+    g.request_timings, g.request_timings_token = start_timings()
+    rate = current_app.config.get('PROFILE_SAMPLE_RATE', 0)
+    if rate and random.random() < rate:
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Otro perfilador activo en el proceso: esta petición no se muestrea
+            return
+        g.request_profiler = profiler
+
+
+def _after_request(response):
+    timings = g.pop("request_timings", None)
+    if timings is None:
+        return response
+    profiler = g.pop("request_profiler", None)
+    if profiler is not None:
+        profiler.disable()
+    elapsed = timings.elapsed()
+    endpoint = request.url_rule.rule if request.url_rule else "<sin ruta>"
+    current_app.extensions["metrics"].observe_request(endpoint, request.method, response.status_code, elapsed)
+    response.headers["Server-Timing"] = timings.header()
+
+    threshold = current_app.config.get('PROFILE_SLOW_MS', 0)
+    if threshold and elapsed * 1000 >= threshold:
+        log_slow_request(request.full_path, timings, profiler)
+    return response
+
+
+def _teardown_request(exc):
+    token = g.pop("request_timings_token", None)
+    if token is not None:
+        stop_timings(token)
+
+
+def log_slow_request(path, timings, profiler=None):
+    message = f"Petición lenta {path}: {timings.header()}"
+    if profiler is not None:
+        out = io.StringIO()
+        pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(25)
+        message += "\n" + out.getvalue()
+    logger.warning(message)
+
+
+def init_metrics(app):
+    registry = MetricsRegistry()
+    app.extensions["metrics"] = registry
+    app.json = TimedJSONProvider(app)
+    tenants = app.extensions.get("tenants")
+    for pool in ([tenant.pool for tenant in tenants] if tenants else [app.extensions["odoo_pool"]]):
+        pool.set_observer(registry.observe_rpc)
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
+
+
+def get_metrics():
+    return current_app.extensions["metrics"]
@@ -1,17 +1,139 @@
+import http.client
+import threading
+import time
 import xmlrpc.client
-from flask import current_app
+from collections import deque
+from contextlib import contextmanager
+from contextvars import copy_context
+
+from flask import current_app, g
+
+from .transports import HttpTransport, ServiceProxy, make_codec
+
+
+class OdooAuthError(Exception):
+    pass
+
+
+class OdooPoolTimeout(Exception):
+    pass
+
+
+# Errores de red tras los cuales la conexión HTTP ya no es reutilizable
+CONNECTION_ERRORS = (OSError, http.client.HTTPException, xmlrpc.client.ProtocolError)
+
+
+def _is_auth_fault(fault):
+    text = str(getattr(fault, "faultString", fault))
+    return "AccessDenied" in text or "Access Denied" in text or "Session expired" in text
+
+
+def _timed(on_rpc, model, method, func, *args):
+    # on_rpc(model, method, segundos, error) recibe la duración de cada llamada
+    if on_rpc is None:
+        return func(*args)
+    started = time.perf_counter()
+    try:
+        result = func(*args)
+    except Exception:
+        on_rpc(model, method, time.perf_counter() - started, error=True)
+        raise
+    on_rpc(model, method, time.perf_counter() - started)
+    return result
+
+
+class OdooSession:
+    """uid autenticado, compartido por todas las conexiones de un pool.
+
+    Con `store` (SharedCache) el uid se comparte también entre procesos: un
+    worker nuevo lo reutiliza en lugar de volver a autenticarse.
+    """
+
+    # Odoo revalida el uid en cada llamada; esto sólo acota cuánto vive en el almacén
+    STORE_TTL = 86400
+
+    def __init__(self, db, user, password, url=None):
+        self.db = db
+        self.user = user
+        self.password = password
+        self.url = url
+        self._uid = None
+        self._lock = threading.Lock()
+        self.on_rpc = None
+        self.store = None
+
+    @property
+    def store_key(self):
+        return ("odoo_uid", self.url, self.db, self.user)
+
+    def get_uid(self, common):
+        uid = self._uid
+        if uid is not None:
+            return uid
+        with self._lock:
+            if self._uid is None:
+                found = self.store.get(self.store_key) if self.store is not None else None
+                if found is not None:
+                    self._uid = found[0]
+                    return self._uid
+                uid = _timed(self.on_rpc, "common", "authenticate", common.authenticate,
+                             self.db, self.user, self.password, {})
+                if not uid:
+                    raise OdooAuthError("Autenticación con Odoo rechazada")
+                self._uid = uid
+                if self.store is not None:
+                    self.store.set(self.store_key, uid, self.STORE_TTL)
+            return self._uid
+
+    def invalidate(self, uid):
+        with self._lock:
+            if self._uid == uid:
+                self._uid = None
+                if self.store is not None:
+                    self.store.delete(self.store_key)
+
 
 class OdooConnector:
-    def __init__(self):
-        config = current_app.config
+    def __init__(self, config=None, session=None, on_rpc=None, guard=None):
+        config = config if config is not None else current_app.config
         self.url = config['ODOO_URL']
         self.db = config['ODOO_DB']
         self.user = config['ODOO_USER']
         self.password = config['ODOO_PASSWORD']
+        self.session = session or OdooSession(self.db, self.user, self.password)
+        self.on_rpc = on_rpc
+        self.guard = guard
+
+        # Un solo transporte para ambos servicios: misma conexión keep-alive
+        codec = make_codec(config.get('ODOO_TRANSPORT') or 'xmlrpc')
+        self.transport = HttpTransport(self.url, codec, timeout=config.get('ODOO_TIMEOUT'))
+        self.common = ServiceProxy(self.transport, "common")
+        self.models = ServiceProxy(self.transport, "object")
+        self.last_used = time.monotonic()
+
+    @property
+    def uid(self):
+        return self.session.get_uid(self.common)
 
-        self.common = xmlrpc.client.ServerProxy(f"{self.url}/xmlrpc/2/common")
-        self.uid = self.common.authenticate(self.db, self.user, self.password, {})
-        self.models = xmlrpc.client.ServerProxy(f"{self.url}/xmlrpc/2/object")
+    def execute_kw(self, model, method, args, kwargs=None):
+        if self.guard is None:
+            return self._execute_kw(model, method, args, kwargs)
+        # Límite de concurrencia y circuit breaker compartidos por el proceso
+        with self.guard.slot():
+            return self._execute_kw(model, method, args, kwargs)
+
+    def _execute_kw(self, model, method, args, kwargs=None):
+        uid = self.uid
+        try:
+            return _timed(self.on_rpc, model, method, self.models.execute_kw,
+                          self.db, uid, self.password, model, method, args, kwargs or {})
+        except xmlrpc.client.Fault as e:
+            if not _is_auth_fault(e):
+                raise
+            # Sesión caducada o uid revocado: se reautentica una sola vez
+            self.session.invalidate(uid)
+            return _timed(self.on_rpc, model, method, self.models.execute_kw,
+                          self.db, self.uid, self.password, model, method, args, kwargs or {})
 
     def is_connected(self):
         try:
@@ -19,3 +141,197 @@ class OdooConnector:
             return True, version
         except Exception as e:
             return False, str(e)
+
+    def close(self):
+        self.transport.close()
+
+
+class OdooConnectorPool:
+    """Pool de conectores propiedad de la app.
+
+    Cada hilo toma un conector en exclusiva (las llamadas anidadas del mismo
+    hilo reciben el mismo) y lo devuelve al terminar. El uid se comparte entre
+    todos los conectores y sólo se renueva cuando Odoo rechaza la sesión.
+    """
+
+    def __init__(self, config, size=None, idle_timeout=None, checkout_timeout=None):
+        self.config = {key: config.get(key) for key in ('ODOO_URL', 'ODOO_DB', 'ODOO_USER', 'ODOO_PASSWORD', 'ODOO_TIMEOUT', 'ODOO_TRANSPORT')}
+        self.size = size or config.get('ODOO_POOL_SIZE', 8)
+        self.idle_timeout = idle_timeout if idle_timeout is not None else config.get('ODOO_POOL_IDLE_TIMEOUT', 60)
+        self.checkout_timeout = checkout_timeout if checkout_timeout is not None else config.get('ODOO_POOL_TIMEOUT', 10)
+        self.session = OdooSession(self.config['ODOO_DB'], self.config['ODOO_USER'], self.config['ODOO_PASSWORD'],
+                                   url=self.config['ODOO_URL'])
+
+        self._idle = deque()
+        self._slots = threading.BoundedSemaphore(self.size)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.in_use = 0
+        self.created = 0
+        self.on_rpc = None
+        self.guard = None
+
+    def set_observer(self, on_rpc):
+        """Registra la función que recibe la duración de cada llamada a Odoo."""
+        self.on_rpc = on_rpc
+        self.session.on_rpc = on_rpc
+        with self._lock:
+            for conn in self._idle:
+                conn.on_rpc = on_rpc
+
+    def set_guard(self, guard):
+        """Registra el OdooGuard por el que pasa cada llamada a Odoo."""
+        self.guard = guard
+        with self._lock:
+            for conn in self._idle:
+                conn.guard = guard
+
+    def _new_connector(self):
+        with self._lock:
+            self.created += 1
+        return OdooConnector(self.config, self.session, on_rpc=self.on_rpc, guard=self.guard)
+
+    def _pop_idle(self):
+        now = time.monotonic()
+        with self._lock:
+            while self._idle:
+                conn = self._idle.pop()
+                if self.idle_timeout and now - conn.last_used > self.idle_timeout:
+                    conn.close()
+                    continue
+                return conn
+        return None
+
+    def acquire(self):
+        if not self._slots.acquire(timeout=self.checkout_timeout):
+            raise OdooPoolTimeout("No hay conexiones a Odoo disponibles en el pool")
+        try:
+            conn = self._pop_idle() or self._new_connector()
+        except Exception:
+            self._slots.release()
+            raise
+        with self._lock:
+            self.in_use += 1
+        return conn
+
+    def release(self, conn, discard=False):
+        conn.last_used = time.monotonic()
+        with self._lock:
+            self.in_use -= 1
+            if discard:
+                conn.close()
+            else:
+                self._idle.append(conn)
+        self._slots.release()
+
+    @contextmanager
+    def connection(self):
+        held = getattr(self._local, "held", None)
+        if held is not None:
+            self._local.depth += 1
+            try:
+                yield held
+            finally:
+                self._local.depth -= 1
+            return
+
+        conn = self.acquire()
+        self._local.held, self._local.depth = conn, 0
+        discard = False
+        try:
+            yield conn
+        except CONNECTION_ERRORS:
+            discard = True
+            raise
+        finally:
+            self._local.held = None
+            self.release(conn, discard=discard)
+
+    def close(self):
+        with self._lock:
+            while self._idle:
+                self._idle.pop().close()
+
+    def after_fork(self):
+        """En el proceso hijo: olvida las conexiones heredadas (sus sockets son
+        del padre) y los locks que pudieran estar tomados. El uid se conserva."""
+        self._idle = deque()
+        self._slots = threading.BoundedSemaphore(self.size)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.session._lock = threading.Lock()
+        self.in_use = 0
+
+    def stats(self):
+        with self._lock:
+            return {"size": self.size, "in_use": self.in_use, "idle": len(self._idle), "created": self.created}
+
+
+def init_pool(app):
+    app.extensions["odoo_pool"] = OdooConnectorPool(app.config)
+    app.teardown_appcontext(_release_connector)
+
+
+def get_pool():
+    # Pool de la base de Odoo (tenant) de la petición en curso
+    tenants = current_app.extensions.get("tenants")
+    if tenants is None:
+        return current_app.extensions["odoo_pool"]
+    return tenants.current().pool
+
+
+def get_connector():
+    # Conector del pool ligado al contexto de la petición; se devuelve en el teardown
+    if "odoo_connection" not in g:
+        g.odoo_connection = get_pool().connection()
+        g.odoo_connector = g.odoo_connection.__enter__()
+    return g.odoo_connector
+
+
+def _release_connector(exc):
+    ctx = g.pop("odoo_connection", None)
+    g.pop("odoo_connector", None)
+    if ctx is not None:
+        if exc is None:
+            ctx.__exit__(None, None, None)
+        else:
+            ctx.__exit__(type(exc), exc, exc.__traceback__)
+
+
+def iter_pages(model, domain, fields, page_size=None, pool=None, executor=None):
+    """Páginas de search_read por id creciente (keyset), sin cargar todo.
+
+    Con `executor` la página siguiente se pide a Odoo mientras el llamador
+    procesa la actual; nunca hay más de dos páginas en memoria.
+    """
+    pool = pool or get_pool()
+    page_size = page_size or current_app.config.get('ODOO_PAGE_SIZE', 1000)
+
+    def fetch(last_id):
+        with pool.connection() as connector:
+            return connector.execute_kw(model, 'search_read', [domain + [['id', '>', last_id]]], {
+                'fields': fields, 'order': 'id asc', 'limit': page_size,
+            })
+
+    page = fetch(0)
+    while len(page) == page_size:
+        if executor is None:
+            yield page
+            page = fetch(page[-1]['id'])
+            continue
+        following = executor.submit(copy_context().run, fetch, page[-1]['id'])
+        try:
+            yield page
+        except GeneratorExit:
+            # El consumidor abandonó (p. ej. el cliente cortó la descarga)
+            following.cancel()
+            raise
+        page = following.result()
+    if page:
+        yield page
+
+
+def iter_records(model, domain, fields, page_size=None, pool=None, executor=None):
+    """Recorre search_read registro a registro; ver iter_pages."""
+    for page in iter_pages(model, domain, fields, page_size, pool, executor):
+        yield from page
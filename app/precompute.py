@@ -0,0 +1,211 @@
+import logging
+import os
+import random
+import threading
+import time
+from datetime import date, timedelta
+
+from .kpi import evaluate, previous_period
+from .tenants import using_tenant
+from .routes.ventas.views import ventas_payload
+from .routes.compras.views import compras_payload
+from .routes.manufactura.views import manufactura_payload
+from .routes.tablero.views import TABLERO_METRICS, tablero_payload
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin elección de líder, cada proceso trabaja por su cuenta
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+# === Rangos con nombre ===
+
+def _today(today):
+    return today, today
+
+
+def _week(today):
+    return today - timedelta(days=today.weekday()), today
+
+
+def _month_to_date(today):
+    return today.replace(day=1), today
+
+
+def _previous_month(today):
+    last = today.replace(day=1) - timedelta(days=1)
+    return last.replace(day=1), last
+
+
+def _last_30_days(today):
+    return today - timedelta(days=29), today
+
+
+NAMED_RANGES = {
+    "today": _today,
+    "week": _week,
+    "month_to_date": _month_to_date,
+    "previous_month": _previous_month,
+    "last_30_days": _last_30_days,
+}
+
+
+def resolve_range(name, today=None):
+    start, end = NAMED_RANGES[name](today or date.today())
+    return start.isoformat(), end.isoformat()
+
+
+# Endpoint (clave de caché) -> payload a partir de los valores del tablero
+PAYLOADS = {
+    "ventas": ventas_payload,
+    "compras": compras_payload,
+    "manufactura": manufactura_payload,
+    "tablero": tablero_payload,
+}
+
+
+class PrecomputeScheduler:
+    """Recalcula en segundo plano los resúmenes de los rangos más pedidos.
+
+    Todos los rangos y sus periodos anteriores se resuelven en un único plan
+    de métricas y los payloads se dejan en la caché de respuestas con las
+    mismas claves que usan las vistas, así que la petición que coincide se
+    sirve sin ir a Odoo. Con varios tenants se hace una pasada por base.
+
+    Con `lock_path` (varios workers sobre una caché compartida) sólo calcula
+    el proceso que tiene el flock del fichero; si muere, otro lo toma en su
+    siguiente pasada.
+    """
+
+    def __init__(self, app, ranges, interval=60, jitter=10, lock_path=None):
+        self.app = app
+        self.ranges = [name for name in ranges if name in NAMED_RANGES]
+        self.interval = interval
+        self.jitter = jitter
+        self.runs = 0
+        self.errors = 0
+        self.last_run = None
+        self.last_duration = None
+        self.last_lag = None
+        self.next_run = None
+        self.lock_path = lock_path
+        self._lock_file = None
+        self._thread = None
+        self._stop = threading.Event()
+
+    def run_once(self):
+        """Una pasada por tenant; devuelve cuántos fallaron."""
+        failed = 0
+        for tenant in self.app.extensions["tenants"]:
+            try:
+                with using_tenant(tenant):
+                    self._run_tenant()
+            except Exception:
+                failed += 1
+                logger.exception("Error precalculando los resúmenes del tablero de %s", tenant.name)
+        return failed
+
+    def _run_tenant(self):
+        today = date.today()
+        ranges = [resolve_range(name, today) for name in self.ranges]
+        periods = []
+        for start_date, end_date in ranges:
+            periods += [(start_date, end_date), previous_period(start_date, end_date)]
+
+        with self.app.app_context():
+            values = evaluate(TABLERO_METRICS, periods)
+        cache = self.app.extensions["response_cache"]
+        # Frescos hasta la siguiente pasada aunque llegue con retraso
+        ttl = 2 * self.interval + self.jitter
+        for i, (start_date, end_date) in enumerate(ranges):
+            per_range = {key: per_period[2 * i:2 * i + 2] for key, per_period in values.items()}
+            for endpoint, build_payload in PAYLOADS.items():
+                cache.set((endpoint, start_date, end_date), build_payload(per_range), ttl)
+                # También la variante numérica (?format=raw): sale de los mismos valores
+                cache.set((f"{endpoint}.raw", start_date, end_date), build_payload(per_range, raw=True), ttl)
+
+    @property
+    def leader(self):
+        return self.lock_path is None or fcntl is None or self._lock_file is not None
+
+    def _try_lead(self):
+        if self.leader:
+            return True
+        lock_file = open(self.lock_path, "a")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        # El flock se libera solo si el proceso muere
+        self._lock_file = lock_file
+        logger.info("Proceso %s a cargo del precálculo", os.getpid())
+        return True
+
+    def _loop(self):
+        self.next_run = time.time()
+        while not self._stop.is_set():
+            started = time.time()
+            self.last_lag = max(0.0, started - self.next_run)
+            if not self._try_lead():
+                # Otro worker precalcula; se vuelve a intentar en la siguiente pasada
+                self.next_run = started + self.interval
+                self._stop.wait(self.interval)
+                continue
+            if self.run_once():
+                self.errors += 1
+            else:
+                self.runs += 1
+            self.last_run = started
+            self.last_duration = time.time() - started
+            self.next_run = started + self.interval + random.uniform(0, self.jitter)
+            self._stop.wait(max(0.0, self.next_run - time.time()))
+
+    def start(self):
+        self._thread = threading.Thread(target=self._loop, name="precompute", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def stats(self):
+        return {
+            "ranges": {name: resolve_range(name) for name in self.ranges},
+            "interval": self.interval,
+            "jitter": self.jitter,
+            "runs": self.runs,
+            "errors": self.errors,
+            "last_run": self.last_run,
+            "last_duration": self.last_duration,
+            "last_lag": self.last_lag,
+            "next_run": self.next_run,
+            "leader": self.leader,
+        }
+
+
+def init_precompute(app):
+    config = app.config
+    if not config.get('PRECOMPUTE_ENABLED'):
+        return
+    if not config.get('CACHE_ENABLED', True):
+        logger.warning("PRECOMPUTE_ENABLED requiere CACHE_ENABLED; no se precalcula nada")
+        return
+    ranges = [name.strip() for name in config.get('PRECOMPUTE_RANGES', '').split(",") if name.strip()]
+    unknown = [name for name in ranges if name not in NAMED_RANGES]
+    if unknown:
+        logger.warning("Rangos de precálculo desconocidos: %s", ", ".join(unknown))
+    # Con caché compartida basta con que un worker precalcule para todos
+    shared_path = config.get('SHARED_CACHE_PATH')
+    scheduler = PrecomputeScheduler(
+        app,
+        ranges,
+        interval=config.get('PRECOMPUTE_INTERVAL', 60),
+        jitter=config.get('PRECOMPUTE_JITTER', 10),
+        lock_path=os.path.join(os.path.dirname(shared_path) or ".", "precompute.lock") if shared_path else None,
+    )
+    app.extensions["precompute"] = scheduler
+    # Con BACKGROUND_DEFERRED lo arranca cada worker tras el fork (app/serving.py)
+    if not config.get('BACKGROUND_DEFERRED'):
+        scheduler.start()
@@ -0,0 +1,285 @@
+import asyncio
+import socket
+import threading
+import time
+import xmlrpc.client
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+
+from flask import current_app
+
+from .odoo_connector import CONNECTION_ERRORS
+
+
+class OdooUnavailable(Exception):
+    """Odoo no admite más llamadas ahora mismo; reintentar en `retry_after` segundos."""
+
+    def __init__(self, message, retry_after=5):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class CircuitOpen(OdooUnavailable):
+    pass
+
+
+class LimiterTimeout(OdooUnavailable):
+    pass
+
+
+def is_failure(error):
+    # Un Fault de negocio es una respuesta de Odoo; sólo cuentan red, timeouts y 5xx
+    if isinstance(error, xmlrpc.client.Fault):
+        return False
+    return isinstance(error, CONNECTION_ERRORS + (socket.timeout, asyncio.TimeoutError))
+
+
+def _grant(future):
+    # En el hilo del event loop del que espera; puede haberse cancelado por el camino
+    if not future.done():
+        future.set_result(None)
+
+
+class AdaptiveLimiter:
+    """Límite de llamadas en vuelo a Odoo con AIMD sobre la latencia observada.
+
+    Cada llamada rápida sube el límite en 1/límite (≈ +1 por ronda completa);
+    una llamada lenta o fallida lo multiplica por `backoff`, como mucho una
+    vez por ronda. Quien no obtiene hueco en `queue_timeout` segundos recibe
+    LimiterTimeout. Las corrutinas esperan en orden de llegada a que
+    release() les reserve un hueco y despierte su futuro.
+    """
+
+    def __init__(self, initial=8, min_limit=1, max_limit=16, target_latency=2.0, queue_timeout=5, backoff=0.7):
+        self.limit = float(initial)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.target_latency = target_latency
+        self.queue_timeout = queue_timeout
+        self.backoff = backoff
+        self.in_flight = 0
+        self.queued = 0
+        self.rejected = 0
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+        self._waiters = deque()
+
+    def try_acquire(self):
+        with self._cond:
+            if self.in_flight < int(self.limit):
+                self.in_flight += 1
+                return True
+            return False
+
+    def acquire(self):
+        deadline = time.monotonic() + self.queue_timeout
+        with self._cond:
+            self.queued += 1
+            try:
+                while self.in_flight >= int(self.limit):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.rejected += 1
+                        raise LimiterTimeout("Odoo está saturado: demasiadas consultas en curso", retry_after=self.queue_timeout)
+                    self._cond.wait(remaining)
+                self.in_flight += 1
+            finally:
+                self.queued -= 1
+
+    async def acquire_async(self):
+        with self._cond:
+            if not self._waiters and self.in_flight < int(self.limit):
+                self.in_flight += 1
+                return
+            future = asyncio.get_running_loop().create_future()
+            self._waiters.append(future)
+            self.queued += 1
+        try:
+            await asyncio.wait_for(future, self.queue_timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            with self._cond:
+                if future in self._waiters:
+                    self._waiters.remove(future)
+                else:
+                    # release() ya nos había reservado el hueco: se cede al siguiente
+                    self.in_flight -= 1
+                    self._wake_async()
+                    self._cond.notify_all()
+                if isinstance(e, asyncio.TimeoutError):
+                    self.rejected += 1
+            if isinstance(e, asyncio.TimeoutError):
+                raise LimiterTimeout("Odoo está saturado: demasiadas consultas en curso", retry_after=self.queue_timeout)
+            raise
+        finally:
+            with self._cond:
+                self.queued -= 1
+
+    def _wake_async(self):
+        # Con self._cond tomado: los huecos libres pasan a las corrutinas en espera, por orden
+        while self._waiters and self.in_flight < int(self.limit):
+            future = self._waiters.popleft()
+            self.in_flight += 1
+            future.get_loop().call_soon_threadsafe(_grant, future)
+
+    def release(self, latency, ok=True):
+        now = time.monotonic()
+        with self._cond:
+            self.in_flight -= 1
+            if ok and latency <= self.target_latency:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            elif now - self._last_decrease > latency:
+                self.limit = max(self.min_limit, self.limit * self.backoff)
+                self._last_decrease = now
+            self._wake_async()
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            return {"limit": round(self.limit, 2), "in_flight": self.in_flight,
+                    "queued": self.queued, "rejected": self.rejected}
+
+
+class CircuitBreaker:
+    """Deja de llamar a Odoo cuando la tasa de fallos de la ventana supera el umbral.
+
+    Abierto durante `open_seconds`; después deja pasar una sola llamada de
+    prueba (semiabierto) que decide si se cierra o se vuelve a abrir.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, threshold=0.5, min_calls=10, window=30, open_seconds=30):
+        self.threshold = threshold
+        self.min_calls = min_calls
+        self.window = window
+        self.open_seconds = open_seconds
+        self.state = self.CLOSED
+        self.opened_at = None
+        self.trips = 0
+        self._results = deque()
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        with self._lock:
+            if self.state == self.CLOSED:
+                return
+            retry_after = self.opened_at + self.open_seconds - time.monotonic()
+            if self.state == self.OPEN and retry_after <= 0:
+                self.state = self.HALF_OPEN
+            if self.state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                return
+            raise CircuitOpen("Odoo no responde; se reintentará en breve", retry_after=max(1, round(retry_after)))
+
+    def record(self, ok):
+        now = time.monotonic()
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self._probing = False
+                if ok:
+                    self.state = self.CLOSED
+                    self._results.clear()
+                else:
+                    self._open(now)
+                return
+            self._results.append((now, ok))
+            while self._results and now - self._results[0][0] > self.window:
+                self._results.popleft()
+            failures = sum(1 for _, result in self._results if not result)
+            if len(self._results) >= self.min_calls and failures / len(self._results) >= self.threshold:
+                self._open(now)
+
+    def cancel(self):
+        # La llamada autorizada no llegó a hacerse (p. ej. sin hueco en el limitador)
+        with self._lock:
+            self._probing = False
+
+    def _open(self, now):
+        self.state = self.OPEN
+        self.opened_at = now
+        self.trips += 1
+        self._results.clear()
+
+    def stats(self):
+        with self._lock:
+            return {"state": self.state, "trips": self.trips}
+
+
+class OdooGuard:
+    """Límite adaptativo y circuit breaker alrededor de cada llamada a Odoo."""
+
+    def __init__(self, limiter, breaker):
+        self.limiter = limiter
+        self.breaker = breaker
+
+    @contextmanager
+    def slot(self):
+        self.breaker.before_call()
+        try:
+            self.limiter.acquire()
+        except LimiterTimeout:
+            self.breaker.cancel()
+            raise
+        started = time.monotonic()
+        ok = True
+        try:
+            yield
+        except Exception as e:
+            ok = not is_failure(e)
+            raise
+        finally:
+            self.limiter.release(time.monotonic() - started, ok)
+            self.breaker.record(ok)
+
+    @asynccontextmanager
+    async def slot_async(self):
+        self.breaker.before_call()
+        try:
+            await self.limiter.acquire_async()
+        except LimiterTimeout:
+            self.breaker.cancel()
+            raise
+        started = time.monotonic()
+        ok = True
+        try:
+            yield
+        except Exception as e:
+            ok = not is_failure(e)
+            raise
+        finally:
+            self.limiter.release(time.monotonic() - started, ok)
+            self.breaker.record(ok)
+
+    def stats(self):
+        return dict(self.limiter.stats(), breaker=self.breaker.stats())
+
+
+def build_guard(config):
+    return OdooGuard(
+        AdaptiveLimiter(
+            initial=config.get('ODOO_LIMIT_INITIAL', 8),
+            min_limit=config.get('ODOO_LIMIT_MIN', 1),
+            max_limit=config.get('ODOO_LIMIT_MAX', 16),
+            target_latency=config.get('ODOO_LIMIT_TARGET_LATENCY', 2.0),
+            queue_timeout=config.get('ODOO_LIMIT_QUEUE_TIMEOUT', 5),
+        ),
+        CircuitBreaker(
+            threshold=config.get('ODOO_BREAKER_THRESHOLD', 0.5),
+            min_calls=config.get('ODOO_BREAKER_MIN_CALLS', 10),
+            window=config.get('ODOO_BREAKER_WINDOW', 30),
+            open_seconds=config.get('ODOO_BREAKER_OPEN_SECONDS', 30),
+        ),
+    )
+
+
+def init_guard(app):
+    if not app.config.get('ODOO_GUARD_ENABLED', True):
+        return
+    guard = build_guard(app.config)
+    app.extensions["odoo_guard"] = guard
+    app.extensions["odoo_pool"].set_guard(guard)
+
+
+def get_guard():
+    return current_app.extensions.get("odoo_guard")
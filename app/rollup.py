@@ -0,0 +1,366 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from datetime import date, datetime, timedelta
+
+from .kpi import MetricValue, evaluate_odoo, leaf_matches, mergeable
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin elección de líder, cada proceso trabaja por su cuenta
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS records (
+    metric TEXT NOT NULL,
+    record_id INTEGER NOT NULL,
+    day TEXT NOT NULL,
+    amount REAL NOT NULL,
+    PRIMARY KEY (metric, record_id)
+);
+CREATE TABLE IF NOT EXISTS daily (
+    metric TEXT NOT NULL,
+    day TEXT NOT NULL,
+    total REAL NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (metric, day)
+);
+CREATE TABLE IF NOT EXISTS sync_state (
+    model TEXT PRIMARY KEY,
+    last_write_date TEXT,
+    last_reconcile REAL
+);
+"""
+
+
+class PrefixSums:
+    """Sumas acumuladas por día de una métrica; consulta de rangos en O(log n)."""
+
+    def __init__(self, rows):
+        self.days = []
+        self.totals = [0.0]
+        self.counts = [0]
+        for day, total, count in rows:
+            self.days.append(day)
+            self.totals.append(self.totals[-1] + total)
+            self.counts.append(self.counts[-1] + count)
+
+    def query(self, first_day, last_day):
+        if first_day > last_day:
+            return 0.0, 0
+        i = bisect_left(self.days, first_day)
+        j = bisect_right(self.days, last_day)
+        return self.totals[j] - self.totals[i], self.counts[j] - self.counts[i]
+
+
+class RollupStore:
+    """Agregados diarios por KPI en SQLite, sincronizados por write_date.
+
+    Guarda la contribución de cada registro a cada métrica para poder
+    corregir los días afectados cuando un registro cambia o deja de cumplir
+    el dominio. Los días anteriores a hoy se responden con sumas prefijas;
+    el día en curso se consulta siempre a Odoo.
+
+    Con `lock_path` sólo sincroniza el proceso que tiene el flock del
+    fichero; los demás releen las sumas cuando cambia la versión de la base
+    (PRAGMA user_version), que el que sincroniza sube en cada pasada con
+    cambios y en la primera tras tomar el lock.
+    """
+
+    def __init__(self, path, pool, metrics, page_size=2000, reconcile_interval=3600, lock_path=None):
+        self.path = path
+        self.lock_path = lock_path
+        self.pool = pool
+        self.page_size = page_size
+        self.reconcile_interval = reconcile_interval
+        self.metrics = {m.key: m for m in metrics if mergeable(m)}
+        self.ready = False
+        self.last_sync = None
+        self.last_sync_duration = None
+
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.executescript(SCHEMA)
+        self._db_lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._prefix = {}
+        self._version = self._db.execute("PRAGMA user_version").fetchone()[0]
+        self._lock_file = None
+        self._load_prefix(self.metrics)
+        self._thread = None
+        self._stop = threading.Event()
+        self._wanted = threading.Event()
+        self._listeners = []
+
+    # === Consulta ===
+
+    def covers(self, metrics):
+        return self.ready and all(m.key in self.metrics for m in metrics)
+
+    def _stored_span(self, metric, start_date, end_date, today):
+        # Campos datetime: '<= end' sólo alcanza la medianoche de `end`
+        last = end_date
+        if metric.datetime_field:
+            last = (date.fromisoformat(end_date) - timedelta(days=1)).isoformat()
+        yesterday = (today - timedelta(days=1)).isoformat()
+        return start_date, min(last, yesterday)
+
+    def evaluate(self, metrics, periods, batch=None):
+        today = datetime.utcnow().date()
+        today_str = today.isoformat()
+        values = {m.key: [] for m in metrics}
+        for start_date, end_date in periods:
+            for metric in metrics:
+                first, last = self._stored_span(metric, start_date, end_date, today)
+                values[metric.key].append(self._prefix[metric.key].query(first, last))
+
+        # Lo que cae de hoy en adelante se pide a Odoo en una sola pasada
+        live_periods = [(max(start, today_str), end) for start, end in periods if end >= today_str]
+        if live_periods:
+            live = evaluate_odoo(metrics, live_periods, batch)
+            live_index = 0
+            for i, (start_date, end_date) in enumerate(periods):
+                if end_date < today_str:
+                    continue
+                for metric in metrics:
+                    total, count = values[metric.key][i]
+                    extra = live[metric.key][live_index]
+                    values[metric.key][i] = (total + extra.total, count + extra.count)
+                live_index += 1
+
+        return {key: [MetricValue(total, count) for total, count in per_period]
+                for key, per_period in values.items()}
+
+    def reload(self):
+        """Vuelve a leer las sumas prefijas tras una sincronización hecha por otro proceso."""
+        with self._db_lock:
+            self._version = self._db.execute("PRAGMA user_version").fetchone()[0]
+        self._load_prefix(self.metrics)
+        self.ready = True
+
+    def refresh(self):
+        """reload() sólo si otro proceso ha sincronizado desde la última lectura."""
+        with self._db_lock:
+            version = self._db.execute("PRAGMA user_version").fetchone()[0]
+        if version != self._version:
+            self.reload()
+
+    def _load_prefix(self, keys):
+        with self._db_lock:
+            for key in keys:
+                rows = self._db.execute(
+                    "SELECT day, total, count FROM daily WHERE metric = ? ORDER BY day", (key,)
+                ).fetchall()
+                self._prefix[key] = PrefixSums(rows)
+
+    # === Sincronización ===
+
+    def _models(self):
+        models = {}
+        for metric in self.metrics.values():
+            models.setdefault(metric.model, []).append(metric)
+        return models
+
+    def sync(self):
+        """Trae los cambios de Odoo; devuelve los (métrica, día) que se recalcularon."""
+        with self._sync_lock:
+            started = time.monotonic()
+            touched = {}
+            for model, metrics in self._models().items():
+                self._sync_model(model, metrics, touched)
+            # La primera pasada también avisa: los demás saben que ya hay datos al día
+            self._rebuild_days(touched, bump=bool(touched) or self.last_sync is None)
+            self._load_prefix({key for key, _ in touched} or self.metrics)
+            self.ready = True
+            self.last_sync = time.time()
+            self.last_sync_duration = time.monotonic() - started
+            return set(touched)
+
+    def _sync_model(self, model, metrics, touched):
+        fields = sorted({'write_date'} | {m.date_field for m in metrics}
+                        | {leaf[0] for m in metrics for leaf in m.domain}
+                        | {m.measure for m in metrics if m.measure})
+        with self._db_lock:
+            row = self._db.execute(
+                "SELECT last_write_date, last_reconcile FROM sync_state WHERE model = ?", (model,)
+            ).fetchone()
+        last_write_date, last_reconcile = row if row else (None, None)
+
+        # '>=' para no perder registros con el mismo write_date en el corte
+        since = [['write_date', '>=', last_write_date]] if last_write_date else []
+        domain = since
+        newest = last_write_date
+        while True:
+            with self.pool.connection() as connector:
+                records = connector.execute_kw(model, 'search_read', [domain], {
+                    'fields': fields, 'order': 'write_date asc, id asc', 'limit': self.page_size,
+                })
+            if not records:
+                break
+            self._apply(records, metrics, touched)
+            newest = max(newest or '', max(r['write_date'] for r in records))
+            if len(records) < self.page_size:
+                break
+            # Paginación por (write_date, id) y no por offset: un registro que se
+            # modifica durante la pasada se mueve al final sin desplazar a los demás
+            last = records[-1]
+            domain = since + ['|', ['write_date', '>', last['write_date']],
+                              '&', ['write_date', '=', last['write_date']], ['id', '>', last['id']]]
+
+        if self.reconcile_interval and (last_reconcile is None or time.time() - last_reconcile > self.reconcile_interval):
+            self._reconcile(model, metrics, touched)
+            last_reconcile = time.time()
+
+        with self._db_lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO sync_state (model, last_write_date, last_reconcile) VALUES (?, ?, ?)",
+                (model, newest, last_reconcile),
+            )
+
+    def _apply(self, records, metrics, touched):
+        with self._db_lock, self._db:
+            for record in records:
+                for metric in metrics:
+                    old = self._db.execute(
+                        "SELECT day, amount FROM records WHERE metric = ? AND record_id = ?", (metric.key, record['id'])
+                    ).fetchone()
+                    day = record.get(metric.date_field)
+                    matches = bool(day) and all(leaf_matches(record.get(leaf[0]), leaf) for leaf in metric.domain)
+                    if not matches:
+                        if old:
+                            touched[(metric.key, old[0])] = True
+                            self._db.execute("DELETE FROM records WHERE metric = ? AND record_id = ?",
+                                             (metric.key, record['id']))
+                        continue
+                    day = day[:10]
+                    amount = (record.get(metric.measure) or 0.0) if metric.measure else 0.0
+                    # El corte '>=' de write_date vuelve a traer registros sin cambios
+                    if old == (day, amount):
+                        continue
+                    if old:
+                        touched[(metric.key, old[0])] = True
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO records (metric, record_id, day, amount) VALUES (?, ?, ?, ?)",
+                        (metric.key, record['id'], day, amount),
+                    )
+                    touched[(metric.key, day)] = True
+
+    def _reconcile(self, model, metrics, touched):
+        # Los registros borrados en Odoo no cambian write_date: se detectan por id
+        with self.pool.connection() as connector:
+            ids = set(connector.execute_kw(model, 'search', [[]]))
+        with self._db_lock, self._db:
+            for metric in metrics:
+                stored = self._db.execute("SELECT record_id, day FROM records WHERE metric = ?", (metric.key,)).fetchall()
+                for record_id, day in stored:
+                    if record_id not in ids:
+                        self._db.execute("DELETE FROM records WHERE metric = ? AND record_id = ?", (metric.key, record_id))
+                        touched[(metric.key, day)] = True
+
+    def _rebuild_days(self, touched, bump):
+        with self._db_lock, self._db:
+            for key, day in touched:
+                self._db.execute("DELETE FROM daily WHERE metric = ? AND day = ?", (key, day))
+                self._db.execute(
+                    "INSERT INTO daily (metric, day, total, count) "
+                    "SELECT metric, day, SUM(amount), COUNT(*) FROM records "
+                    "WHERE metric = ? AND day = ? GROUP BY metric, day",
+                    (key, day),
+                )
+            if not bump:
+                return
+            # Dentro de la misma transacción: quien vea la versión nueva ve los días
+            self._version = self._db.execute("PRAGMA user_version").fetchone()[0] + 1
+            self._db.execute(f"PRAGMA user_version = {self._version}")
+
+    def reopen(self):
+        """Conexión y locks nuevos en un proceso hijo: no se heredan de un fork."""
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db_lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+
+    # === Tarea en segundo plano ===
+
+    @property
+    def leader(self):
+        return self.lock_path is None or fcntl is None or self._lock_file is not None
+
+    def _try_lead(self):
+        if self.leader:
+            return True
+        lock_file = open(self.lock_path, "a")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        # El flock se libera solo si el proceso muere
+        self._lock_file = lock_file
+        logger.info("Proceso %s a cargo de sincronizar los agregados diarios", os.getpid())
+        # Parte de lo que haya dejado el anterior
+        self.refresh()
+        return True
+
+    def on_sync(self, callback):
+        """Registra `callback(touched)`, llamado por el hilo tras cada sincronización con cambios."""
+        self._listeners.append(callback)
+
+    def request_sync(self):
+        """Adelanta la próxima sincronización sin esperarla (avisos de cambios)."""
+        self._wanted.set()
+
+    def start(self, interval, debounce=1.0):
+        def loop():
+            while not self._stop.is_set():
+                try:
+                    if self._try_lead():
+                        touched = self.sync()
+                        for callback in self._listeners if touched else ():
+                            callback(touched)
+                    else:
+                        self.refresh()
+                except Exception:
+                    logger.exception("Error sincronizando los agregados diarios con Odoo")
+                # Una ráfaga de avisos se agrupa en una sola sincronización
+                if self._wanted.wait(interval):
+                    self._stop.wait(debounce)
+                self._wanted.clear()
+
+        self._thread = threading.Thread(target=loop, name="rollup-sync", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wanted.set()
+
+    def stats(self):
+        return {
+            "ready": self.ready,
+            "metrics": sorted(self.metrics),
+            "last_sync": self.last_sync,
+            "last_sync_duration": self.last_sync_duration,
+            "leader": self.leader,
+            "version": self._version,
+        }
+
+
+def init_rollup(app, metrics):
+    if not app.config.get('ROLLUP_ENABLED'):
+        return
+    store = RollupStore(
+        app.config['ROLLUP_PATH'],
+        app.extensions["odoo_pool"],
+        metrics,
+        page_size=app.config.get('ROLLUP_PAGE_SIZE', 2000),
+        reconcile_interval=app.config.get('ROLLUP_RECONCILE_INTERVAL', 3600),
+        # Un solo proceso sincroniza cada fichero de agregados
+        lock_path=app.config['ROLLUP_PATH'] + ".lock",
+    )
+    app.extensions["rollup_store"] = store
+    # Con BACKGROUND_DEFERRED lo arranca cada worker tras el fork (app/serving.py)
+    if not app.config.get('BACKGROUND_DEFERRED'):
+        store.start(app.config.get('ROLLUP_SYNC_INTERVAL', 60), app.config.get('ROLLUP_SYNC_DEBOUNCE', 1))
@@ -1,205 +1,246 @@
-from flask import Blueprint, request, jsonify
-from ...odoo_connector import OdooConnector
-from datetime import datetime
-
-def format_mxn(value):
-    return f"${value:,.2f}"
+from flask import Blueprint, current_app, request, jsonify
+from ...http_cache import summary_response
+from ...formatting import RESPONSE_FORMATS, currency, money, percent
+from ...export import export_response
+from ...drilldown import build_breakdown, top_response
+from ...resilience import OdooUnavailable
+from ...kpi import BREAKDOWNS, GRANULARITIES, Metric, evaluate, evaluate_ranges, parse_ranges, previous_period
+from ...series import build_series
+from functools import partial
 
 compras_bp = Blueprint('compras', __name__)
 
+# === KPIs de compras ===
+COMPRAS_METRICS = [
+    # Compras Confirmadas (purchase.order)
+    Metric("compras.confirmadas", 'purchase.order', 'date_order',
+           [['state', '=', 'purchase']], 'amount_total', datetime_field=True),
+    # Facturas proveedores (account.move)
+    Metric("compras.facturas_posteadas", 'account.move', 'invoice_date',
+           [['move_type', '=', 'in_invoice'], ['state', '=', 'posted']], 'amount_total'),
+    Metric("compras.facturas_borrador", 'account.move', 'invoice_date',
+           [['move_type', '=', 'in_invoice'], ['state', '=', 'draft']]),
+    # Pagos realizados (account.payment)
+    Metric("compras.pagos", 'account.payment', 'date',
+           [['payment_type', '=', 'outbound'], ['state', '=', 'posted']], 'amount'),
+]
+
+# Series de /serie: nombre en la respuesta -> métrica
+COMPRAS_SERIES = {
+    "compras": "compras.confirmadas",
+    "facturacion": "compras.facturas_posteadas",
+    "pagos": "compras.pagos"
+}
+
+# Drill-down de /top: campo de agrupación -> métrica que se reparte entre sus valores
+COMPRAS_TOP = {
+    "partner_id": COMPRAS_METRICS[0],
+    # Los productos están en las líneas; fecha y estado se toman del pedido
+    "product_id": Metric("compras.lineas", 'purchase.order.line', 'order_id.date_order',
+                         [['order_id.state', '=', 'purchase']], 'price_subtotal', datetime_field=True),
+}
+
+def build_compras_summary(start_date, end_date, raw=False):
+    # Fechas actuales y previas
+    prev_start, prev_end = previous_period(start_date, end_date)
+
+    # Periodo actual y anterior en el mínimo número de read_group
+    values = evaluate(COMPRAS_METRICS, [(start_date, end_date), (prev_start, prev_end)])
+    return compras_payload(values, raw)
+
+def compras_payload(values, raw=False, currency_code=None):
+    # values: {métrica: [periodo actual, periodo anterior]}
+
+    # === Compras ===
+    (total_confirmed_purchases, orders_count), (previous_confirmed_purchases, _) = values["compras.confirmadas"]
+
+    if previous_confirmed_purchases > 0:
+        trend_compras = ((total_confirmed_purchases - previous_confirmed_purchases) / previous_confirmed_purchases) * 100
+    else:
+        trend_compras = 100.0 if total_confirmed_purchases > 0 else 0.0
+
+    is_positive_compras = trend_compras >= 0
+    trend_str_compras = percent(trend_compras, raw)
+    mensaje_compras = (
+        "Compras incrementaron" if trend_compras > 0
+        else "Compras disminuyeron" if trend_compras < 0
+        else "Compras se mantuvieron"
+    )
+
+    # === Facturación ===
+    (total_billed_purchases, bills_posted_count), (previous_billed, _) = values["compras.facturas_posteadas"]
+    bills_draft_count = values["compras.facturas_borrador"][0].count
+
+    trend_facturacion = ((total_billed_purchases - previous_billed) / previous_billed) * 100 if previous_billed > 0 else (100.0 if total_billed_purchases > 0 else 0.0)
+    is_positive_facturacion = trend_facturacion >= 0
+    trend_str_facturacion = percent(trend_facturacion, raw)
+    mensaje_facturacion = (
+        "Facturación de proveedor incrementó" if trend_facturacion > 0
+        else "Facturación disminuyó" if trend_facturacion < 0
+        else "Facturación se mantuvo"
+    )
+
+    # === Pagos ===
+    (total_paid, payments_count), (previous_paid, _) = values["compras.pagos"]
+
+    trend_pagos = ((total_paid - previous_paid) / previous_paid) * 100 if previous_paid > 0 else (100.0 if total_paid > 0 else 0.0)
+    is_positive_pagos = trend_pagos >= 0
+    trend_str_pagos = percent(trend_pagos, raw)
+    mensaje_pagos = (
+        "Pagos realizados incrementaron" if trend_pagos > 0
+        else "Pagos disminuyeron" if trend_pagos < 0
+        else "Pagos se mantuvieron"
+    )
+
+    return {
+        "compras_confirmadas": {
+            "total_comprado": money(total_confirmed_purchases, raw, currency_code),
+            "ordenes_compra": orders_count
+        },
+        "facturacion_proveedor": {
+            "total_facturado": money(total_billed_purchases, raw, currency_code),
+            "facturas_posteadas": bills_posted_count,
+            "facturas_borrador": bills_draft_count
+        },
+        "pagos_realizados": {
+            "total_pagado": money(total_paid, raw, currency_code),
+            "pagos_efectuados": payments_count
+        },
+        "analisis_periodo": {
+            "compras": {
+                "comparativa": trend_str_compras,
+                "esPositivo": is_positive_compras,
+                "mensaje": mensaje_compras + " respecto al periodo anterior"
+            },
+            "facturacion": {
+                "comparativa": trend_str_facturacion,
+                "esPositivo": is_positive_facturacion,
+                "mensaje": mensaje_facturacion + " respecto al periodo anterior"
+            },
+            "pagos": {
+                "comparativa": trend_str_pagos,
+                "esPositivo": is_positive_pagos,
+                "mensaje": mensaje_pagos + " respecto al periodo anterior"
+            }
+        },
+        **currency(raw, currency_code)
+    }
+
 @compras_bp.route("/", methods=["GET"])
 def compras_summary():
     start_date = request.args.get("start")
     end_date = request.args.get("end")
 
+    response_format = request.args.get("format", "display")
+    group_by = request.args.get("group_by")
+
+    if not start_date or not end_date:
+        return jsonify({"error": "Parámetros 'start' y 'end' requeridos en formato YYYY-MM-DD"}), 400
+    if response_format not in RESPONSE_FORMATS:
+        return jsonify({"error": "Parámetro 'format' debe ser display o raw"}), 400
+    if group_by is not None and group_by not in BREAKDOWNS:
+        return jsonify({"error": "Parámetro 'group_by' debe ser company o currency"}), 400
+
+    try:
+        if group_by:
+            # Desglose por compañía o moneda en los mismos read_group
+            build = partial(build_breakdown, COMPRAS_METRICS, compras_payload, group_by)
+            return summary_response(f"compras.{group_by}", build, start_date, end_date,
+                                    raw=response_format == "raw")
+        return summary_response("compras", build_compras_summary, start_date, end_date,
+                                raw=response_format == "raw")
+
+    except OdooUnavailable as e:
+        return jsonify({"error": str(e)}), 503, {"Retry-After": str(e.retry_after)}
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@compras_bp.route("/serie", methods=["GET"])
+def compras_serie():
+    start_date = request.args.get("start")
+    end_date = request.args.get("end")
+    granularity = request.args.get("granularity", "month")
+
     if not start_date or not end_date:
         return jsonify({"error": "Parámetros 'start' y 'end' requeridos en formato YYYY-MM-DD"}), 400
+    if granularity not in GRANULARITIES:
+        return jsonify({"error": "Parámetro 'granularity' debe ser day, week o month"}), 400
+
+    try:
+        build = partial(build_series, COMPRAS_METRICS, COMPRAS_SERIES, granularity)
+        return summary_response(f"compras.serie.{granularity}", build, start_date, end_date)
+
+    except OdooUnavailable as e:
+        return jsonify({"error": str(e)}), 503, {"Retry-After": str(e.retry_after)}
 
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@compras_bp.route("/rangos", methods=["POST"])
+def compras_rangos():
+    # Cuerpo: {"ranges": [{"start": "YYYY-MM-DD", "end": "YYYY-MM-DD"}, ...]}
+    payload = request.get_json(silent=True) or {}
     try:
-        connector = OdooConnector()
-
-        # Fechas actuales y previas
-        start = datetime.strptime(start_date, "%Y-%m-%d")
-        end = datetime.strptime(end_date, "%Y-%m-%d")
-        delta = end - start
-        prev_start = (start - delta).strftime("%Y-%m-%d")
-        prev_end = (end - delta).strftime("%Y-%m-%d")
-
-        # === Compras Confirmadas (purchase.order) ===
-        domain_orders = [
-            ['date_order', '>=', start_date],
-            ['date_order', '<=', end_date],
-            ['state', '=', 'purchase']
-        ]
-
-        orders_total = connector.models.execute_kw(
-            connector.db, connector.uid, connector.password,
-            'purchase.order', 'read_group',
-            [domain_orders, ['amount_total'], []]
-        )
-        orders_count = connector.models.execute_kw(
-            connector.db, connector.uid, connector.password,
-            'purchase.order', 'search_count',
-            [domain_orders]
-        )
-
-        total_confirmed_purchases = orders_total[0]['amount_total'] if orders_total else 0.0
-
-        # === Compras periodo anterior ===
-        domain_orders_prev = [
-            ['date_order', '>=', prev_start],
-            ['date_order', '<=', prev_end],
-            ['state', '=', 'purchase']
-        ]
-        orders_prev_total = connector.models.execute_kw(
-            connector.db, connector.uid, connector.password,
-            'purchase.order', 'read_group',
-            [domain_orders_prev, ['amount_total'], []]
-        )
-        previous_confirmed_purchases = orders_prev_total[0]['amount_total'] if orders_prev_total else 0.0
-
-        if previous_confirmed_purchases > 0:
-            trend_compras = ((total_confirmed_purchases - previous_confirmed_purchases) / previous_confirmed_purchases) * 100
-        else:
-            trend_compras = 100.0 if total_confirmed_purchases > 0 else 0.0
-
-        is_positive_compras = trend_compras >= 0
-        trend_str_compras = f"{trend_compras:+.1f}%"
-        mensaje_compras = (
-            "Compras incrementaron" if trend_compras > 0
-            else "Compras disminuyeron" if trend_compras < 0
-            else "Compras se mantuvieron"
-        )
-
-        # === Facturas proveedores (account.move) ===
-        domain_bills_posted = [
-            ['invoice_date', '>=', start_date],
-            ['invoice_date', '<=', end_date],
-            ['move_type', '=', 'in_invoice'],
-            ['state', '=', 'posted']
-        ]
-        domain_bills_draft = [
-            ['invoice_date', '>=', start_date],
-            ['invoice_date', '<=', end_date],
-            ['move_type', '=', 'in_invoice'],
-            ['state', '=', 'draft']
-        ]
-
-        bills_posted_total = connector.models.execute_kw(
-            connector.db, connector.uid, connector.password,
-            'account.move', 'read_group',
-            [domain_bills_posted, ['amount_total'], []]
-        )
-        bills_posted_count = connector.models.execute_kw(
-            connector.db, connector.uid, connector.password,
-            'account.move', 'search_count',
-            [domain_bills_posted]
-        )
-        bills_draft_count = connector.models.execute_kw(
-            connector.db, connector.uid, connector.password,
-            'account.move', 'search_count',
-            [domain_bills_draft]
-        )
-
-        total_billed_purchases = bills_posted_total[0]['amount_total'] if bills_posted_total else 0.0
-
-        # === Facturación anterior ===
-        domain_bills_prev = [
-            ['invoice_date', '>=', prev_start],
-            ['invoice_date', '<=', prev_end],
-            ['move_type', '=', 'in_invoice'],
-            ['state', '=', 'posted']
-        ]
-        prev_bills = connector.models.execute_kw(
-            connector.db, connector.uid, connector.password,
-            'account.move', 'read_group',
-            [domain_bills_prev, ['amount_total'], []]
-        )
-        previous_billed = prev_bills[0]['amount_total'] if prev_bills else 0.0
-
-        trend_facturacion = ((total_billed_purchases - previous_billed) / previous_billed) * 100 if previous_billed > 0 else (100.0 if total_billed_purchases > 0 else 0.0)
-        is_positive_facturacion = trend_facturacion >= 0
-        trend_str_facturacion = f"{trend_facturacion:+.1f}%"
-        mensaje_facturacion = (
-            "Facturación de proveedor incrementó" if trend_facturacion > 0
-            else "Facturación disminuyó" if trend_facturacion < 0
-            else "Facturación se mantuvo"
-        )
-
-        # === Pagos realizados (account.payment) ===
-        domain_payments = [
-            ['date', '>=', start_date],
-            ['date', '<=', end_date],
-            ['payment_type', '=', 'outbound'],
-            ['state', '=', 'posted']
-        ]
-        payments_total = connector.models.execute_kw(
-            connector.db, connector.uid, connector.password,
-            'account.payment', 'read_group',
-            [domain_payments, ['amount'], []]
-        )
-        payments_count = connector.models.execute_kw(
-            connector.db, connector.uid, connector.password,
-            'account.payment', 'search_count',
-            [domain_payments]
-        )
-        total_paid = payments_total[0]['amount'] if payments_total else 0.0
-
-        # === Pagos anteriores ===
-        domain_payments_prev = [
-            ['date', '>=', prev_start],
-            ['date', '<=', prev_end],
-            ['payment_type', '=', 'outbound'],
-            ['state', '=', 'posted']
-        ]
-        payments_prev_total = connector.models.execute_kw(
-            connector.db, connector.uid, connector.password,
-            'account.payment', 'read_group',
-            [domain_payments_prev, ['amount'], []]
-        )
-        previous_paid = payments_prev_total[0]['amount'] if payments_prev_total else 0.0
-
-        trend_pagos = ((total_paid - previous_paid) / previous_paid) * 100 if previous_paid > 0 else (100.0 if total_paid > 0 else 0.0)
-        is_positive_pagos = trend_pagos >= 0
-        trend_str_pagos = f"{trend_pagos:+.1f}%"
-        mensaje_pagos = (
-            "Pagos realizados incrementaron" if trend_pagos > 0
-            else "Pagos disminuyeron" if trend_pagos < 0
-            else "Pagos se mantuvieron"
-        )
+        ranges = parse_ranges(payload.get("ranges"), current_app.config['BATCH_MAX_RANGES'])
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
+    try:
+        results = evaluate_ranges(COMPRAS_METRICS, ranges)
         return jsonify({
-            "compras_confirmadas": {
-                "total_comprado": format_mxn(total_confirmed_purchases),
-                "ordenes_compra": orders_count
-            },
-            "facturacion_proveedor": {
-                "total_facturado": format_mxn(total_billed_purchases),
-                "facturas_posteadas": bills_posted_count,
-                "facturas_borrador": bills_draft_count
-            },
-            "pagos_realizados": {
-                "total_pagado": format_mxn(total_paid),
-                "pagos_efectuados": payments_count
-            },
-            "analisis_periodo": {
-                "compras": {
-                    "comparativa": trend_str_compras,
-                    "esPositivo": is_positive_compras,
-                    "mensaje": mensaje_compras + " respecto al periodo anterior"
-                },
-                "facturacion": {
-                    "comparativa": trend_str_facturacion,
-                    "esPositivo": is_positive_facturacion,
-                    "mensaje": mensaje_facturacion + " respecto al periodo anterior"
-                },
-                "pagos": {
-                    "comparativa": trend_str_pagos,
-                    "esPositivo": is_positive_pagos,
-                    "mensaje": mensaje_pagos + " respecto al periodo anterior"
-                }
-            }
+            "resultados": [
+                {"start": start_date, "end": end_date, "resultado": compras_payload(values)}
+                for (start_date, end_date), values in zip(ranges, results)
+            ]
         })
 
+    except OdooUnavailable as e:
+        return jsonify({"error": str(e)}), 503, {"Retry-After": str(e.retry_after)}
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@compras_bp.route("/export", methods=["GET"])
+def compras_export():
+    # ?metric=compras.confirmadas&start=...&end=...&format=ndjson|csv&fields=campo1,campo2
+    start_date = request.args.get("start")
+    end_date = request.args.get("end")
+
+    if not start_date or not end_date:
+        return jsonify({"error": "Parámetros 'start' y 'end' requeridos en formato YYYY-MM-DD"}), 400
+
+    try:
+        return export_response(COMPRAS_METRICS, request.args.get("metric"), start_date, end_date,
+                               request.args.get("format", "ndjson"), request.args.get("fields"))
+
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    except OdooUnavailable as e:
+        return jsonify({"error": str(e)}), 503, {"Retry-After": str(e.retry_after)}
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@compras_bp.route("/top", methods=["GET"])
+def compras_top():
+    # ?by=partner_id|product_id&start=...&end=...&limit=10&cursor=<siguiente>
+    start_date = request.args.get("start")
+    end_date = request.args.get("end")
+
+    if not start_date or not end_date:
+        return jsonify({"error": "Parámetros 'start' y 'end' requeridos en formato YYYY-MM-DD"}), 400
+
+    try:
+        return top_response("compras", COMPRAS_TOP, request.args.get("by", "partner_id"), start_date, end_date,
+                            request.args.get("limit"), request.args.get("cursor"))
+
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    except OdooUnavailable as e:
+        return jsonify({"error": str(e)}), 503, {"Retry-After": str(e.retry_after)}
+
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -1,12 +1,15 @@
-from flask import Blueprint, jsonify
-from ...odoo_connector import OdooConnector
+import hmac
+
+from flask import Blueprint, current_app, jsonify, request
+from ...cache import get_cache, invalidate_summaries
+from ...odoo_connector import get_connector
 
 health_bp = Blueprint('health', __name__)
 
 @health_bp.route("/", methods=["GET"])
 def health_check():
     try:
-        connector = OdooConnector()
+        connector = get_connector()
         status, info = connector.is_connected()
         return jsonify({
             "status": "success" if status else "error",
@@ -17,3 +20,31 @@ def health_check():
             "status": "error",
             "details": str(e)
         }), 500
+
+@health_bp.route("/cache", methods=["GET"])
+def cache_stats():
+    return jsonify(get_cache().stats())
+
+@health_bp.route("/cache", methods=["DELETE"])
+def cache_invalidate():
+    # ?endpoint=ventas&start=YYYY-MM-DD&end=YYYY-MM-DD, todos opcionales. Token en X-Admin-Token
+    admin_token = current_app.config.get('ADMIN_TOKEN')
+    if not admin_token:
+        return jsonify({"error": "Invalidación no configurada (ADMIN_TOKEN)"}), 404
+    token = request.headers.get("X-Admin-Token") or ""
+    if not hmac.compare_digest(token.encode(), admin_token.encode()):
+        return jsonify({"error": "Token no válido"}), 403
+
+    removed = invalidate_summaries(
+        endpoint=request.args.get("endpoint"),
+        start_date=request.args.get("start"),
+        end_date=request.args.get("end"),
+    )
+    return jsonify({"invalidadas": removed})
+
+@health_bp.route("/precompute", methods=["GET"])
+def precompute_stats():
+    scheduler = current_app.extensions.get("precompute")
+    if scheduler is None:
+        return jsonify({"enabled": False})
+    return jsonify(dict(scheduler.stats(), enabled=True))
@@ -1,132 +1,210 @@
-from flask import Blueprint, request, jsonify
-from ...odoo_connector import OdooConnector
-from datetime import datetime
+from flask import Blueprint, current_app, request, jsonify
+from ...http_cache import summary_response
+from ...formatting import RESPONSE_FORMATS, percent
+from ...export import export_response
+from ...resilience import OdooUnavailable
+from ...kpi import GRANULARITIES, Metric, evaluate, evaluate_ranges, parse_ranges, previous_period
+from ...series import build_series
+from functools import partial
 
 manufactura_bp = Blueprint('manufactura', __name__)
 
+# === KPIs de manufactura (mrp.production) ===
+MANUFACTURA_METRICS = [
+    Metric("manufactura.ordenes", 'mrp.production', 'create_date',
+           [], 'product_qty', datetime_field=True),
+    Metric("manufactura.completadas", 'mrp.production', 'create_date',
+           [['state', '=', 'done']], datetime_field=True),
+    Metric("manufactura.pendientes", 'mrp.production', 'create_date',
+           [['state', 'in', ['confirmed', 'planned', 'progress']]], datetime_field=True),
+]
+
+# Series de /serie: nombre en la respuesta -> métrica
+MANUFACTURA_SERIES = {
+    "ordenes": "manufactura.ordenes",
+    "completadas": "manufactura.completadas",
+    "pendientes": "manufactura.pendientes"
+}
+
+def build_manufactura_summary(start_date, end_date, raw=False):
+    # Parseo de fechas
+    prev_start, prev_end = previous_period(start_date, end_date)
+
+    # Un solo read_group por estado y día cubre ambos periodos
+    values = evaluate(MANUFACTURA_METRICS, [(start_date, end_date), (prev_start, prev_end)])
+    return manufactura_payload(values, raw)
+
+def manufactura_payload(values, raw=False):
+    # values: {métrica: [periodo actual, periodo anterior]}
+
+    # === Producción actual (mrp.production) ===
+    (total_units, total_orders), (total_units_prev, total_orders_prev) = values["manufactura.ordenes"]
+    completed_orders, completed_orders_prev = (v.count for v in values["manufactura.completadas"])
+    pending_orders = values["manufactura.pendientes"][0].count
+
+    # Sin órdenes la suma es el entero 0, como al sumar la lista vacía
+    total_units = total_units if total_orders else 0
+    total_units_prev = total_units_prev if total_orders_prev else 0
+
+    eficiencia = (completed_orders / total_orders * 100) if total_orders > 0 else 0.0
+    eficiencia_prev = (completed_orders_prev / total_orders_prev * 100) if total_orders_prev > 0 else 0.0
+
+    # === Cálculos comparativos ===
+
+    def calcular_tendencia(actual, anterior):
+        if anterior > 0:
+            cambio = ((actual - anterior) / anterior) * 100
+        else:
+            cambio = 100.0 if actual > 0 else 0.0
+        return cambio
+
+    # Producción (unidades fabricadas)
+    trend_produccion = calcular_tendencia(total_units, total_units_prev)
+    is_positive_produccion = trend_produccion >= 0
+    trend_str_produccion = percent(trend_produccion, raw)
+    mensaje_produccion = (
+        "Producción aumentó" if trend_produccion > 0
+        else "Producción disminuyó" if trend_produccion < 0
+        else "Producción se mantuvo"
+    )
+
+    # Órdenes de producción
+    trend_ordenes = calcular_tendencia(total_orders, total_orders_prev)
+    is_positive_ordenes = trend_ordenes >= 0
+    trend_str_ordenes = percent(trend_ordenes, raw)
+    mensaje_ordenes = (
+        "Órdenes de producción aumentaron" if trend_ordenes > 0
+        else "Órdenes disminuyeron" if trend_ordenes < 0
+        else "Órdenes se mantuvieron"
+    )
+
+    # Eficiencia
+    trend_eficiencia = calcular_tendencia(eficiencia, eficiencia_prev)
+    is_positive_eficiencia = trend_eficiencia >= 0
+    trend_str_eficiencia = percent(trend_eficiencia, raw)
+    mensaje_eficiencia = (
+        "Eficiencia mejoró" if trend_eficiencia > 0
+        else "Eficiencia disminuyó" if trend_eficiencia < 0
+        else "Eficiencia se mantuvo"
+    )
+
+    # === Respuesta organizada estilo KPIs ===
+    result = {
+        "ordenes_produccion": {
+            "total_ordenes": total_orders,
+            "ordenes_completadas": completed_orders,
+            "ordenes_pendientes": pending_orders,
+            "analisis_periodo": {
+                "comparativa": trend_str_ordenes,
+                "esPositivo": is_positive_ordenes,
+                "mensaje": mensaje_ordenes + " respecto al periodo anterior"
+            }
+        },
+        "volumen_producido": {
+            "unidades_fabricadas": total_units,
+            "analisis_periodo": {
+                "comparativa": trend_str_produccion,
+                "esPositivo": is_positive_produccion,
+                "mensaje": mensaje_produccion + " respecto al periodo anterior"
+            }
+        },
+        "eficiencia": {
+            "porcentaje_completado": percent(eficiencia, raw, signed=False),
+            "analisis_periodo": {
+                "comparativa": trend_str_eficiencia,
+                "esPositivo": is_positive_eficiencia,
+                "mensaje": mensaje_eficiencia + " respecto al periodo anterior"
+            }
+        }
+    }
+
+    return result
+
 @manufactura_bp.route("/", methods=["GET"])
 def manufactura_summary():
     start_date = request.args.get("start")
     end_date = request.args.get("end")
 
+    response_format = request.args.get("format", "display")
+
     if not start_date or not end_date:
         return jsonify({"error": "Parámetros 'start' y 'end' requeridos en formato YYYY-MM-DD"}), 400
+    if response_format not in RESPONSE_FORMATS:
+        return jsonify({"error": "Parámetro 'format' debe ser display o raw"}), 400
 
     try:
-        connector = OdooConnector()
-
-        # Parseo de fechas
-        start = datetime.strptime(start_date, "%Y-%m-%d")
-        end = datetime.strptime(end_date, "%Y-%m-%d")
-        delta = end - start
-        prev_start = (start - delta).strftime("%Y-%m-%d")
-        prev_end = (end - delta).strftime("%Y-%m-%d")
-
-        # === Producción actual (mrp.production) ===
-        domain_current = [
-            ['create_date', '>=', start_date],
-            ['create_date', '<=', end_date]
-        ]
-        production_orders = connector.models.execute_kw(
-            connector.db, connector.uid, connector.password,
-            'mrp.production', 'search_read',
-            [domain_current],
-            {'fields': ['product_qty', 'state']}
-        )
-
-        total_orders = len(production_orders)
-        completed_orders = sum(1 for p in production_orders if p['state'] == 'done')
-        pending_orders = sum(1 for p in production_orders if p['state'] in ['confirmed', 'planned', 'progress'])
-        total_units = sum(p['product_qty'] for p in production_orders)
-        eficiencia = (completed_orders / total_orders * 100) if total_orders > 0 else 0.0
-
-        # === Producción anterior ===
-        domain_previous = [
-            ['create_date', '>=', prev_start],
-            ['create_date', '<=', prev_end]
-        ]
-        production_prev = connector.models.execute_kw(
-            connector.db, connector.uid, connector.password,
-            'mrp.production', 'search_read',
-            [domain_previous],
-            {'fields': ['product_qty', 'state']}
-        )
-
-        total_orders_prev = len(production_prev)
-        completed_orders_prev = sum(1 for p in production_prev if p['state'] == 'done')
-        total_units_prev = sum(p['product_qty'] for p in production_prev)
-        eficiencia_prev = (completed_orders_prev / total_orders_prev * 100) if total_orders_prev > 0 else 0.0
-
-        # === Cálculos comparativos ===
-
-        def calcular_tendencia(actual, anterior):
-            if anterior > 0:
-                cambio = ((actual - anterior) / anterior) * 100
-            else:
-                cambio = 100.0 if actual > 0 else 0.0
-            return cambio
-
-        # Producción (unidades fabricadas)
-        trend_produccion = calcular_tendencia(total_units, total_units_prev)
-        is_positive_produccion = trend_produccion >= 0
-        trend_str_produccion = f"{trend_produccion:+.1f}%"
-        mensaje_produccion = (
-            "Producción aumentó" if trend_produccion > 0
-            else "Producción disminuyó" if trend_produccion < 0
-            else "Producción se mantuvo"
-        )
-
-        # Órdenes de producción
-        trend_ordenes = calcular_tendencia(total_orders, total_orders_prev)
-        is_positive_ordenes = trend_ordenes >= 0
-        trend_str_ordenes = f"{trend_ordenes:+.1f}%"
-        mensaje_ordenes = (
-            "Órdenes de producción aumentaron" if trend_ordenes > 0
-            else "Órdenes disminuyeron" if trend_ordenes < 0
-            else "Órdenes se mantuvieron"
-        )
-
-        # Eficiencia
-        trend_eficiencia = calcular_tendencia(eficiencia, eficiencia_prev)
-        is_positive_eficiencia = trend_eficiencia >= 0
-        trend_str_eficiencia = f"{trend_eficiencia:+.1f}%"
-        mensaje_eficiencia = (
-            "Eficiencia mejoró" if trend_eficiencia > 0
-            else "Eficiencia disminuyó" if trend_eficiencia < 0
-            else "Eficiencia se mantuvo"
-        )
-
-        # === Respuesta organizada estilo KPIs ===
-        result = {
-            "ordenes_produccion": {
-                "total_ordenes": total_orders,
-                "ordenes_completadas": completed_orders,
-                "ordenes_pendientes": pending_orders,
-                "analisis_periodo": {
-                    "comparativa": trend_str_ordenes,
-                    "esPositivo": is_positive_ordenes,
-                    "mensaje": mensaje_ordenes + " respecto al periodo anterior"
-                }
-            },
-            "volumen_producido": {
-                "unidades_fabricadas": total_units,
-                "analisis_periodo": {
-                    "comparativa": trend_str_produccion,
-                    "esPositivo": is_positive_produccion,
-                    "mensaje": mensaje_produccion + " respecto al periodo anterior"
-                }
-            },
-            "eficiencia": {
-                "porcentaje_completado": f"{eficiencia:.1f}%",
-                "analisis_periodo": {
-                    "comparativa": trend_str_eficiencia,
-                    "esPositivo": is_positive_eficiencia,
-                    "mensaje": mensaje_eficiencia + " respecto al periodo anterior"
-                }
-            }
-        }
+        return summary_response("manufactura", build_manufactura_summary, start_date, end_date,
+                                raw=response_format == "raw")
+
+    except OdooUnavailable as e:
+        return jsonify({"error": str(e)}), 503, {"Retry-After": str(e.retry_after)}
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@manufactura_bp.route("/serie", methods=["GET"])
+def manufactura_serie():
+    start_date = request.args.get("start")
+    end_date = request.args.get("end")
+    granularity = request.args.get("granularity", "month")
+
+    if not start_date or not end_date:
+        return jsonify({"error": "Parámetros 'start' y 'end' requeridos en formato YYYY-MM-DD"}), 400
+    if granularity not in GRANULARITIES:
+        return jsonify({"error": "Parámetro 'granularity' debe ser day, week o month"}), 400
+
+    try:
+        build = partial(build_series, MANUFACTURA_METRICS, MANUFACTURA_SERIES, granularity)
+        return summary_response(f"manufactura.serie.{granularity}", build, start_date, end_date)
+
+    except OdooUnavailable as e:
+        return jsonify({"error": str(e)}), 503, {"Retry-After": str(e.retry_after)}
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@manufactura_bp.route("/rangos", methods=["POST"])
+def manufactura_rangos():
+    # Cuerpo: {"ranges": [{"start": "YYYY-MM-DD", "end": "YYYY-MM-DD"}, ...]}
+    payload = request.get_json(silent=True) or {}
+    try:
+        ranges = parse_ranges(payload.get("ranges"), current_app.config['BATCH_MAX_RANGES'])
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        results = evaluate_ranges(MANUFACTURA_METRICS, ranges)
+        return jsonify({
+            "resultados": [
+                {"start": start_date, "end": end_date, "resultado": manufactura_payload(values)}
+                for (start_date, end_date), values in zip(ranges, results)
+            ]
+        })
+
+    except OdooUnavailable as e:
+        return jsonify({"error": str(e)}), 503, {"Retry-After": str(e.retry_after)}
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@manufactura_bp.route("/export", methods=["GET"])
+def manufactura_export():
+    # ?metric=manufactura.ordenes&start=...&end=...&format=ndjson|csv&fields=campo1,campo2
+    start_date = request.args.get("start")
+    end_date = request.args.get("end")
+
+    if not start_date or not end_date:
+        return jsonify({"error": "Parámetros 'start' y 'end' requeridos en formato YYYY-MM-DD"}), 400
+
+    try:
+        return export_response(MANUFACTURA_METRICS, request.args.get("metric"), start_date, end_date,
+                               request.args.get("format", "ndjson"), request.args.get("fields"))
+
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
-        return jsonify(result)
+    except OdooUnavailable as e:
+        return jsonify({"error": str(e)}), 503, {"Retry-After": str(e.retry_after)}
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -0,0 +1,3 @@
+from .views import metrics_bp
+
+__all__ = ["metrics_bp"]
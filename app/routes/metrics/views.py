@@ -0,0 +1,9 @@
+from flask import Blueprint, Response, current_app
+from ...metrics import collect_gauges, get_metrics
+
+metrics_bp = Blueprint('metrics', __name__)
+
+@metrics_bp.route("/metrics", methods=["GET"])
+def prometheus_metrics():
+    body = get_metrics().render(collect_gauges(current_app))
+    return Response(body, mimetype="text/plain; version=0.0.4")
@@ -0,0 +1,45 @@
+import queue
+
+from flask import Blueprint, Response, current_app, request, jsonify
+from ...cache import normalize_range
+from ...stream import get_hub
+
+stream_bp = Blueprint('stream', __name__)
+
+@stream_bp.route("/", methods=["GET"])
+def stream_tablero():
+    # Eventos: 'snapshot' (payload completo de /tablero/), 'diff' (sólo lo que
+    # cambió; las claves borradas llegan como null) y 'error'
+    start_date = request.args.get("start")
+    end_date = request.args.get("end")
+
+    if not start_date or not end_date:
+        return jsonify({"error": "Parámetros 'start' y 'end' requeridos en formato YYYY-MM-DD"}), 400
+
+    try:
+        start_date, end_date = normalize_range(start_date, end_date)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    hub = get_hub()
+    subscriber = hub.subscribe(start_date, end_date)
+    if subscriber is None:
+        return jsonify({"error": "Demasiados clientes conectados al stream"}), 503, {"Retry-After": "30"}
+    keepalive = current_app.config.get('STREAM_KEEPALIVE', 15)
+
+    def events():
+        try:
+            yield "retry: 5000\n\n"
+            while True:
+                try:
+                    yield subscriber.queue.get(timeout=keepalive)
+                except queue.Empty:
+                    # Comentario SSE: mantiene viva la conexión a través de proxies
+                    yield ": keepalive\n\n"
+        finally:
+            hub.unsubscribe(subscriber)
+
+    return Response(events(), mimetype="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",
+    })
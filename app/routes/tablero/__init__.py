@@ -0,0 +1,3 @@
+from .views import tablero_bp
+
+__all__ = ["tablero_bp"]
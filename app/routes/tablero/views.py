@@ -0,0 +1,48 @@
+from flask import Blueprint, request, jsonify
+from ...http_cache import summary_response
+from ...formatting import RESPONSE_FORMATS
+from ...resilience import OdooUnavailable
+from ...kpi import evaluate, previous_period
+from ..ventas.views import VENTAS_METRICS, ventas_payload
+from ..compras.views import COMPRAS_METRICS, compras_payload
+from ..manufactura.views import MANUFACTURA_METRICS, manufactura_payload
+
+tablero_bp = Blueprint('tablero', __name__)
+
+# Todas las áreas en un solo plan: account.move y account.payment de ventas y
+# compras se resuelven en un único read_group agrupado por move_type/payment_type
+TABLERO_METRICS = VENTAS_METRICS + COMPRAS_METRICS + MANUFACTURA_METRICS
+
+def build_tablero_summary(start_date, end_date, raw=False):
+    prev_start, prev_end = previous_period(start_date, end_date)
+    values = evaluate(TABLERO_METRICS, [(start_date, end_date), (prev_start, prev_end)])
+    return tablero_payload(values, raw)
+
+def tablero_payload(values, raw=False):
+    return {
+        "ventas": ventas_payload(values, raw),
+        "compras": compras_payload(values, raw),
+        "manufactura": manufactura_payload(values, raw)
+    }
+
+@tablero_bp.route("/", methods=["GET"])
+def tablero_summary():
+    start_date = request.args.get("start")
+    end_date = request.args.get("end")
+
+    response_format = request.args.get("format", "display")
+
+    if not start_date or not end_date:
+        return jsonify({"error": "Parámetros 'start' y 'end' requeridos en formato YYYY-MM-DD"}), 400
+    if response_format not in RESPONSE_FORMATS:
+        return jsonify({"error": "Parámetro 'format' debe ser display o raw"}), 400
+
+    try:
+        return summary_response("tablero", build_tablero_summary, start_date, end_date,
+                                raw=response_format == "raw")
+
+    except OdooUnavailable as e:
+        return jsonify({"error": str(e)}), 503, {"Retry-After": str(e.retry_after)}
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
@@ -1,233 +1,263 @@
-from flask import Blueprint, request, jsonify
-from ...odoo_connector import OdooConnector
-from datetime import datetime
-
-def format_mxn(value):
-    return f"${value:,.2f}"
+from flask import Blueprint, current_app, request, jsonify
+from ...http_cache import summary_response
+from ...formatting import RESPONSE_FORMATS, currency, money, percent
+from ...export import export_response
+from ...drilldown import build_breakdown, top_response
+from ...resilience import OdooUnavailable
+from ...kpi import BREAKDOWNS, GRANULARITIES, Metric, evaluate, evaluate_ranges, parse_ranges, previous_period
+from ...series import build_series
+from functools import partial
 
 ventas_bp = Blueprint('ventas', __name__)
 
+# === KPIs de ventas ===
+VENTAS_METRICS = [
+    # Ventas Confirmadas (sale.order)
+    Metric("ventas.confirmadas", 'sale.order', 'date_order',
+           [['state', '=', 'sale']], 'amount_total', datetime_field=True),
+    # Facturas (account.move)
+    Metric("ventas.facturas_posteadas", 'account.move', 'invoice_date',
+           [['move_type', '=', 'out_invoice'], ['state', '=', 'posted']], 'amount_total'),
+    Metric("ventas.facturas_pendientes", 'account.move', 'invoice_date',
+           [['move_type', '=', 'out_invoice'], ['state', '=', 'draft']]),
+    # Cobros realizados (account.payment)
+    Metric("ventas.cobros", 'account.payment', 'date',
+           [['payment_type', '=', 'inbound'], ['state', '=', 'posted']], 'amount'),
+]
+
+# Series de /serie: nombre en la respuesta -> métrica
+VENTAS_SERIES = {
+    "ventas": "ventas.confirmadas",
+    "facturacion": "ventas.facturas_posteadas",
+    "cobros": "ventas.cobros"
+}
+
+# Drill-down de /top: campo de agrupación -> métrica que se reparte entre sus valores
+VENTAS_TOP = {
+    "partner_id": VENTAS_METRICS[0],
+    # Los productos están en las líneas; fecha y estado se toman del pedido
+    "product_id": Metric("ventas.lineas", 'sale.order.line', 'order_id.date_order',
+                         [['order_id.state', '=', 'sale']], 'price_subtotal', datetime_field=True),
+}
+
+def build_ventas_summary(start_date, end_date, raw=False):
+    # Parseo de fechas
+    prev_start, prev_end = previous_period(start_date, end_date)
+
+    # Periodo actual y anterior en el mínimo número de read_group
+    values = evaluate(VENTAS_METRICS, [(start_date, end_date), (prev_start, prev_end)])
+    return ventas_payload(values, raw)
+
+def ventas_payload(values, raw=False, currency_code=None):
+    # values: {métrica: [periodo actual, periodo anterior]}
+
+    # === Ventas ===
+    (total_confirmed_sales, orders_count), (previous_confirmed_sales, _) = values["ventas.confirmadas"]
+
+    if previous_confirmed_sales > 0:
+        trend_ventas = ((total_confirmed_sales - previous_confirmed_sales) / previous_confirmed_sales) * 100
+    else:
+        trend_ventas = 100.0 if total_confirmed_sales > 0 else 0.0
+
+    is_positive_ventas = trend_ventas >= 0
+    trend_str_ventas = percent(trend_ventas, raw)
+
+    if trend_ventas > 0:
+        mensaje_ventas = "Ventas incrementaron"
+    elif trend_ventas < 0:
+        mensaje_ventas = "Ventas disminuyeron"
+    else:
+        mensaje_ventas = "Ventas se mantuvieron"
+
+    # === Facturación ===
+    (total_invoiced_sales, invoices_posted_count), (previous_total, _) = values["ventas.facturas_posteadas"]
+    invoices_pending_count = values["ventas.facturas_pendientes"][0].count
+
+    if previous_total > 0:
+        trend_facturacion = ((total_invoiced_sales - previous_total) / previous_total) * 100
+    else:
+        trend_facturacion = 100.0 if total_invoiced_sales > 0 else 0.0
+
+    is_positive_facturacion = trend_facturacion >= 0
+    trend_str_facturacion = percent(trend_facturacion, raw)
+
+    if trend_facturacion > 0:
+        mensaje_facturacion = "Facturación incrementó"
+    elif trend_facturacion < 0:
+        mensaje_facturacion = "Facturación disminuyó"
+    else:
+        mensaje_facturacion = "Facturación se mantuvo"
+
+    # === Cobros ===
+    (total_collected, payments_count), (previous_collected, _) = values["ventas.cobros"]
+
+    if previous_collected > 0:
+        trend_cobros = ((total_collected - previous_collected) / previous_collected) * 100
+    else:
+        trend_cobros = 100.0 if total_collected > 0 else 0.0
+
+    is_positive_cobros = trend_cobros >= 0
+    trend_str_cobros = percent(trend_cobros, raw)
+
+    if trend_cobros > 0:
+        mensaje_cobros = "Cobros incrementaron"
+    elif trend_cobros < 0:
+        mensaje_cobros = "Cobros disminuyeron"
+    else:
+        mensaje_cobros = "Cobros se mantuvieron"
+
+    # === Respuesta final organizada ===
+    result = {
+        "ventas_confirmadas": {
+            "ingresos_totales": money(total_confirmed_sales, raw, currency_code),
+            "cantidad_ordenes": orders_count
+        },
+        "facturacion": {
+            "total_facturado": money(total_invoiced_sales, raw, currency_code),
+            "facturas_realizadas": invoices_posted_count,
+            "facturas_pendientes": invoices_pending_count
+        },
+        "cobros_realizados": {
+            "total_cobrado": money(total_collected, raw, currency_code),
+            "pagos_recibidos": payments_count
+        },
+        "analisis_periodo": {
+            "ventas": {
+                "comparativa": trend_str_ventas,
+                "esPositivo": is_positive_ventas,
+                "mensaje": mensaje_ventas + " respecto al periodo anterior"
+            },
+            "facturacion": {
+                "comparativa": trend_str_facturacion,
+                "esPositivo": is_positive_facturacion,
+                "mensaje": mensaje_facturacion + " respecto al periodo anterior"
+            },
+            "cobros": {
+                "comparativa": trend_str_cobros,
+                "esPositivo": is_positive_cobros,
+                "mensaje": mensaje_cobros + " respecto al periodo anterior"
+            }
+        },
+        **currency(raw, currency_code)
+    }
+
+    return result
+
 @ventas_bp.route("/", methods=["GET"])
 def ventas_summary():
     start_date = request.args.get("start")
     end_date = request.args.get("end")
 
+    response_format = request.args.get("format", "display")
+    group_by = request.args.get("group_by")
+
     if not start_date or not end_date:
         return jsonify({"error": "Parámetros 'start' y 'end' requeridos en formato YYYY-MM-DD"}), 400
+    if response_format not in RESPONSE_FORMATS:
+        return jsonify({"error": "Parámetro 'format' debe ser display o raw"}), 400
+    if group_by is not None and group_by not in BREAKDOWNS:
+        return jsonify({"error": "Parámetro 'group_by' debe ser company o currency"}), 400
 
     try:
-        connector = OdooConnector()
-
-        # Parseo de fechas
-        start = datetime.strptime(start_date, "%Y-%m-%d")
-        end = datetime.strptime(end_date, "%Y-%m-%d")
-        delta = end - start
-
-        # === Ventas Confirmadas (sale.order) ===
-        domain_orders = [
-            ['date_order', '>=', start_date],
-            ['date_order', '<=', end_date],
-            ['state', '=', 'sale']
-        ]
-
-        orders_total = connector.models.execute_kw(
-            connector.db, connector.uid, connector.password,
-            'sale.order', 'read_group',
-            [domain_orders, ['amount_total'], []]
-        )
-        orders_count = connector.models.execute_kw(
-            connector.db, connector.uid, connector.password,
-            'sale.order', 'search_count',
-            [domain_orders]
-        )
-
-        total_confirmed_sales = orders_total[0]['amount_total'] if orders_total else 0.0
-
-        # === Ventas periodo anterior (sale.order) ===
-        prev_start = (start - delta).strftime("%Y-%m-%d")
-        prev_end = (end - delta).strftime("%Y-%m-%d")
-
-        domain_orders_prev = [
-            ['date_order', '>=', prev_start],
-            ['date_order', '<=', prev_end],
-            ['state', '=', 'sale']
-        ]
-
-        orders_prev_total = connector.models.execute_kw(
-            connector.db, connector.uid, connector.password,
-            'sale.order', 'read_group',
-            [domain_orders_prev, ['amount_total'], []]
-        )
-
-        previous_confirmed_sales = orders_prev_total[0]['amount_total'] if orders_prev_total else 0.0
-
-        if previous_confirmed_sales > 0:
-            trend_ventas = ((total_confirmed_sales - previous_confirmed_sales) / previous_confirmed_sales) * 100
-        else:
-            trend_ventas = 100.0 if total_confirmed_sales > 0 else 0.0
-
-        is_positive_ventas = trend_ventas >= 0
-        trend_str_ventas = f"{trend_ventas:+.1f}%"
-
-        if trend_ventas > 0:
-            mensaje_ventas = "Ventas incrementaron"
-        elif trend_ventas < 0:
-            mensaje_ventas = "Ventas disminuyeron"
-        else:
-            mensaje_ventas = "Ventas se mantuvieron"
-
-        # === Facturas (account.move) ===
-        domain_invoices_posted = [
-            ['invoice_date', '>=', start_date],
-            ['invoice_date', '<=', end_date],
-            ['move_type', '=', 'out_invoice'],
-            ['state', '=', 'posted']
-        ]
-
-        domain_invoices_pending = [
-            ['invoice_date', '>=', start_date],
-            ['invoice_date', '<=', end_date],
-            ['move_type', '=', 'out_invoice'],
-            ['state', '=', 'draft']
-        ]
-
-        invoices_posted_total = connector.models.execute_kw(
-            connector.db, connector.uid, connector.password,
-            'account.move', 'read_group',
-            [domain_invoices_posted, ['amount_total'], []]
-        )
-
-        invoices_posted_count = connector.models.execute_kw(
-            connector.db, connector.uid, connector.password,
-            'account.move', 'search_count',
-            [domain_invoices_posted]
-        )
-
-        invoices_pending_count = connector.models.execute_kw(
-            connector.db, connector.uid, connector.password,
-            'account.move', 'search_count',
-            [domain_invoices_pending]
-        )
-
-        total_invoiced_sales = invoices_posted_total[0]['amount_total'] if invoices_posted_total else 0.0
-
-        # === Facturación periodo anterior (account.move) ===
-        domain_prev = [
-            ["invoice_date", ">=", prev_start],
-            ["invoice_date", "<=", prev_end],
-            ["move_type", "=", "out_invoice"],
-            ["state", "=", "posted"]
-        ]
-        previous = connector.models.execute_kw(
-            connector.db, connector.uid, connector.password,
-            "account.move", "read_group",
-            [domain_prev, ["amount_total"], []]
-        )
-        previous_total = previous[0]["amount_total"] if previous else 0.0
-
-        if previous_total > 0:
-            trend_facturacion = ((total_invoiced_sales - previous_total) / previous_total) * 100
-        else:
-            trend_facturacion = 100.0 if total_invoiced_sales > 0 else 0.0
-
-        is_positive_facturacion = trend_facturacion >= 0
-        trend_str_facturacion = f"{trend_facturacion:+.1f}%"
-
-        if trend_facturacion > 0:
-            mensaje_facturacion = "Facturación incrementó"
-        elif trend_facturacion < 0:
-            mensaje_facturacion = "Facturación disminuyó"
-        else:
-            mensaje_facturacion = "Facturación se mantuvo"
-
-        # === Cobros realizados (account.payment) ===
-        domain_payments = [
-            ['date', '>=', start_date],
-            ['date', '<=', end_date],
-            ['payment_type', '=', 'inbound'],
-            ['state', '=', 'posted']
-        ]
-
-        payments_total = connector.models.execute_kw(
-            connector.db, connector.uid, connector.password,
-            'account.payment', 'read_group',
-            [domain_payments, ['amount'], []]
-        )
-
-        payments_count = connector.models.execute_kw(
-            connector.db, connector.uid, connector.password,
-            'account.payment', 'search_count',
-            [domain_payments]
-        )
-
-        total_collected = payments_total[0]['amount'] if payments_total else 0.0
-
-        # === Cobros realizados periodo anterior ===
-        domain_payments_prev = [
-            ['date', '>=', prev_start],
-            ['date', '<=', prev_end],
-            ['payment_type', '=', 'inbound'],
-            ['state', '=', 'posted']
-        ]
-
-        payments_prev_total = connector.models.execute_kw(
-            connector.db, connector.uid, connector.password,
-            'account.payment', 'read_group',
-            [domain_payments_prev, ['amount'], []]
-        )
-
-        previous_collected = payments_prev_total[0]['amount'] if payments_prev_total else 0.0
-
-        if previous_collected > 0:
-            trend_cobros = ((total_collected - previous_collected) / previous_collected) * 100
-        else:
-            trend_cobros = 100.0 if total_collected > 0 else 0.0
-
-        is_positive_cobros = trend_cobros >= 0
-        trend_str_cobros = f"{trend_cobros:+.1f}%"
-
-        if trend_cobros > 0:
-            mensaje_cobros = "Cobros incrementaron"
-        elif trend_cobros < 0:
-            mensaje_cobros = "Cobros disminuyeron"
-        else:
-            mensaje_cobros = "Cobros se mantuvieron"
-
-        # === Respuesta final organizada ===
-        result = {
-            "ventas_confirmadas": {
-                "ingresos_totales": format_mxn(total_confirmed_sales),
-                "cantidad_ordenes": orders_count
-            },
-            "facturacion": {
-                "total_facturado": format_mxn(total_invoiced_sales),
-                "facturas_realizadas": invoices_posted_count,
-                "facturas_pendientes": invoices_pending_count
-            },
-            "cobros_realizados": {
-                "total_cobrado": format_mxn(total_collected),
-                "pagos_recibidos": payments_count
-            },
-            "analisis_periodo": {
-                "ventas": {
-                    "comparativa": trend_str_ventas,
-                    "esPositivo": is_positive_ventas,
-                    "mensaje": mensaje_ventas + " respecto al periodo anterior"
-                },
-                "facturacion": {
-                    "comparativa": trend_str_facturacion,
-                    "esPositivo": is_positive_facturacion,
-                    "mensaje": mensaje_facturacion + " respecto al periodo anterior"
-                },
-                "cobros": {
-                    "comparativa": trend_str_cobros,
-                    "esPositivo": is_positive_cobros,
-                    "mensaje": mensaje_cobros + " respecto al periodo anterior"
-                }
-            }
-        }
+        if group_by:
+            # Desglose por compañía o moneda en los mismos read_group
+            build = partial(build_breakdown, VENTAS_METRICS, ventas_payload, group_by)
+            return summary_response(f"ventas.{group_by}", build, start_date, end_date,
+                                    raw=response_format == "raw")
+        return summary_response("ventas", build_ventas_summary, start_date, end_date,
+                                raw=response_format == "raw")
+
+    except OdooUnavailable as e:
+        return jsonify({"error": str(e)}), 503, {"Retry-After": str(e.retry_after)}
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@ventas_bp.route("/serie", methods=["GET"])
+def ventas_serie():
+    start_date = request.args.get("start")
+    end_date = request.args.get("end")
+    granularity = request.args.get("granularity", "month")
+
+    if not start_date or not end_date:
+        return jsonify({"error": "Parámetros 'start' y 'end' requeridos en formato YYYY-MM-DD"}), 400
+    if granularity not in GRANULARITIES:
+        return jsonify({"error": "Parámetro 'granularity' debe ser day, week o month"}), 400
+
+    try:
+        build = partial(build_series, VENTAS_METRICS, VENTAS_SERIES, granularity)
+        return summary_response(f"ventas.serie.{granularity}", build, start_date, end_date)
+
+    except OdooUnavailable as e:
+        return jsonify({"error": str(e)}), 503, {"Retry-After": str(e.retry_after)}
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@ventas_bp.route("/rangos", methods=["POST"])
+def ventas_rangos():
+    # Cuerpo: {"ranges": [{"start": "YYYY-MM-DD", "end": "YYYY-MM-DD"}, ...]}
+    payload = request.get_json(silent=True) or {}
+    try:
+        ranges = parse_ranges(payload.get("ranges"), current_app.config['BATCH_MAX_RANGES'])
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        results = evaluate_ranges(VENTAS_METRICS, ranges)
+        return jsonify({
+            "resultados": [
+                {"start": start_date, "end": end_date, "resultado": ventas_payload(values)}
+                for (start_date, end_date), values in zip(ranges, results)
+            ]
+        })
+
+    except OdooUnavailable as e:
+        return jsonify({"error": str(e)}), 503, {"Retry-After": str(e.retry_after)}
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@ventas_bp.route("/export", methods=["GET"])
+def ventas_export():
+    # ?metric=ventas.confirmadas&start=...&end=...&format=ndjson|csv&fields=campo1,campo2
+    start_date = request.args.get("start")
+    end_date = request.args.get("end")
+
+    if not start_date or not end_date:
+        return jsonify({"error": "Parámetros 'start' y 'end' requeridos en formato YYYY-MM-DD"}), 400
+
+    try:
+        return export_response(VENTAS_METRICS, request.args.get("metric"), start_date, end_date,
+                               request.args.get("format", "ndjson"), request.args.get("fields"))
+
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    except OdooUnavailable as e:
+        return jsonify({"error": str(e)}), 503, {"Retry-After": str(e.retry_after)}
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@ventas_bp.route("/top", methods=["GET"])
+def ventas_top():
+    # ?by=partner_id|product_id&start=...&end=...&limit=10&cursor=<siguiente>
+    start_date = request.args.get("start")
+    end_date = request.args.get("end")
+
+    if not start_date or not end_date:
+        return jsonify({"error": "Parámetros 'start' y 'end' requeridos en formato YYYY-MM-DD"}), 400
+
+    try:
+        return top_response("ventas", VENTAS_TOP, request.args.get("by", "partner_id"), start_date, end_date,
+                            request.args.get("limit"), request.args.get("cursor"))
+
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
-        return jsonify(result)
+    except OdooUnavailable as e:
+        return jsonify({"error": str(e)}), 503, {"Retry-After": str(e.retry_after)}
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
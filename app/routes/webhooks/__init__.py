@@ -0,0 +1,3 @@
+from .views import webhooks_bp
+
+__all__ = ["webhooks_bp"]
@@ -0,0 +1,35 @@
+import hmac
+
+from flask import Blueprint, current_app, request, jsonify
+from ...changes import get_change_feed, parse_notification
+from ...resilience import OdooUnavailable
+from ...tenants import current_tenant
+
+webhooks_bp = Blueprint('webhooks', __name__)
+
+@webhooks_bp.route("/odoo", methods=["POST"])
+def odoo_webhook():
+    # Cuerpo: {"model": "sale.order", "dates": ["YYYY-MM-DD"], "old_dates": [...], "ids": [...], "records": [{...}]}
+    # o el de la acción "Enviar notificación webhook" de Odoo. Token sólo en X-Webhook-Token:
+    # en la URL acabaría en el log de acceso
+    feed = get_change_feed()
+    if feed is None:
+        return jsonify({"error": "Webhook no configurado (WEBHOOK_TOKEN)"}), 404
+
+    token = request.headers.get("X-Webhook-Token") or ""
+    if not hmac.compare_digest(token.encode(), current_app.config['WEBHOOK_TOKEN'].encode()):
+        return jsonify({"error": "Token no válido"}), 403
+
+    try:
+        model, days, ids, old_days = parse_notification(request.get_json(silent=True))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        return jsonify(feed.notify(current_tenant(), model, days, ids, old_days))
+
+    except OdooUnavailable as e:
+        return jsonify({"error": str(e)}), 503, {"Retry-After": str(e.retry_after)}
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
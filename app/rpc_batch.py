@@ -0,0 +1,90 @@
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
+from contextvars import copy_context
+
+from flask import current_app
+
+from .odoo_connector import get_pool
+
+
+class RpcDeadlineExceeded(Exception):
+    pass
+
+
+class RpcCall:
+    def __init__(self, model, method, args, kwargs=None):
+        self.model = model
+        self.method = method
+        self.args = args
+        self.kwargs = kwargs
+        self.future = None
+
+    def result(self):
+        return self.future.result()
+
+    def __call__(self, pool):
+        with pool.connection() as connector:
+            return connector.execute_kw(self.model, self.method, self.args, self.kwargs)
+
+
+class RpcBatch:
+    """Agrupa llamadas execute_kw independientes y las ejecuta en paralelo.
+
+    Las llamadas se registran con submit() y se lanzan todas juntas con run().
+    Si una falla o se agota el plazo, las pendientes se cancelan y se propaga
+    el error.
+    """
+
+    def __init__(self, executor, pool, deadline=None):
+        self.executor = executor
+        self.pool = pool
+        self.deadline = deadline
+        self.calls = []
+
+    def submit(self, model, method, args, kwargs=None):
+        call = RpcCall(model, method, args, kwargs)
+        self.calls.append(call)
+        return call
+
+    def run(self):
+        pending = [call for call in self.calls if call.future is None]
+        for call in pending:
+            # Cada tarea hereda el contexto de la petición (tiempos de Server-Timing)
+            call.future = self.executor.submit(copy_context().run, call, self.pool)
+        futures = [call.future for call in pending]
+
+        done, not_done = wait(futures, timeout=self.deadline, return_when=FIRST_EXCEPTION)
+        failed = next((f for f in done if f.exception() is not None), None)
+        if failed is not None:
+            self._cancel(not_done)
+            raise failed.exception()
+        if not_done:
+            self._cancel(not_done)
+            raise RpcDeadlineExceeded(f"Odoo no respondió en {self.deadline:g} s")
+        return [call.result() for call in self.calls]
+
+    @staticmethod
+    def _cancel(futures):
+        # Las que ya están en curso terminan en segundo plano y devuelven su conector
+        for future in futures:
+            future.cancel()
+
+
+def init_executor(app):
+    workers = app.config.get('ODOO_RPC_WORKERS') or app.config.get('ODOO_POOL_SIZE', 8)
+    app.extensions["odoo_executor"] = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="odoo-rpc")
+
+
+def get_executor():
+    # Cada tenant tiene sus hilos: una base lenta no ocupa los de las demás
+    tenants = current_app.extensions.get("tenants")
+    if tenants is None:
+        return current_app.extensions["odoo_executor"]
+    return tenants.current().executor
+
+
+def new_batch():
+    return RpcBatch(
+        get_executor(),
+        get_pool(),
+        deadline=current_app.config.get('ODOO_REQUEST_DEADLINE'),
+    )
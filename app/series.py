@@ -0,0 +1,54 @@
+from datetime import date, timedelta
+
+from .kpi import evaluate_series, next_bucket
+
+
+def trends(values):
+    """Variación porcentual de cada elemento respecto al anterior, de una pasada."""
+    return [
+        round((current - previous) / previous * 100, 1) if previous > 0 else (100.0 if current > 0 else 0.0)
+        for previous, current in zip(values, values[1:])
+    ]
+
+
+def bucket_ranges(buckets, granularity, start_date, end_date):
+    """Días de cada cubo dentro de [start, end]; los de los bordes pueden quedar a medias."""
+    ranges = []
+    for bucket in buckets:
+        last = (next_bucket(date.fromisoformat(bucket), granularity) - timedelta(days=1)).isoformat()
+        first, last_in_range = max(bucket, start_date), min(last, end_date)
+        ranges.append({"inicio": first, "fin": last_in_range, "parcial": (first, last_in_range) != (bucket, last)})
+    return ranges
+
+
+def build_series(metrics, mapping, granularity, start_date, end_date):
+    """Payload de /serie: arreglos alineados de totales, conteos y tendencias.
+
+    `mapping` asocia el nombre de cada serie en la respuesta con la clave de
+    la métrica que la alimenta. Los cubos de los bordes que el rango corta
+    se marcan en `rangos` como parciales y no llevan tendencia (null), ni
+    tampoco el que se compara con uno parcial.
+    """
+    buckets, values = evaluate_series(metrics, start_date, end_date, granularity)
+    by_key = {m.key: m for m in metrics}
+    ranges = bucket_ranges(buckets[1:], granularity, start_date, end_date)
+    partial = [r["parcial"] for r in ranges]
+    comparable = [not (partial[i] or (i > 0 and partial[i - 1])) for i in range(len(ranges))]
+
+    series = {}
+    for name, key in mapping.items():
+        totals = [round(v.total, 2) for v in values[key]]
+        counts = [v.count for v in values[key]]
+        base = totals if by_key[key].measure else counts
+        series[name] = {
+            "totales": totals[1:],
+            "conteos": counts[1:],
+            "tendencias": [trend if ok else None for trend, ok in zip(trends(base), comparable)],
+        }
+
+    return {
+        "granularidad": granularity,
+        "periodos": buckets[1:],
+        "rangos": ranges,
+        "series": series
+    }
@@ -0,0 +1,44 @@
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+
+# === Servicio con varios workers (gunicorn con preload) ===
+
+def warm_up(app):
+    """En el proceso maestro, antes del fork: autentica cada base una vez.
+
+    Con la caché compartida el uid queda también en el almacén común. Las
+    conexiones abiertas se descartan para que ningún worker herede un socket.
+    """
+    for tenant in app.extensions["tenants"]:
+        try:
+            with tenant.pool.connection() as conn:
+                conn.uid
+        except Exception as e:
+            # El worker se autenticará en su primera petición
+            logger.warning("No se pudo autenticar con Odoo (%s) al arrancar: %s", tenant.name, e)
+        finally:
+            tenant.pool.close()
+
+
+def after_fork(app):
+    """En cada worker recién creado: recursos propios del proceso e hilos en segundo plano."""
+    for tenant in app.extensions["tenants"]:
+        tenant.pool.after_fork()
+
+    store = app.extensions.get("rollup_store")
+    if store is not None:
+        store.reopen()
+        store.start(app.config.get('ROLLUP_SYNC_INTERVAL', 60), app.config.get('ROLLUP_SYNC_DEBOUNCE', 1))
+
+    scheduler = app.extensions.get("precompute")
+    if scheduler is not None:
+        scheduler.start()
+
+    feed = app.extensions.get("change_feed")
+    if feed is not None:
+        feed.start()
+
+    logger.info("Worker %s listo", os.getpid())
@@ -0,0 +1,161 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from flask import current_app
+
+logger = logging.getLogger(__name__)
+
+
+class SharedCache:
+    """Clave/valor JSON en SQLite (WAL) compartido por los workers de una máquina.
+
+    Segundo nivel de la caché de respuestas y almacén del uid de Odoo: lo
+    que calcula un worker lo leen los demás sin volver a Odoo. Los errores
+    de SQLite se registran y se tratan como fallo de caché.
+    """
+
+    # Segundos que se conservan los avisos entre procesos (publish/events)
+    EVENTS_TTL = 3600
+
+    def __init__(self, path, max_entries=5000, prune_every=100):
+        self.path = path
+        self.max_entries = max_entries
+        self.prune_every = prune_every
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.errors = 0
+        self._local = threading.local()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        db = self._db()
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                   "created REAL NOT NULL, expires REAL NOT NULL)")
+        db.execute("CREATE TABLE IF NOT EXISTS events (id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                   "created REAL NOT NULL, pid INTEGER NOT NULL, message TEXT NOT NULL)")
+
+    def _db(self):
+        # Una conexión por hilo y por proceso: una conexión SQLite no debe cruzar un fork
+        db = getattr(self._local, "db", None)
+        if db is None or self._local.pid != os.getpid():
+            db = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            self._local.db, self._local.pid = db, os.getpid()
+        return db
+
+    @staticmethod
+    def _key(key):
+        return json.dumps(key, separators=(",", ":"))
+
+    def get(self, key):
+        """(valor, creado, expira) en segundos epoch, o None."""
+        try:
+            row = self._db().execute("SELECT value, created, expires FROM entries WHERE key = ?",
+                                     (self._key(key),)).fetchone()
+        except sqlite3.Error as e:
+            self._failed("leer", e)
+            return None
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(row[0]), row[1], row[2]
+
+    def set(self, key, value, ttl, keep=0):
+        """Guarda `value` durante `ttl` segundos; la fila se conserva `keep` segundos más."""
+        now = time.time()
+        try:
+            db = self._db()
+            db.execute("INSERT OR REPLACE INTO entries (key, value, created, expires) VALUES (?, ?, ?, ?)",
+                       (self._key(key), json.dumps(value), now, now + ttl))
+            self.writes += 1
+            if self.writes % self.prune_every == 0:
+                self._prune(db, now, keep)
+        except sqlite3.Error as e:
+            self._failed("escribir", e)
+
+    def _prune(self, db, now, keep):
+        db.execute("DELETE FROM entries WHERE expires + ? < ?", (keep, now))
+        db.execute("DELETE FROM entries WHERE key IN (SELECT key FROM entries ORDER BY created DESC LIMIT -1 OFFSET ?)",
+                   (self.max_entries,))
+
+    def delete(self, key):
+        try:
+            self._db().execute("DELETE FROM entries WHERE key = ?", (self._key(key),))
+        except sqlite3.Error as e:
+            self._failed("borrar", e)
+
+    def invalidate(self, predicate):
+        """Borra las entradas cuya clave (ya decodificada) cumple `predicate`."""
+        try:
+            db = self._db()
+            keys = [raw for (raw,) in db.execute("SELECT key FROM entries") if predicate(json.loads(raw))]
+            db.executemany("DELETE FROM entries WHERE key = ?", [(raw,) for raw in keys])
+            return len(keys)
+        except sqlite3.Error as e:
+            self._failed("invalidar", e)
+            return 0
+
+    # === Avisos entre procesos ===
+
+    def publish(self, message):
+        """Deja `message` (JSON) para que lo recojan los demás procesos con events()."""
+        now = time.time()
+        try:
+            db = self._db()
+            db.execute("INSERT INTO events (created, pid, message) VALUES (?, ?, ?)",
+                       (now, os.getpid(), json.dumps(message)))
+            db.execute("DELETE FROM events WHERE created < ?", (now - self.EVENTS_TTL,))
+        except sqlite3.Error as e:
+            self._failed("publicar", e)
+
+    def last_event_id(self):
+        try:
+            return self._db().execute("SELECT COALESCE(MAX(id), 0) FROM events").fetchone()[0]
+        except sqlite3.Error as e:
+            self._failed("leer", e)
+            return 0
+
+    def events(self, after_id):
+        """(último id, [mensajes de otros procesos publicados después de `after_id`])."""
+        try:
+            rows = self._db().execute("SELECT id, pid, message FROM events WHERE id > ? ORDER BY id",
+                                      (after_id,)).fetchall()
+        except sqlite3.Error as e:
+            self._failed("leer", e)
+            return after_id, []
+        pid = os.getpid()
+        last = rows[-1][0] if rows else after_id
+        return last, [json.loads(message) for _, sender, message in rows if sender != pid]
+
+    def _failed(self, action, error):
+        self.errors += 1
+        logger.warning("No se pudo %s en la caché compartida %s: %s", action, self.path, error)
+
+    def stats(self):
+        try:
+            entries = self._db().execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        except sqlite3.Error:
+            entries = None
+        return {"entries": entries, "hits": self.hits, "misses": self.misses,
+                "writes": self.writes, "errors": self.errors}
+
+
+def init_shared_cache(app):
+    path = app.config.get('SHARED_CACHE_PATH')
+    if not path:
+        return
+    shared = SharedCache(path, max_entries=app.config.get('SHARED_CACHE_MAX_ENTRIES', 5000))
+    app.extensions["shared_cache"] = shared
+    # El uid de cada base se comparte: un solo login aunque haya varios workers
+    for tenant in app.extensions["tenants"]:
+        tenant.pool.session.store = shared
+
+
+def get_shared_cache():
+    return current_app.extensions.get("shared_cache")
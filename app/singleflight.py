@@ -0,0 +1,235 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from flask import current_app
+
+from .tenants import tenant_name
+
+try:
+    import fcntl
+except ImportError:  # Windows: sólo agrupación dentro del proceso
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+class CoalesceTimeout(Exception):
+    pass
+
+
+class Flight:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+    def wait(self, timeout):
+        if not self.done.wait(timeout):
+            raise CoalesceTimeout("Tiempo agotado esperando un cálculo idéntico en curso")
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+class SharedFlight:
+    """Coordinación entre procesos: flocks por clave y resultados en SQLite.
+
+    El proceso que obtiene el lock calcula y publica el resultado; los que
+    esperaban el lock lo leen en lugar de repetir el cálculo. Si el proceso
+    que calculaba muere, el sistema operativo libera el lock. Las claves se
+    reparten entre `stripes` ficheros de lock fijos: dos claves que caen en
+    el mismo sólo se esperan una a otra.
+    """
+
+    def __init__(self, directory, timeout=35, ttl=60, poll_interval=0.05, stripes=64):
+        self.directory = directory
+        self.stripes = stripes
+        self.timeout = timeout
+        self.ttl = ttl
+        self.poll_interval = poll_interval
+        os.makedirs(directory, exist_ok=True)
+        self.db_path = os.path.join(directory, "results.sqlite3")
+        with self._connect() as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL)")
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=5)
+
+    @staticmethod
+    def _key(key):
+        return json.dumps(key, separators=(",", ":"))
+
+    def _lock_path(self, key):
+        stripe = int.from_bytes(hashlib.sha1(key.encode()).digest()[:4], "big") % self.stripes
+        return os.path.join(self.directory, f"stripe-{stripe:02d}.lock")
+
+    def _try_lock(self, key):
+        fd = os.open(self._lock_path(key), os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return fd
+        except BlockingIOError:
+            os.close(fd)
+            return None
+
+    @staticmethod
+    def _unlock(fd):
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        os.close(fd)
+
+    def _read(self, key, since):
+        # Sólo vale un resultado publicado después de que llegáramos
+        with self._connect() as db:
+            row = db.execute("SELECT value FROM results WHERE key = ? AND created >= ?", (key, since)).fetchone()
+        return json.loads(row[0]) if row else _MISSING
+
+    def _write(self, key, value):
+        now = time.time()
+        with self._connect() as db:
+            db.execute("INSERT OR REPLACE INTO results (key, value, created) VALUES (?, ?, ?)",
+                       (key, json.dumps(value), now))
+            db.execute("DELETE FROM results WHERE created < ?", (now - self.ttl,))
+
+    def do(self, key, compute):
+        key = self._key(key)
+        arrived = time.time()
+        deadline = time.monotonic() + self.timeout
+        fd = self._try_lock(key)
+        while fd is None:
+            if time.monotonic() > deadline:
+                raise CoalesceTimeout("Tiempo agotado esperando el cálculo de otro proceso")
+            time.sleep(self.poll_interval)
+            fd = self._try_lock(key)
+        try:
+            value = self._read(key, arrived)
+            if value is _MISSING:
+                value = compute()
+                self._write(key, value)
+            return value
+        finally:
+            self._unlock(fd)
+
+    async def do_async(self, key, compute):
+        key = self._key(key)
+        arrived = time.time()
+        deadline = time.monotonic() + self.timeout
+        fd = self._try_lock(key)
+        while fd is None:
+            if time.monotonic() > deadline:
+                raise CoalesceTimeout("Tiempo agotado esperando el cálculo de otro proceso")
+            await asyncio.sleep(self.poll_interval)
+            fd = self._try_lock(key)
+        try:
+            value = self._read(key, arrived)
+            if value is _MISSING:
+                value = await compute()
+                self._write(key, value)
+            return value
+        finally:
+            self._unlock(fd)
+
+
+class SingleFlight:
+    """Agrupa cálculos idénticos concurrentes en una sola ejecución.
+
+    La primera petición de una clave calcula; las que llegan mientras tanto
+    esperan y reciben el mismo resultado (o el mismo error). Con `shared`
+    la agrupación se extiende a los demás procesos. Las claves se separan
+    por `partition()` (el tenant en curso).
+    """
+
+    def __init__(self, shared=None, timeout=35, partition=None):
+        self.shared = shared
+        self.timeout = timeout
+        self.partition = partition
+        self._flights = {}
+        self._async_flights = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.followers = 0
+
+    def do(self, key, compute):
+        if self.partition is not None:
+            key = (self.partition(), key)
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = Flight()
+                self.leaders += 1
+            else:
+                self.followers += 1
+        if not leader:
+            return flight.wait(self.timeout)
+
+        try:
+            flight.result = self.shared.do(key, compute) if self.shared else compute()
+            return flight.result
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+    async def do_async(self, key, compute):
+        # compute es una función que devuelve una corrutina nueva en cada llamada
+        if self.partition is not None:
+            key = (self.partition(), key)
+        future = self._async_flights.get(key)
+        if future is not None:
+            self.followers += 1
+            return await asyncio.wait_for(asyncio.shield(future), self.timeout)
+
+        future = self._async_flights[key] = asyncio.get_running_loop().create_future()
+        self.leaders += 1
+        try:
+            result = await (self.shared.do_async(key, compute) if self.shared else compute())
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # evita el aviso si nadie más esperaba
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del self._async_flights[key]
+
+    def stats(self):
+        with self._lock:
+            in_flight = len(self._flights) + len(self._async_flights)
+        return {"leaders": self.leaders, "followers": self.followers, "in_flight": in_flight,
+                "shared": self.shared is not None}
+
+
+def init_single_flight(app):
+    if not app.config.get('COALESCE_ENABLED', True):
+        return
+    timeout = app.config.get('COALESCE_TIMEOUT', 35)
+    shared = None
+    directory = app.config.get('COALESCE_DIR')
+    if directory:
+        if fcntl is None:
+            logger.warning("COALESCE_DIR requiere fcntl; se agrupa sólo dentro de cada proceso")
+        else:
+            shared = SharedFlight(directory, timeout=timeout)
+    app.extensions["single_flight"] = SingleFlight(shared, timeout=timeout, partition=tenant_name)
+
+
+def get_single_flight():
+    return current_app.extensions.get("single_flight")
@@ -0,0 +1,220 @@
+import json
+import logging
+import queue
+import threading
+import time
+
+from flask import current_app
+
+from .cache import is_historical
+from .tenants import current_tenant, using_tenant
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+def diff(old, new):
+    """Cambios de `old` a `new` como dict anidado; las claves borradas valen None.
+
+    Las listas y los valores escalares se reemplazan completos. Devuelve {}
+    si no hay cambios.
+    """
+    changes = {}
+    for key, value in new.items():
+        previous = old.get(key, _MISSING)
+        if isinstance(value, dict) and isinstance(previous, dict):
+            nested = diff(previous, value)
+            if nested:
+                changes[key] = nested
+        elif previous is _MISSING or value != previous:
+            changes[key] = value
+    for key in old:
+        if key not in new:
+            changes[key] = None
+    return changes
+
+
+def format_event(event, data, event_id=None):
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data, ensure_ascii=False, separators=(',', ':'))}")
+    return "\n".join(lines) + "\n\n"
+
+
+class Subscriber:
+    def __init__(self, topic, queue_size):
+        self.topic = topic
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.resyncs = 0
+
+    def offer(self, event, snapshot):
+        """Encola `event`; si el cliente va atrasado, descarta lo pendiente y
+        deja sólo una instantánea completa para que se ponga al día."""
+        try:
+            self.queue.put_nowait(event)
+        except queue.Full:
+            self.resyncs += 1
+            while True:
+                try:
+                    self.queue.get_nowait()
+                except queue.Empty:
+                    break
+            try:
+                self.queue.put_nowait(snapshot())
+            except queue.Full:
+                pass
+
+
+class Topic:
+    def __init__(self, tenant, start_date, end_date):
+        self.tenant = tenant
+        self.start_date = start_date
+        self.end_date = end_date
+        self.subscribers = set()
+        self.payload = None
+        self.version = 0
+        self.error = None
+        # El primer suscriptor calcula; los que llegan a la vez esperan su resultado
+        self.init_lock = threading.Lock()
+
+    def snapshot_event(self):
+        return format_event("snapshot", self.payload, self.version)
+
+
+class StreamHub:
+    """Reparte los resúmenes del tablero a los clientes SSE suscritos a un rango.
+
+    Un solo hilo recalcula cada rango con suscriptores una vez por intervalo,
+    sin importar cuántos clientes lo sigan, y publica sólo lo que cambió.
+    Cada cliente tiene una cola acotada: si se llena, se sustituye por una
+    instantánea en lugar de acumular diferencias.
+    """
+
+    def __init__(self, app, build, interval=15, queue_size=16, max_subscribers=500):
+        self.app = app
+        self.build = build
+        self.interval = interval
+        self.queue_size = queue_size
+        self.max_subscribers = max_subscribers
+        self.ticks = 0
+        self.last_tick_duration = None
+        self._topics = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _compute(self, topic):
+        key = ("tablero", topic.start_date, topic.end_date)
+        with self.app.app_context(), using_tenant(topic.tenant):
+            flights = self.app.extensions.get("single_flight")
+            if flights is not None:
+                payload = flights.do(key, lambda: self.build(topic.start_date, topic.end_date))
+            else:
+                payload = self.build(topic.start_date, topic.end_date)
+            if self.app.config.get('CACHE_ENABLED', True):
+                # Las peticiones normales del mismo rango aprovechan el cálculo
+                cache = self.app.extensions["response_cache"]
+                cache.set(key, payload, cache.historical_ttl if is_historical(topic.end_date) else cache.ttl)
+        return payload
+
+    def subscribe(self, start_date, end_date):
+        tenant = current_tenant()
+        key = (tenant.name, start_date, end_date)
+        with self._lock:
+            if sum(len(t.subscribers) for t in self._topics.values()) >= self.max_subscribers:
+                return None
+            topic = self._topics.setdefault(key, Topic(tenant, start_date, end_date))
+            self._ensure_thread()
+
+        with topic.init_lock:
+            if topic.payload is None:
+                # Rango nuevo: se calcula ya en lugar de esperar al siguiente tick
+                self._refresh(topic)
+            with self._lock:
+                topic = self._topics.setdefault(key, topic)
+                subscriber = Subscriber(topic, self.queue_size)
+                topic.subscribers.add(subscriber)
+            if topic.payload is not None:
+                subscriber.offer(topic.snapshot_event(), topic.snapshot_event)
+            elif topic.error is not None:
+                subscriber.offer(format_event("error", {"error": topic.error}), lambda: None)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            topic = subscriber.topic
+            topic.subscribers.discard(subscriber)
+            if not topic.subscribers:
+                self._topics.pop((topic.tenant.name, topic.start_date, topic.end_date), None)
+
+    def _refresh(self, topic):
+        try:
+            payload = self._compute(topic)
+        except Exception as e:
+            logger.warning("Error actualizando el stream %s..%s: %s", topic.start_date, topic.end_date, e)
+            topic.error = str(e)
+            event = format_event("error", {"error": topic.error})
+            with self._lock:
+                subscribers = list(topic.subscribers)
+            for subscriber in subscribers:
+                subscriber.offer(event, topic.snapshot_event if topic.payload is not None else lambda: event)
+            return
+
+        topic.error = None
+        with self._lock:
+            if topic.payload is None:
+                topic.payload, topic.version = payload, 1
+                event = topic.snapshot_event()
+            else:
+                changes = diff(topic.payload, payload)
+                if not changes:
+                    return
+                topic.payload = payload
+                topic.version += 1
+                event = format_event("diff", changes, topic.version)
+            subscribers = list(topic.subscribers)
+        for subscriber in subscribers:
+            subscriber.offer(event, topic.snapshot_event)
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._loop, name="sse-hub", daemon=True)
+            self._thread.start()
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            started = time.monotonic()
+            with self._lock:
+                topics = list(self._topics.values())
+            for topic in topics:
+                self._refresh(topic)
+            self.ticks += 1
+            self.last_tick_duration = time.monotonic() - started
+
+    def stop(self):
+        self._stop.set()
+
+    def stats(self):
+        with self._lock:
+            topics = {f"{t.tenant.name}/{t.start_date}..{t.end_date}": {"subscribers": len(t.subscribers), "version": t.version}
+                      for t in self._topics.values()}
+            resyncs = sum(s.resyncs for t in self._topics.values() for s in t.subscribers)
+        return {"topics": topics, "ticks": self.ticks, "last_tick_duration": self.last_tick_duration,
+                "resyncs": resyncs}
+
+
+def init_stream(app, build):
+    app.extensions["stream_hub"] = StreamHub(
+        app,
+        build,
+        interval=app.config.get('STREAM_INTERVAL', 15),
+        queue_size=app.config.get('STREAM_QUEUE_SIZE', 16),
+        max_subscribers=app.config.get('STREAM_MAX_SUBSCRIBERS', 500),
+    )
+
+
+def get_hub():
+    return current_app.extensions["stream_hub"]
@@ -0,0 +1,239 @@
+import json
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from flask import current_app, g, jsonify, request
+
+from .odoo_connector import OdooConnectorPool
+from .resilience import build_guard
+
+# Base de ODOO_* de la configuración global; existe siempre
+DEFAULT_TENANT = "default"
+
+TENANT_NAME = re.compile(r"^[A-Za-z0-9_-]+$")
+
+# Claves admitidas por tenant en ODOO_TENANTS -> clave de configuración que sustituyen
+TENANT_SETTINGS = {
+    "url": "ODOO_URL",
+    "db": "ODOO_DB",
+    "user": "ODOO_USER",
+    "password": "ODOO_PASSWORD",
+    "transport": "ODOO_TRANSPORT",
+    "timeout": "ODOO_TIMEOUT",
+    "pool_size": "ODOO_POOL_SIZE",
+    "rpc_workers": "ODOO_RPC_WORKERS",
+    "max_requests": "TENANT_MAX_REQUESTS",
+}
+
+# Rutas de todo el proceso, que no dependen de la base de Odoo
+EXEMPT_BLUEPRINTS = {"metrics"}
+
+# Tenant de la petición en curso; lo heredan las tareas del RpcBatch y los
+# recálculos de la caché porque se lanzan con el contexto de la petición
+_current = ContextVar("odoo_tenant", default=None)
+
+
+class UnknownTenant(Exception):
+    pass
+
+
+class TenantQuotaExceeded(Exception):
+    pass
+
+
+class Tenant:
+    """Una base de Odoo con su pool (y su sesión), sus hilos de consulta,
+    su guard y su cuota de peticiones en curso.
+
+    Con pool, hilos y cuota propios, una base lenta o muy consultada agota
+    sus recursos sin bloquear a las demás.
+    """
+
+    def __init__(self, name, config, pool, executor, guard=None, max_requests=0):
+        self.name = name
+        self.config = config
+        self.pool = pool
+        self.executor = executor
+        self.guard = guard
+        self.max_requests = max_requests
+        self.in_flight = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    def enter(self):
+        with self._lock:
+            if self.max_requests and self.in_flight >= self.max_requests:
+                self.rejected += 1
+                raise TenantQuotaExceeded(f"Demasiadas peticiones en curso para '{self.name}'")
+            self.in_flight += 1
+
+    def leave(self):
+        with self._lock:
+            self.in_flight -= 1
+
+    def stats(self):
+        with self._lock:
+            stats = {"in_flight": self.in_flight, "max_requests": self.max_requests, "rejected": self.rejected}
+        stats["pool"] = self.pool.stats()
+        if self.guard is not None:
+            stats["guard"] = self.guard.stats()
+        return stats
+
+
+class TenantRegistry:
+    def __init__(self, tenants, default=DEFAULT_TENANT):
+        self.tenants = tenants
+        self.default = default
+
+    def __iter__(self):
+        return iter(list(self.tenants.values()))
+
+    def get(self, name):
+        tenant = self.tenants.get(name)
+        if tenant is None:
+            raise UnknownTenant(f"Tenant desconocido: {name}")
+        return tenant
+
+    def current(self):
+        # Fuera de una petición (hilos de fondo sin tenant) se usa la base global
+        tenant = _current.get()
+        return tenant if tenant is not None else self.tenants[DEFAULT_TENANT]
+
+    def stats(self):
+        return {name: tenant.stats() for name, tenant in self.tenants.items()}
+
+
+@contextmanager
+def using_tenant(tenant):
+    token = _current.set(tenant)
+    try:
+        yield tenant
+    finally:
+        _current.reset(token)
+
+
+def tenant_name():
+    """Nombre del tenant en curso; partición de la caché y del single-flight."""
+    tenant = _current.get()
+    return tenant.name if tenant is not None else DEFAULT_TENANT
+
+
+def split_tenant_path(path):
+    """('acme', '/ventas/') para '/t/acme/ventas/'; (None, path) si no lleva prefijo."""
+    if path.startswith("/t/"):
+        name, sep, rest = path[3:].partition("/")
+        if name and sep:
+            return name, "/" + rest
+    return None, path
+
+
+class TenantPathMiddleware:
+    """Traduce /t/<tenant>/ruta a /ruta con la cabecera del tenant, para
+    clientes (EventSource, enlaces de exportación) que no pueden enviarla."""
+
+    def __init__(self, wsgi_app, header):
+        self.wsgi_app = wsgi_app
+        self.environ_key = "HTTP_" + header.upper().replace("-", "_")
+
+    def __call__(self, environ, start_response):
+        name, path = split_tenant_path(environ.get("PATH_INFO", ""))
+        if name is not None:
+            environ["PATH_INFO"] = path
+            environ["SCRIPT_NAME"] = environ.get("SCRIPT_NAME", "") + f"/t/{name}"
+            environ[self.environ_key] = name
+        return self.wsgi_app(environ, start_response)
+
+
+def load_tenant_settings(config):
+    raw = config.get('ODOO_TENANTS') or ""
+    path = config.get('ODOO_TENANTS_FILE')
+    if path:
+        with open(path, encoding="utf-8") as f:
+            raw = f.read()
+    return json.loads(raw) if raw.strip() else {}
+
+
+def tenant_config(config, name, settings):
+    """Configuración del tenant: la global con sus claves propias encima."""
+    if not TENANT_NAME.match(name) or name == DEFAULT_TENANT:
+        raise ValueError(f"Nombre de tenant no válido: {name!r}")
+    unknown = set(settings) - set(TENANT_SETTINGS)
+    if unknown:
+        raise ValueError(f"Claves desconocidas para el tenant {name}: {', '.join(sorted(unknown))}")
+    result = dict(config)
+    result.update({TENANT_SETTINGS[key]: value for key, value in settings.items()})
+    return result
+
+
+def build_tenant(name, config):
+    pool = OdooConnectorPool(config)
+    guard = None
+    if config.get('ODOO_GUARD_ENABLED', True):
+        # Límite y circuit breaker propios: la caída de una base no corta las demás
+        guard = build_guard(config)
+        pool.set_guard(guard)
+    workers = config.get('ODOO_RPC_WORKERS') or config.get('ODOO_POOL_SIZE', 8)
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"odoo-rpc-{name}")
+    return Tenant(name, config, pool, executor, guard, max_requests=config.get('TENANT_MAX_REQUESTS', 0))
+
+
+# === Integración con Flask ===
+
+def _before_request():
+    if request.blueprint in EXEMPT_BLUEPRINTS:
+        return None
+    registry = current_app.extensions["tenants"]
+    header = current_app.config.get('TENANT_HEADER', 'X-Tenant')
+    name = request.headers.get(header) or registry.default
+    if not name:
+        return jsonify({"error": f"Falta el tenant: cabecera {header} o prefijo /t/<tenant>/"}), 400
+    try:
+        tenant = registry.get(name)
+        tenant.enter()
+    except UnknownTenant as e:
+        return jsonify({"error": str(e)}), 404
+    except TenantQuotaExceeded as e:
+        return jsonify({"error": str(e)}), 429, {"Retry-After": "1"}
+    g.tenant = tenant
+    g.tenant_token = _current.set(tenant)
+    return None
+
+
+def _teardown_request(exc):
+    token = g.pop("tenant_token", None)
+    if token is not None:
+        _current.reset(token)
+        g.pop("tenant").leave()
+
+
+def init_tenants(app):
+    config = app.config
+    tenants = {DEFAULT_TENANT: Tenant(
+        DEFAULT_TENANT,
+        config,
+        app.extensions["odoo_pool"],
+        app.extensions["odoo_executor"],
+        app.extensions.get("odoo_guard"),
+        max_requests=config.get('TENANT_MAX_REQUESTS', 0),
+    )}
+    for name, settings in load_tenant_settings(config).items():
+        tenants[name] = build_tenant(name, tenant_config(config, name, settings))
+
+    default = config.get('TENANT_DEFAULT', DEFAULT_TENANT)
+    if default and default not in tenants:
+        raise ValueError(f"TENANT_DEFAULT no es un tenant configurado: {default}")
+    app.extensions["tenants"] = TenantRegistry(tenants, default)
+    app.wsgi_app = TenantPathMiddleware(app.wsgi_app, config.get('TENANT_HEADER', 'X-Tenant'))
+    app.before_request(_before_request)
+    app.teardown_request(_teardown_request)
+
+
+def get_tenants():
+    return current_app.extensions["tenants"]
+
+
+def current_tenant():
+    return get_tenants().current()
@@ -0,0 +1,148 @@
+import http.client
+import itertools
+import json
+import xmlrpc.client
+from urllib.parse import urlsplit
+
+try:
+    import orjson
+except ImportError:  # orjson es opcional: sólo acelera JSON-RPC
+    orjson = None
+
+
+def json_dumps(value):
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value, separators=(",", ":")).encode()
+
+
+def json_loads(body):
+    if orjson is not None:
+        return orjson.loads(body)
+    return json.loads(body)
+
+
+class XmlRpcCodec:
+    name = "xmlrpc"
+    content_type = "text/xml"
+
+    def path(self, service):
+        return f"/xmlrpc/2/{service}"
+
+    def encode(self, service, method, args):
+        return xmlrpc.client.dumps(tuple(args), method, allow_none=True).encode()
+
+    def decode(self, body):
+        # loads() levanta xmlrpc.client.Fault si Odoo respondió con error
+        return xmlrpc.client.loads(body, use_builtin_types=True)[0][0]
+
+
+class JsonRpcCodec:
+    name = "jsonrpc"
+    content_type = "application/json"
+
+    def __init__(self):
+        self._ids = itertools.count(1)
+
+    def path(self, service):
+        return "/jsonrpc"
+
+    def encode(self, service, method, args):
+        return json_dumps({
+            "jsonrpc": "2.0",
+            "method": "call",
+            "params": {"service": service, "method": method, "args": list(args)},
+            "id": next(self._ids),
+        })
+
+    def decode(self, body):
+        response = json_loads(body)
+        error = response.get("error")
+        if error:
+            # Mismo tipo de error que XML-RPC para que el manejo sea común
+            data = error.get("data") or {}
+            raise xmlrpc.client.Fault(error.get("code", 0), f"{data.get('name', '')}: {data.get('message') or error.get('message')}")
+        return response.get("result")
+
+
+CODECS = {"xmlrpc": XmlRpcCodec, "jsonrpc": JsonRpcCodec}
+
+
+def make_codec(name):
+    try:
+        return CODECS[name]()
+    except KeyError:
+        raise ValueError(f"Transporte de Odoo desconocido: {name!r} (xmlrpc o jsonrpc)")
+
+
+class HttpTransport:
+    """Transporte síncrono con una conexión HTTP/1.1 keep-alive."""
+
+    # Errores que indican que el servidor cerró una conexión reutilizada
+    STALE_ERRORS = (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError)
+
+    def __init__(self, url, codec, timeout=None):
+        parts = urlsplit(url)
+        self.url = url
+        self.host = parts.netloc
+        self.https = parts.scheme == "https"
+        self.codec = codec
+        self.timeout = timeout
+        self._conn = None
+        self.bytes_sent = 0
+        self.bytes_received = 0
+
+    def _connection(self):
+        if self._conn is None:
+            cls = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+            self._conn = cls(self.host, timeout=self.timeout)
+        return self._conn
+
+    def call(self, service, method, *args):
+        body = self.codec.encode(service, method, args)
+        path = self.codec.path(service)
+        reused = self._conn is not None
+        try:
+            payload = self._post(path, body)
+        except self.STALE_ERRORS:
+            self.close()
+            if not reused:
+                raise
+            payload = self._post(path, body)
+        return self.codec.decode(payload)
+
+    def _post(self, path, body):
+        conn = self._connection()
+        try:
+            conn.request("POST", path, body, {"Content-Type": self.codec.content_type})
+            response = conn.getresponse()
+            payload = response.read()
+        except Exception:
+            self.close()
+            raise
+        self.bytes_sent += len(body)
+        self.bytes_received += len(payload)
+        if response.status != 200:
+            self.close()
+            raise xmlrpc.client.ProtocolError(f"{self.url}{path}", response.status, response.reason, dict(response.getheaders()))
+        if response.will_close:
+            self.close()
+        return payload
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+class ServiceProxy:
+    """Expone un servicio de Odoo ('common', 'object') como un ServerProxy."""
+
+    def __init__(self, transport, service):
+        self._transport = transport
+        self._service = service
+
+    def __getattr__(self, method):
+        def call(*args):
+            return self._transport.call(self._service, method, *args)
+        return call
@@ -0,0 +1,392 @@
+"""Servidor Odoo de pruebas para medir la API sin tocar un Odoo real.
+
+Implementa common.authenticate/version y object.execute_kw (search_count,
+search, search_read, read y read_group) sobre XML-RPC y JSON-RPC para los
+modelos que consultan los blueprints, con campos relacionados del pedido
+('order_id.date_order') en los dominios de las líneas. Los datos se generan de forma determinista y
+cada llamada puede retrasarse para simular la latencia de red de Odoo.
+
+    python -m benchmarks.fake_odoo --port 8069 --records 5000 --latency 0.02
+
+GET /bench/stats devuelve el número de llamadas recibidas y POST
+/bench/reset lo pone a cero.
+"""
+import argparse
+import json
+import random
+import threading
+import time
+import xmlrpc.client
+from collections import Counter
+from datetime import date, datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DB = "odoo"
+USER = "admin"
+PASSWORD = "admin"
+UID = 2
+
+DATETIME_FIELDS = {"date_order", "create_date", "write_date"}
+DATE_FIELDS = {"invoice_date", "date"}
+
+# many2one que se pueden seguir en los dominios ('order_id.state')
+RELATED_MODELS = {
+    "sale.order.line": {"order_id": "sale.order"},
+    "purchase.order.line": {"order_id": "purchase.order"},
+}
+
+
+# === Datos ===
+
+# Compañía 1 en pesos y compañía 2 en dólares; los documentos pueden ir en cualquiera de las dos monedas
+CURRENCIES = {33: "MXN", 2: "USD"}
+COMPANIES = {1: ("Compañía MX", 33), 2: ("Compañía US", 2)}
+
+def generate_dataset(records=1000, seed=1, start=date(2024, 1, 1), days=366):
+    """Genera `records` registros por modelo repartidos en `days` días."""
+    rnd = random.Random(seed)
+    data = {model: [] for model in ("sale.order", "purchase.order", "account.move", "account.payment", "mrp.production")}
+
+    def moment():
+        day = start + timedelta(days=rnd.randrange(days))
+        return day, datetime(day.year, day.month, day.day, rnd.randrange(24), rnd.randrange(60), rnd.randrange(60))
+
+    def amount():
+        return round(rnd.uniform(100, 5000), 2)
+
+    def common(record_id):
+        company_id = rnd.choice([1, 1, 2])
+        currency_id = rnd.choice([33, 33, 2])
+        return {
+            "id": record_id,
+            "company_id": [company_id, COMPANIES[company_id][0]],
+            "currency_id": [currency_id, CURRENCIES[currency_id]],
+            "partner_id": [rnd.randint(1, 50), "Contacto"],
+        }
+
+    for i in range(1, records + 1):
+        day, when = moment()
+        stamp = when.strftime("%Y-%m-%d %H:%M:%S")
+        data["sale.order"].append(dict(common(i), name=f"S{i:05d}", date_order=stamp, write_date=stamp,
+                                       state=rnd.choice(["draft", "sale", "sale", "done", "cancel"]),
+                                       amount_total=amount()))
+        data["purchase.order"].append(dict(common(i), name=f"P{i:05d}", date_order=stamp, write_date=stamp,
+                                           state=rnd.choice(["draft", "purchase", "purchase", "done", "cancel"]),
+                                           amount_total=amount()))
+        data["account.move"].append(dict(common(i), name=f"INV/{i:05d}", invoice_date=day.isoformat(), write_date=stamp,
+                                         move_type=rnd.choice(["out_invoice", "in_invoice", "entry"]),
+                                         state=rnd.choice(["draft", "posted", "posted"]),
+                                         amount_total=amount()))
+        data["account.payment"].append(dict(common(i), name=f"PAY/{i:05d}", date=day.isoformat(), write_date=stamp,
+                                            payment_type=rnd.choice(["inbound", "outbound"]),
+                                            state=rnd.choice(["draft", "posted", "posted"]),
+                                            amount=amount()))
+        data["mrp.production"].append(dict(common(i), name=f"MO/{i:05d}", create_date=stamp, write_date=stamp,
+                                           state=rnd.choice(["draft", "confirmed", "planned", "progress", "done", "cancel"]),
+                                           product_id=[rnd.randint(1, 20), "Producto"],
+                                           product_qty=float(rnd.randint(1, 50))))
+
+    # Entre una y tres líneas por pedido. Con su propio generador para no alterar los pedidos
+    lines = random.Random(seed + 2)
+    for model, orders in (("sale.order.line", data["sale.order"]), ("purchase.order.line", data["purchase.order"])):
+        data[model] = []
+        for order in orders:
+            for _ in range(lines.randint(1, 3)):
+                product_id = lines.randint(1, 40)
+                quantity = float(lines.randint(1, 10))
+                data[model].append({
+                    "id": len(data[model]) + 1,
+                    "order_id": [order["id"], order["name"]],
+                    "product_id": [product_id, f"Producto {product_id}"],
+                    "product_uom_qty": quantity,
+                    "price_subtotal": round(quantity * lines.uniform(10, 500), 2),
+                    "company_id": order["company_id"],
+                    "currency_id": order["currency_id"],
+                    "write_date": order["write_date"],
+                })
+
+    # Tipos de cambio semanales de cada compañía: unidades de la otra moneda por una de la suya
+    data["res.company"] = [{"id": company_id, "name": name, "currency_id": [currency_id, CURRENCIES[currency_id]]}
+                           for company_id, (name, currency_id) in COMPANIES.items()]
+    data["res.currency.rate"] = []
+    rates = random.Random(seed + 1)
+    for week in range(0, days, 7):
+        usd_per_mxn = round(1 / rates.uniform(16.5, 18.5), 6)
+        day = (start + timedelta(days=week)).isoformat()
+        data["res.currency.rate"] += [
+            {"id": len(data["res.currency.rate"]) + 1, "name": day, "rate": usd_per_mxn,
+             "currency_id": [2, "USD"], "company_id": [1, COMPANIES[1][0]]},
+            {"id": len(data["res.currency.rate"]) + 2, "name": day, "rate": round(1 / usd_per_mxn, 4),
+             "currency_id": [33, "MXN"], "company_id": [2, COMPANIES[2][0]]},
+        ]
+    return data
+
+
+# === Dominios y agrupaciones ===
+
+def _plain(value):
+    return value[0] if isinstance(value, list) and value else value
+
+
+def _compare(value, op, operand):
+    if op == "=":
+        return value == operand
+    if op == "!=":
+        return value != operand
+    if op == "in":
+        return value in operand
+    if op == "not in":
+        return value not in operand
+    if value in (None, False):
+        return False
+    # Odoo acepta fechas 'YYYY-MM-DD' contra campos datetime
+    if isinstance(value, str) and isinstance(operand, str) and len(value) > 10 and len(operand) == 10:
+        operand += " 00:00:00"
+    if op == ">=":
+        return value >= operand
+    if op == "<=":
+        return value <= operand
+    if op == ">":
+        return value > operand
+    if op == "<":
+        return value < operand
+    raise xmlrpc.client.Fault(1, f"Operador no soportado: {op}")
+
+
+def matches(record, domain, value=None):
+    """Evalúa un dominio en notación polaca, con '&' implícito entre hojas.
+
+    `value(record, field)` resuelve los campos de las hojas; por defecto,
+    record.get(field).
+    """
+    value = value or (lambda record, field: record.get(field))
+    stack = []
+    for leaf in reversed(domain):
+        if leaf == "!":
+            stack.append(not stack.pop())
+        elif leaf in ("&", "|"):
+            a, b = stack.pop(), stack.pop()
+            stack.append(a and b if leaf == "&" else a or b)
+        else:
+            field, op, operand = leaf
+            stack.append(_compare(_plain(value(record, field)), op, operand))
+    return all(stack)
+
+
+def _bucket(value, granularity):
+    day = date.fromisoformat(value[:10])
+    if granularity == "day":
+        return day, day + timedelta(days=1)
+    if granularity == "week":
+        first = day - timedelta(days=day.weekday())
+        return first, first + timedelta(days=7)
+    if granularity == "year":
+        first = day.replace(month=1, day=1)
+        return first, first.replace(year=first.year + 1)
+    first = day.replace(day=1)
+    return first, (first + timedelta(days=32)).replace(day=1)
+
+
+class FakeOdoo:
+    def __init__(self, data, latency=0.0):
+        self.data = data
+        self.latency = latency
+        self.calls = Counter()
+        self._lock = threading.Lock()
+        self._by_id = {}
+
+    def field_value(self, model, record, field):
+        # 'order_id.date_order': se sigue el many2one hasta el registro relacionado
+        while "." in field:
+            name, field = field.split(".", 1)
+            model = RELATED_MODELS.get(model, {}).get(name)
+            if model is None:
+                raise xmlrpc.client.Fault(1, f"Campo relacionado no soportado: {name}")
+            if model not in self._by_id:
+                self._by_id[model] = {r["id"]: r for r in self.data[model]}
+            record = self._by_id[model].get(_plain(record.get(name))) or {}
+        return record.get(field)
+
+    def records(self, model, domain, offset=0, limit=None, order=None):
+        if model not in self.data:
+            raise xmlrpc.client.Fault(2, f"Object {model} doesn't exist")
+        rows = [r for r in self.data[model] if matches(r, domain, lambda r, field: self.field_value(model, r, field))]
+        if order:
+            # Sólo el primer criterio y 'id' como desempate, suficiente para la API
+            field, _, direction = order.split(",")[0].strip().partition(" ")
+            rows.sort(key=lambda r: (r.get(field) or "", r["id"]), reverse=direction.strip().lower() == "desc")
+        rows = rows[offset:]
+        return rows[:limit] if limit else rows
+
+    def read_group(self, model, domain, fields, groupby, offset=0, limit=None, orderby=False, lazy=True):
+        groupby = [groupby] if isinstance(groupby, str) else list(groupby or [])
+        if lazy:
+            groupby = groupby[:1]
+        grouped = {spec.split(":")[0] for spec in groupby}
+        measures = [f.split(":")[0] for f in fields if f.split(":")[0] not in grouped and f != "__count"]
+        rows = self.records(model, domain)
+
+        groups = {}
+        for record in rows:
+            key = []
+            for spec in groupby:
+                field, _, granularity = spec.partition(":")
+                value = record.get(field)
+                if field in DATETIME_FIELDS | DATE_FIELDS:
+                    key.append(_bucket(value, granularity or "month") if value else None)
+                else:
+                    key.append(tuple(value) if isinstance(value, list) else value)
+            groups.setdefault(tuple(key), []).append(record)
+
+        result = []
+        for key, members in groups.items():
+            row = {"__range": {}, "__domain": domain}
+            for spec, value in zip(groupby, key):
+                field = spec.split(":")[0]
+                if field in DATETIME_FIELDS | DATE_FIELDS and value:
+                    suffix = " 00:00:00" if field in DATETIME_FIELDS else ""
+                    row[spec] = value[0].strftime("%d %b %Y")
+                    row["__range"][spec] = {"from": value[0].isoformat() + suffix, "to": value[1].isoformat() + suffix}
+                else:
+                    row[spec] = list(value) if isinstance(value, tuple) else value
+            row[f"{groupby[0].split(':')[0]}_count" if lazy and groupby else "__count"] = len(members)
+            for measure in measures:
+                row[measure] = sum(m.get(measure) or 0 for m in members)
+            result.append(row)
+
+        if orderby:
+            # "campo [asc|desc], ...": se ordena por el último término primero (sort estable)
+            for term in reversed(orderby.split(",")):
+                field, _, direction = term.strip().partition(" ")
+                result.sort(key=lambda r: _plain(r.get(field)) or 0, reverse=direction.strip().lower() == "desc")
+        else:
+            result.sort(key=lambda r: [str(r.get(spec)) for spec in groupby])
+        result = result[offset:]
+        return result[:limit] if limit else result
+
+    def execute_kw(self, model, method, args, kwargs):
+        kwargs = dict(kwargs or {})
+        if method == "search_count":
+            return len(self.records(model, args[0]))
+        if method == "search":
+            return [r["id"] for r in self.records(model, args[0], kwargs.get("offset", 0), kwargs.get("limit"), kwargs.get("order"))]
+        if method == "search_read":
+            fields = kwargs.get("fields") or (args[1] if len(args) > 1 else None)
+            rows = self.records(model, args[0], kwargs.get("offset", 0), kwargs.get("limit"), kwargs.get("order"))
+            return [{k: v for k, v in r.items() if not fields or k in fields or k == "id"} for r in rows]
+        if method == "read":
+            fields = kwargs.get("fields") or (args[1] if len(args) > 1 else None)
+            rows = self.records(model, [["id", "in", list(args[0])]])
+            return [{k: v for k, v in r.items() if not fields or k in fields or k == "id"} for r in rows]
+        if method == "read_group":
+            params = dict(zip(("domain", "fields", "groupby", "offset", "limit", "orderby", "lazy"), args))
+            params.update(kwargs)
+            params.pop("context", None)
+            return self.read_group(model, **params)
+        raise xmlrpc.client.Fault(1, f"Método no soportado: {method}")
+
+    def dispatch(self, service, method, args):
+        with self._lock:
+            self.calls[f"{service}.{method}" if method != "execute_kw" else f"{args[3]}.{args[4]}"] += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if service == "common" and method == "version":
+            return {"server_version": "17.0", "server_serie": "17.0"}
+        if service == "common" and method in ("authenticate", "login"):
+            return UID if (args[1], args[2]) == (USER, PASSWORD) else False
+        if service == "object" and method == "execute_kw":
+            db, uid, password, model, model_method = args[:5]
+            if uid != UID or password != PASSWORD:
+                raise xmlrpc.client.Fault(3, "Access Denied")
+            return self.execute_kw(model, model_method, args[5] if len(args) > 5 else [], args[6] if len(args) > 6 else {})
+        raise xmlrpc.client.Fault(1, f"Servicio no soportado: {service}.{method}")
+
+    def stats(self):
+        with self._lock:
+            return {"calls": sum(self.calls.values()), "by_method": dict(self.calls)}
+
+    def reset(self):
+        with self._lock:
+            self.calls.clear()
+
+
+# === Servidor HTTP ===
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    odoo = None
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, body, content_type):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path != "/bench/stats":
+            self.send_error(404)
+            return
+        self._send(json.dumps(self.odoo.stats()).encode(), "application/json")
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        if self.path == "/bench/reset":
+            self.odoo.reset()
+            self._send(b"{}", "application/json")
+        elif self.path == "/jsonrpc":
+            request = json.loads(body)
+            params = request["params"]
+            try:
+                response = {"jsonrpc": "2.0", "id": request.get("id"),
+                            "result": self.odoo.dispatch(params["service"], params["method"], params["args"])}
+            except xmlrpc.client.Fault as e:
+                name = "odoo.exceptions.AccessDenied" if e.faultCode == 3 else "odoo.exceptions.UserError"
+                response = {"jsonrpc": "2.0", "id": request.get("id"), "error": {
+                    "code": 200, "message": "Odoo Server Error", "data": {"name": name, "message": e.faultString},
+                }}
+            self._send(json.dumps(response).encode(), "application/json")
+        elif self.path.startswith("/xmlrpc/2/"):
+            args, method = xmlrpc.client.loads(body, use_builtin_types=True)
+            try:
+                response = xmlrpc.client.dumps((self.odoo.dispatch(self.path.rsplit("/", 1)[-1], method, args),),
+                                               methodresponse=True, allow_none=True)
+            except xmlrpc.client.Fault as e:
+                response = xmlrpc.client.dumps(e, methodresponse=True)
+            self._send(response.encode(), "text/xml")
+        else:
+            self.send_error(404)
+
+
+def serve(odoo, host="127.0.0.1", port=8069):
+    """Arranca el servidor en un hilo y lo devuelve (server.shutdown() para pararlo)."""
+    handler = type("FakeOdooHandler", (Handler,), {"odoo": odoo})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="fake-odoo", daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor Odoo de pruebas")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8069)
+    parser.add_argument("--records", type=int, default=1000, help="registros por modelo")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--latency", type=float, default=0.0, help="segundos añadidos a cada llamada")
+    options = parser.parse_args()
+
+    serve(FakeOdoo(generate_dataset(options.records, options.seed), options.latency), options.host, options.port)
+    print(f"Odoo de pruebas en http://{options.host}:{options.port} ({options.records} registros por modelo)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,240 @@
+"""Prueba de carga de los endpoints contra el Odoo de pruebas.
+
+Levanta benchmarks.fake_odoo en este proceso y la app Flask en un proceso
+aparte, lanza peticiones concurrentes a cada endpoint y reporta latencias
+p50/p95/p99, throughput, llamadas RPC por petición y memoria máxima (RSS)
+de la app. El resultado se puede guardar como línea base y comparar en
+ejecuciones posteriores.
+
+    python -m benchmarks.load_bench --records 5000 --latency 0.02 --save-baseline bench.json
+    python -m benchmarks.load_bench --records 5000 --latency 0.02 --baseline bench.json
+"""
+import argparse
+import http.client
+import json
+import logging
+import multiprocessing
+import os
+import resource
+import socket
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from .fake_odoo import FakeOdoo, generate_dataset, serve
+
+ENDPOINTS = ("/ventas/", "/compras/", "/manufactura/", "/ventas/top?by=product_id", "/compras/top?by=product_id", "/health/")
+
+RANGES = [(f"2024-{m:02d}-01", f"2024-{m:02d}-28") for m in range(1, 13)] + [
+    ("2024-01-01", "2024-03-31"), ("2024-04-01", "2024-06-30"), ("2024-07-01", "2024-09-30"),
+    ("2024-10-01", "2024-12-31"), ("2024-01-01", "2024-12-31"), ("2024-06-10", "2024-06-16"),
+]
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _serve_app(port, env):
+    # Proceso hijo: la configuración se lee del entorno al importar la app
+    os.environ.update(env)
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    from werkzeug.serving import make_server
+    from app import create_app
+    make_server("127.0.0.1", port, create_app(), threaded=True).serve_forever()
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))]
+
+
+def peak_rss_mb(pid):
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+class Client:
+    """Una conexión keep-alive por hilo hacia la app."""
+
+    def __init__(self, base_url):
+        parts = urlsplit(base_url)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self._local = threading.local()
+
+    def get(self, path):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = http.client.HTTPConnection(self.host, self.port, timeout=120)
+        try:
+            conn.request("GET", path)
+            response = conn.getresponse()
+            response.read()
+            return response.status
+        except (OSError, http.client.HTTPException):
+            conn.close()
+            self._local.conn = None
+            raise
+
+
+def odoo_request(odoo_url, method, path):
+    parts = urlsplit(odoo_url)
+    conn = http.client.HTTPConnection(parts.hostname, parts.port)
+    conn.request(method, path, b"" if method == "POST" else None)
+    body = conn.getresponse().read()
+    conn.close()
+    return json.loads(body)
+
+
+def wait_ready(client, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if client.get("/health/") == 200:
+                return
+        except OSError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError("La app no respondió a /health/ a tiempo")
+
+
+def run_endpoint(client, odoo_url, endpoint, requests, concurrency):
+    separator = "&" if "?" in endpoint else "?"
+    paths = [endpoint if endpoint.startswith("/health") else f"{endpoint}{separator}start={RANGES[i % len(RANGES)][0]}&end={RANGES[i % len(RANGES)][1]}"
+             for i in range(requests)]
+
+    def timed(path):
+        started = time.perf_counter()
+        try:
+            status = client.get(path)
+        except (OSError, http.client.HTTPException):
+            status = None
+        return time.perf_counter() - started, status
+
+    odoo_request(odoo_url, "POST", "/bench/reset")
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        results = list(pool.map(timed, paths))
+    elapsed = time.perf_counter() - started
+    calls = odoo_request(odoo_url, "GET", "/bench/stats")["calls"]
+
+    latencies = [latency * 1000 for latency, _ in results]
+    return {
+        "requests": requests,
+        "errors": sum(1 for _, status in results if status != 200),
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+        "p99_ms": percentile(latencies, 99),
+        "throughput_rps": requests / elapsed,
+        "rpcs_per_request": calls / requests,
+    }
+
+
+def compare(result, baseline, tolerance):
+    """Imprime la diferencia contra la línea base y devuelve las regresiones."""
+    regressions = []
+    checks = (("p50_ms", 1), ("p95_ms", 1), ("p99_ms", 1), ("throughput_rps", -1), ("rpcs_per_request", 1))
+    for endpoint, current in result["endpoints"].items():
+        before = baseline.get("endpoints", {}).get(endpoint)
+        if not before:
+            continue
+        for key, worse in checks:
+            old, new = before.get(key), current.get(key)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            flag = ""
+            if change * worse > tolerance:
+                flag = "  REGRESIÓN"
+                regressions.append(f"{endpoint} {key}")
+            print(f"{endpoint:<28} {key:<18} {old:>10.2f} -> {new:>10.2f}  {change:+7.1%}{flag}")
+    old_rss, new_rss = baseline.get("peak_rss_mb"), result.get("peak_rss_mb")
+    if old_rss and new_rss:
+        print(f"{'app':<28} {'peak_rss_mb':<18} {old_rss:>10.2f} -> {new_rss:>10.2f}  {(new_rss - old_rss) / old_rss:+7.1%}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prueba de carga contra el Odoo de pruebas")
+    parser.add_argument("--records", type=int, default=1000, help="registros por modelo en el Odoo de pruebas")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--latency", type=float, default=0.0, help="segundos añadidos a cada llamada a Odoo")
+    parser.add_argument("--requests", type=int, default=200, help="peticiones por endpoint")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--endpoints", default=",".join(ENDPOINTS))
+    parser.add_argument("--transport", default="xmlrpc", help="ODOO_TRANSPORT de la app")
+    parser.add_argument("--cache", action="store_true", help="mantener la caché de respuestas activa")
+    parser.add_argument("--app-url", help="medir una app ya levantada (apuntando a --odoo-port) en lugar de arrancarla")
+    parser.add_argument("--odoo-port", type=int, default=0)
+    parser.add_argument("--baseline", help="JSON con el que comparar")
+    parser.add_argument("--save-baseline", help="guardar el resultado como línea base")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="empeoramiento relativo admitido")
+    options = parser.parse_args()
+
+    odoo = FakeOdoo(generate_dataset(options.records, options.seed), options.latency)
+    server = serve(odoo, port=options.odoo_port)
+    odoo_url = f"http://127.0.0.1:{server.server_address[1]}"
+
+    process = None
+    app_url = options.app_url
+    if not app_url:
+        port = _free_port()
+        env = {
+            "ODOO_URL": odoo_url, "ODOO_DB": "odoo", "ODOO_USER": "admin", "ODOO_PASSWORD": "admin",
+            "ODOO_TRANSPORT": options.transport, "ROLLUP_ENABLED": "false",
+            "CACHE_ENABLED": "true" if options.cache else "false",
+        }
+        process = multiprocessing.get_context("spawn").Process(target=_serve_app, args=(port, env), daemon=True)
+        process.start()
+        app_url = f"http://127.0.0.1:{port}"
+
+    client = Client(app_url)
+    try:
+        wait_ready(client)
+        result = {
+            "config": {k: getattr(options, k) for k in ("records", "latency", "requests", "concurrency", "transport", "cache")},
+            "endpoints": {},
+        }
+        for endpoint in options.endpoints.split(","):
+            stats = result["endpoints"][endpoint] = run_endpoint(client, odoo_url, endpoint, options.requests, options.concurrency)
+            print(f"{endpoint:<28} p50 {stats['p50_ms']:8.1f} ms  p95 {stats['p95_ms']:8.1f} ms  p99 {stats['p99_ms']:8.1f} ms  "
+                  f"{stats['throughput_rps']:8.1f} req/s  {stats['rpcs_per_request']:5.2f} rpc/req  errores {stats['errors']}")
+        result["peak_rss_mb"] = peak_rss_mb(process.pid) if process else None
+    finally:
+        if process:
+            process.terminate()
+            process.join()
+        server.shutdown()
+
+    if result["peak_rss_mb"] is None and process:
+        # Sin /proc: ru_maxrss de los hijos (KB en Linux, bytes en macOS)
+        maxrss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+        result["peak_rss_mb"] = maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+    if result["peak_rss_mb"] is not None:
+        print(f"Memoria máxima de la app: {result['peak_rss_mb']:.1f} MB")
+
+    if options.save_baseline:
+        with open(options.save_baseline, "w") as f:
+            json.dump(result, f, indent=2)
+    if options.baseline:
+        with open(options.baseline) as f:
+            regressions = compare(result, json.load(f), options.tolerance)
+        if regressions:
+            print(f"{len(regressions)} regresiones por encima del {options.tolerance:.0%}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""Compara XML-RPC y JSON-RPC: CPU por llamada y bytes en el cable.
+
+Sin argumentos codifica y decodifica respuestas sintéticas del tamaño de las
+que devuelve Odoo (search_read y read_group). Con --url repite las consultas
+del tablero contra un Odoo real con ambos transportes.
+
+    python -m benchmarks.transport_bench
+    python -m benchmarks.transport_bench --url http://localhost:8069 --db odoo --user admin --password admin
+"""
+import argparse
+import time
+import xmlrpc.client
+
+from app.transports import HttpTransport, ServiceProxy, json_dumps, make_codec, orjson
+
+
+def search_read_rows(n):
+    return [{
+        "id": i,
+        "name": f"S{i:05d}",
+        "date_order": f"2024-{i % 12 + 1:02d}-{i % 28 + 1:02d} 10:00:00",
+        "amount_total": round(i * 13.37, 2),
+        "state": "sale",
+        "partner_id": [i % 50 + 1, f"Cliente {i % 50 + 1}"],
+    } for i in range(n)]
+
+
+def read_group_rows(days):
+    return [{
+        "date_order:day": f"{d + 1:02d} ene. 2024",
+        "__range": {"date_order:day": {"from": f"2024-01-{d + 1:02d} 00:00:00", "to": f"2024-01-{d + 2:02d} 00:00:00"}},
+        "__domain": [["date_order", ">=", f"2024-01-{d + 1:02d} 00:00:00"]],
+        "state": "sale",
+        "amount_total": d * 1021.5,
+        "__count": d + 3,
+    } for d in range(days)]
+
+
+def encode_response(codec, result):
+    if codec.name == "xmlrpc":
+        return xmlrpc.client.dumps((result,), methodresponse=True, allow_none=True).encode()
+    return json_dumps({"jsonrpc": "2.0", "id": 1, "result": result})
+
+
+def measure(codec, request_args, result, repeat):
+    response = encode_response(codec, result)
+    started = time.process_time()
+    for _ in range(repeat):
+        body = codec.encode("object", "execute_kw", request_args)
+        codec.decode(response)
+    cpu = (time.process_time() - started) / repeat
+    return {"cpu_ms": cpu * 1000, "request_bytes": len(body), "response_bytes": len(response)}
+
+
+def offline(repeat):
+    args = ("odoo", 2, "admin", "sale.order", "search_read",
+            [[["date_order", ">=", "2024-01-01"], ["state", "=", "sale"]]], {"fields": ["amount_total"]})
+    cases = [
+        ("search_read x1000", args, search_read_rows(1000)),
+        ("search_read x10", args, search_read_rows(10)),
+        ("read_group x366", args, read_group_rows(366)),
+    ]
+    for label, request_args, result in cases:
+        for name in ("xmlrpc", "jsonrpc"):
+            yield label, name, measure(make_codec(name), request_args, result, repeat)
+
+
+def live(options, repeat):
+    queries = [
+        ("sale.order", "read_group", [[["state", "in", ["sale", "done"]]], ["amount_total:sum"], ["date_order:day"]],
+         {"lazy": False, "context": {"tz": "UTC"}}),
+        ("account.move", "search_read", [[["move_type", "=", "out_invoice"]]],
+         {"fields": ["amount_total", "invoice_date"], "limit": 1000}),
+    ]
+    for name in ("xmlrpc", "jsonrpc"):
+        transport = HttpTransport(options.url, make_codec(name), timeout=60)
+        uid = ServiceProxy(transport, "common").authenticate(options.db, options.user, options.password, {})
+        models = ServiceProxy(transport, "object")
+        for model, method, args, kwargs in queries:
+            transport.bytes_sent = transport.bytes_received = 0
+            started = time.process_time()
+            wall = time.perf_counter()
+            for _ in range(repeat):
+                models.execute_kw(options.db, uid, options.password, model, method, args, kwargs)
+            yield f"{model}.{method}", name, {
+                "cpu_ms": (time.process_time() - started) / repeat * 1000,
+                "wall_ms": (time.perf_counter() - wall) / repeat * 1000,
+                "request_bytes": transport.bytes_sent // repeat,
+                "response_bytes": transport.bytes_received // repeat,
+            }
+        transport.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url")
+    parser.add_argument("--db", default="odoo")
+    parser.add_argument("--user", default="admin")
+    parser.add_argument("--password", default="admin")
+    parser.add_argument("--repeat", type=int, default=50)
+    options = parser.parse_args()
+
+    print(f"orjson: {'sí' if orjson is not None else 'no (json estándar)'}")
+    results = live(options, options.repeat) if options.url else offline(options.repeat)
+    for label, name, row in results:
+        extra = f"  wall {row['wall_ms']:8.2f} ms" if "wall_ms" in row else ""
+        print(f"{label:<28} {name:<8} cpu {row['cpu_ms']:8.3f} ms  "
+              f"req {row['request_bytes']:>8} B  resp {row['response_bytes']:>9} B{extra}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+# Servicio en producción: gunicorn -c gunicorn.conf.py run:app
+#
+# La app se carga una vez en el maestro (preload) y se hace fork de los
+# workers. Con SHARED_CACHE_PATH los workers comparten los resúmenes
+# calculados y el uid de Odoo; cada worker arranca sus propios hilos en
+# segundo plano tras el fork.
+import multiprocessing
+import os
+
+os.environ.setdefault("BACKGROUND_DEFERRED", "true")
+os.environ.setdefault("SHARED_CACHE_PATH", "/tmp/tablero/shared_cache.sqlite3")
+os.environ.setdefault("COALESCE_DIR", "/tmp/tablero/coalesce")
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+# Hilos por worker: las peticiones pasan casi todo el tiempo esperando a Odoo
+worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", "8"))
+# Cada cliente de /stream ocupa un hilo mientras está conectado: se dejan al
+# menos dos libres para el resto de la API (más allá, /stream responde 503)
+stream_limit = max(0, threads - 2)
+os.environ["STREAM_MAX_SUBSCRIBERS"] = str(min(int(os.getenv("STREAM_MAX_SUBSCRIBERS", stream_limit)), stream_limit))
+preload_app = True
+# Por encima de ODOO_REQUEST_DEADLINE para que sea la app quien corte
+timeout = int(float(os.getenv("ODOO_REQUEST_DEADLINE", "30"))) + 30
+graceful_timeout = 30
+keepalive = 5
+accesslog = "-"
+
+
+def when_ready(server):
+    from app.serving import warm_up
+    from run import app
+    warm_up(app)
+
+
+def post_fork(server, worker):
+    from app.serving import after_fork
+    from run import app
+    after_fork(app)
@@ -0,0 +1,57 @@
+import pytest
+
+from app import create_app
+from app.config import Config
+from app.kpi import MetricValue
+from benchmarks.fake_odoo import DB, PASSWORD, USER, FakeOdoo, generate_dataset, serve
+
+
+@pytest.fixture
+def odoo():
+    """Odoo de pruebas (benchmarks/fake_odoo.py) con datos nuevos en cada test."""
+    fake = FakeOdoo(generate_dataset(records=200))
+    server = serve(fake, port=0)
+    fake.url = f"http://127.0.0.1:{server.server_port}"
+    yield fake
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def make_app(odoo, monkeypatch, tmp_path):
+    """create_app() contra el Odoo de pruebas; los argumentos sustituyen valores de Config.
+
+    Los hilos en segundo plano no se arrancan (BACKGROUND_DEFERRED): cada
+    test sincroniza o recalcula cuando lo necesita.
+    """
+    def make(**config):
+        settings = {
+            "ODOO_URL": odoo.url,
+            "ODOO_DB": DB,
+            "ODOO_USER": USER,
+            "ODOO_PASSWORD": PASSWORD,
+            "ODOO_TENANTS": "",
+            "ODOO_TENANTS_FILE": "",
+            "SHARED_CACHE_PATH": "",
+            "COALESCE_DIR": "",
+            "BACKGROUND_DEFERRED": True,
+            "ROLLUP_PATH": str(tmp_path / "rollup.sqlite3"),
+        }
+        settings.update(config)
+        for name, value in settings.items():
+            monkeypatch.setattr(Config, name, value)
+        return create_app()
+
+    return make
+
+
+def brute_force(odoo, metrics, periods):
+    """{metric.key: [MetricValue por periodo]} sumando registro a registro."""
+    values = {}
+    for metric in metrics:
+        values[metric.key] = []
+        for start_date, end_date in periods:
+            records = odoo.records(metric.model, metric.period_domain(start_date, end_date))
+            total = sum((r.get(metric.measure) or 0.0 for r in records), 0.0) if metric.measure else 0.0
+            values[metric.key].append(MetricValue(total, len(records)))
+    return values
@@ -0,0 +1,46 @@
+import pytest
+
+from app.http_cache import RenderedJSON
+from app.kpi import previous_period
+from app.routes.compras.views import COMPRAS_METRICS, compras_payload
+from app.routes.manufactura.views import MANUFACTURA_METRICS, manufactura_payload
+from app.routes.ventas.views import VENTAS_METRICS, ventas_payload
+from tests.conftest import brute_force
+
+AREAS = [
+    ("/ventas/", VENTAS_METRICS, ventas_payload),
+    ("/compras/", COMPRAS_METRICS, compras_payload),
+    ("/manufactura/", MANUFACTURA_METRICS, manufactura_payload),
+]
+
+RANGES = [("2024-03-01", "2024-03-31"), ("2024-02-10", "2024-05-20"), ("2024-06-15", "2024-06-16")]
+
+
+@pytest.mark.parametrize("path, metrics, payload", AREAS)
+def test_one_read_group_per_model(make_app, odoo, path, metrics, payload):
+    client = make_app(CACHE_ENABLED=False).test_client()
+    odoo.reset()
+
+    response = client.get(path, query_string={"start": "2024-03-01", "end": "2024-03-31"})
+
+    assert response.status_code == 200
+    # Periodo actual y anterior de todas las métricas de un modelo en un solo read_group
+    calls = {name: count for name, count in odoo.calls.items() if not name.startswith("common.")}
+    assert calls == {f"{model}.read_group": 1 for model in {m.model for m in metrics}}
+
+
+@pytest.mark.parametrize("path, metrics, payload", AREAS)
+@pytest.mark.parametrize("response_format", ["display", "raw"])
+@pytest.mark.parametrize("start, end", RANGES)
+def test_payload_matches_brute_force(make_app, odoo, path, metrics, payload, response_format, start, end):
+    app = make_app(CACHE_ENABLED=False)
+    raw = response_format == "raw"
+
+    response = app.test_client().get(path, query_string={"start": start, "end": end, "format": response_format})
+
+    values = brute_force(odoo, metrics, [(start, end), previous_period(start, end)])
+    with app.app_context():
+        # Mismo serializador que la vista: el de jsonify, o el rápido en modo raw
+        expected = RenderedJSON.from_payload(app.json, payload(values, raw), raw).body
+    assert response.status_code == 200
+    assert response.get_data() == expected
@@ -0,0 +1,52 @@
+import pytest
+
+from tests.conftest import brute_force
+
+YEAR = ("2024-01-01", "2025-01-01")
+
+
+def rollup_app(make_app, **config):
+    app = make_app(ROLLUP_ENABLED=True, ROLLUP_PAGE_SIZE=20, ROLLUP_RECONCILE_INTERVAL=0, CACHE_ENABLED=False, **config)
+    return app, app.extensions["rollup_store"]
+
+
+def test_sync_keeps_records_modified_between_pages(make_app, odoo, monkeypatch):
+    app, store = rollup_app(make_app)
+    orders = {order["id"]: order for order in odoo.data["sale.order"]}
+    execute_kw = odoo.execute_kw
+    pages = []
+
+    def modify_during_sync(model, method, args, kwargs):
+        rows = execute_kw(model, method, args, kwargs)
+        if model == "sale.order" and method == "search_read":
+            pages.append([row["id"] for row in rows])
+            if len(pages) == 1:
+                # Un usuario edita el primer pedido de la página ya leída: pasa al final del orden
+                orders[rows[0]["id"]].update(state="sale", amount_total=12345.67, write_date="2030-01-01 00:00:00")
+        return rows
+
+    monkeypatch.setattr(odoo, "execute_kw", modify_during_sync)
+    store.sync()
+
+    read = [record_id for page in pages for record_id in page]
+    assert set(read) == set(orders)
+    assert read.count(pages[0][0]) == 2
+    metrics = list(store.metrics.values())
+    expected = brute_force(odoo, metrics, [YEAR])
+    for key, (value,) in store.evaluate(metrics, [YEAR]).items():
+        assert value.count == expected[key][0].count
+        assert value.total == pytest.approx(expected[key][0].total)
+
+
+def test_sync_without_changes_keeps_version(make_app, odoo):
+    app, store = rollup_app(make_app)
+    store.sync()
+    version = store.stats()["version"]
+
+    assert store.sync() == set()
+    assert store.stats()["version"] == version
+
+    order = next(o for o in odoo.data["sale.order"] if o["state"] == "sale")
+    order.update(amount_total=order["amount_total"] + 1, write_date="2030-01-01 00:00:00")
+    assert store.sync() == {("ventas.confirmadas", order["date_order"][:10])}
+    assert store.stats()["version"] == version + 1
@@ -0,0 +1,116 @@
+import pytest
+
+TOKEN = "secreto"
+MARCH = ("2024-03-01", "2024-03-31")
+MAY = ("2024-05-01", "2024-05-31")
+
+
+def orders_count(client, period, path="/ventas/"):
+    response = client.get(path, query_string={"start": period[0], "end": period[1], "format": "raw"})
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def confirmed(client, period):
+    return orders_count(client, period)["ventas_confirmadas"]["cantidad_ordenes"]
+
+
+def notify(client, body, **headers):
+    return client.post("/webhooks/odoo", json=body, headers={"X-Webhook-Token": TOKEN, **headers})
+
+
+@pytest.fixture
+def march_order(odoo):
+    """Pedido confirmado a mitad de marzo."""
+    return next(o for o in odoo.data["sale.order"]
+                if o["state"] == "sale" and "2024-03-05" <= o["date_order"][:10] <= "2024-03-25")
+
+
+def move_to_may(order):
+    order.update(date_order="2024-05-10 12:00:00", write_date="2030-01-01 00:00:00")
+
+
+def test_moved_record_invalidates_old_and_new_days(make_app, march_order):
+    client = make_app(WEBHOOK_TOKEN=TOKEN).test_client()
+    march, may = confirmed(client, MARCH), confirmed(client, MAY)
+    old_day = march_order["date_order"][:10]
+
+    move_to_may(march_order)
+    # Sin aviso sigue sirviéndose la caché
+    assert (confirmed(client, MARCH), confirmed(client, MAY)) == (march, may)
+
+    response = notify(client, {"model": "sale.order", "ids": [march_order["id"]], "old_dates": [old_day]})
+
+    assert response.status_code == 200
+    assert response.get_json()["dias"] == [old_day, "2024-05-10"]
+    assert response.get_json()["areas_completas"] == []
+    assert (confirmed(client, MARCH), confirmed(client, MAY)) == (march - 1, may + 1)
+
+
+def test_deleted_record_without_old_dates_invalidates_area(make_app, odoo, march_order):
+    client = make_app(WEBHOOK_TOKEN=TOKEN).test_client()
+    march = confirmed(client, MARCH)
+
+    odoo.data["sale.order"].remove(march_order)
+    response = notify(client, {"model": "sale.order", "ids": [march_order["id"]], "old_dates": []})
+
+    assert response.status_code == 200
+    assert response.get_json()["areas_completas"] == ["tablero", "ventas"]
+    assert confirmed(client, MARCH) == march - 1
+
+
+def test_ids_without_old_dates_invalidate_only_affected_areas(make_app, march_order):
+    client = make_app(WEBHOOK_TOKEN=TOKEN).test_client()
+    march = confirmed(client, MARCH)
+    orders_count(client, MARCH, "/manufactura/")
+
+    move_to_may(march_order)
+    response = notify(client, {"model": "sale.order", "ids": [march_order["id"]]})
+
+    assert response.status_code == 200
+    assert response.get_json()["areas_completas"] == ["tablero", "ventas"]
+    # La entrada de manufactura no depende de sale.order
+    assert response.get_json()["invalidadas"] == 1
+    assert confirmed(client, MARCH) == march - 1
+
+
+def test_rollup_sync_invalidates_days_a_record_leaves(make_app, march_order):
+    app = make_app(WEBHOOK_TOKEN=TOKEN, ROLLUP_ENABLED=True)
+    store, feed = app.extensions["rollup_store"], app.extensions["change_feed"]
+    store.sync()
+    client = app.test_client()
+    march, may = confirmed(client, MARCH), confirmed(client, MAY)
+
+    move_to_may(march_order)
+    response = notify(client, {"model": "sale.order", "ids": [march_order["id"]]})
+    assert response.get_json()["sincronizacion_pendiente"] is True
+
+    feed.rollup_synced(store.sync())
+    assert (confirmed(client, MARCH), confirmed(client, MAY)) == (march - 1, may + 1)
+
+
+@pytest.mark.parametrize("body", [
+    {"model": "sale.order", "ids": ["7"]},
+    {"model": "sale.order", "ids": [True]},
+    {"model": "sale.order", "ids": [0]},
+    {"model": "sale.order", "ids": 7},
+    {"model": "sale.order", "dates": ["marzo"]},
+    {"model": "res.partner", "ids": [7]},
+])
+def test_invalid_notice_is_rejected(make_app, body):
+    client = make_app(WEBHOOK_TOKEN=TOKEN).test_client()
+    assert notify(client, body).status_code == 400
+
+
+def test_token_only_accepted_in_header(make_app):
+    client = make_app(WEBHOOK_TOKEN=TOKEN).test_client()
+    body = {"model": "sale.order", "dates": ["2024-03-10"]}
+
+    assert client.post("/webhooks/odoo", json=body, query_string={"token": TOKEN}).status_code == 403
+    assert notify(client, body, **{"X-Webhook-Token": "otro"}).status_code == 403
+    assert notify(client, body).status_code == 200
+
+
+def test_webhook_disabled_without_token(make_app):
+    client = make_app(WEBHOOK_TOKEN="").test_client()
+    assert notify(client, {"model": "sale.order", "dates": ["2024-03-10"]}).status_code == 404